@@ -0,0 +1,134 @@
+"""Tests for the streamed answer of LLMCompiler."""
+import asyncio
+from typing import Any
+
+import pytest
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from llmcompiler.src.callbacks.callbacks import AsyncAnswerStreamCallbackHandler
+from llmcompiler.src.llm_compiler.llm_compiler import LLMCompiler
+from llmcompiler.src.llm_compiler.plan_cache import PlanCache
+from llmcompiler.src.tools.base import Tool
+from llmcompiler.src.utils import prompt_utils
+
+PLAN = 'Thought: look it up\n1. search("béton")\n2. join()\n<END_OF_PLAN>'
+ANSWER = "Thought: I can answer\nAction: Finish(Le béton est prêt)"
+
+
+class StreamingFakeChatModel(FakeListChatModel):
+    """Fake chat model streaming its responses character by character."""
+
+    streaming: bool = True
+
+    def _should_stream(self, **kwargs: Any) -> bool:
+        return True
+
+
+async def search(query: str) -> str:
+    await asyncio.sleep(0.01)
+    return f"result for {query}"
+
+
+async def stream_answer(tokens):
+    chunks = []
+    handler = AsyncAnswerStreamCallbackHandler(chunks.append)
+    for token in tokens:
+        await handler.on_llm_new_token(token)
+    return chunks
+
+
+@pytest.mark.asyncio
+async def test_only_the_finish_argument_is_forwarded():
+    """The thought and the closing parenthesis are held back."""
+    chunks = await stream_answer(
+        ["Thought: ok\nAct", "ion: Fin", "ish(Le bé", "ton est", " prêt)", "\n"]
+    )
+
+    assert "".join(chunks) == "Le béton est prêt"
+    assert chunks[0] == "Le bé"
+
+
+@pytest.mark.asyncio
+async def test_replan_is_not_forwarded():
+    chunks = await stream_answer(["Thought: need more\n", "Action: Replan(no data)"])
+
+    assert chunks == []
+
+
+def make_chain(benchmark=False, plan_cache=None):
+    return LLMCompiler(
+        tools=[Tool(name="search", func=search, description="search(query: str)")],
+        planner_llm=StreamingFakeChatModel(responses=[PLAN]),
+        planner_example_prompt="",
+        planner_example_prompt_replan=None,
+        planner_stop=None,
+        planner_stream=True,
+        agent_llm=StreamingFakeChatModel(responses=[ANSWER]),
+        joinner_prompt="",
+        joinner_prompt_final=None,
+        max_replans=2,
+        benchmark=benchmark,
+        plan_cache=plan_cache,
+    )
+
+
+@pytest.mark.asyncio
+async def test_astream_yields_actions_observations_and_answer_tokens():
+    """Frames come in order: action, observation, answer tokens, final answer."""
+    chain = make_chain()
+
+    frames = [frame async for frame in chain.astream("Le béton est-il prêt ?")]
+
+    thoughts = [frame["text"] for frame in frames if frame["type"] == "thought"]
+    assert len(thoughts) == 2
+    assert thoughts[0].startswith("Thought: look it up\n1. search")
+    assert thoughts[1].endswith("Observation: result for béton")
+    deltas = [frame["text"] for frame in frames if frame.get("delta")]
+    assert len(deltas) > 1
+    assert "".join(deltas) == "Le béton est prêt"
+    assert frames[-1] == {"type": "response", "text": "Le béton est prêt", "done": True}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_have_their_own_stats(monkeypatch):
+    """Two questions answered at once by the same chain do not mix their stats."""
+    monkeypatch.setattr(
+        prompt_utils, "count_tokens", lambda text, model_name=None: len(text.split())
+    )
+    chain = make_chain(benchmark=True)
+
+    async def last_frame(query):
+        return [frame async for frame in chain.astream(query)][-1]
+
+    questions = ["Béton ?", "Le béton de la dalle est-il prêt ?"]
+    short, long = await asyncio.gather(*map(last_frame, questions))
+
+    for frame in (short, long):
+        assert frame["stats"]["planner"]["calls"] == 1
+        assert frame["stats"]["executor"]["calls"] == 1
+    assert (
+        long["stats"]["planner"]["input_tokens"]
+        - short["stats"]["planner"]["input_tokens"]
+        == len(questions[1].split()) - len(questions[0].split())
+    )
+    assert chain.get_all_stats()["planner"]["calls"] == 1
+
+
+class SlowPlanCache(PlanCache):
+    """Plan cache whose stores finish after the tools."""
+
+    async def store(self, *args, **kwargs):
+        await asyncio.sleep(0.05)
+        await super().store(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_plan_is_cached_when_the_tools_finish_first():
+    """The planner is not cancelled while storing a plan the scheduler already ran."""
+    plan_cache = SlowPlanCache()
+    chain = make_chain(plan_cache=plan_cache)
+
+    frames = [frame async for frame in chain.astream("Le béton est-il prêt ?")]
+
+    assert frames[-1]["text"] == "Le béton est prêt"
+    assert plan_cache.get_stats()["entries"] == 1
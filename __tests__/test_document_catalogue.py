@@ -0,0 +1,157 @@
+"""Tests for the cached document catalogue."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from llmcompiler.src.docstore.catalogue import CatalogueEntry, DocumentCatalogue
+from llmcompiler.src.docstore.local_index import LocalExplorer, LocalVectorDocstore
+from llmcompiler.src.docstore.r2r_rag import R2RDocstore, R2RExplorer
+
+
+class FakeKnowledgeBase:
+    """Paginated listing of `count` documents, counting the requests."""
+
+    def __init__(self, count):
+        self.entries = [
+            CatalogueEntry(id=f"id{i}", title=f"Document {i:03d}", created_at=f"2024-01-{i % 28 + 1:02d}T08:00:00")
+            for i in range(count)
+        ]
+        self.requests = 0
+
+    async def fetch_page(self, offset, limit):
+        self.requests += 1
+        await asyncio.sleep(0)
+        return self.entries[offset:offset + limit]
+
+
+def words(text):
+    return len(text.split())
+
+
+@pytest.mark.asyncio
+async def test_listed_once_and_paginated():
+    base = FakeKnowledgeBase(250)
+    catalogue = DocumentCatalogue(base.fetch_page, page_size=100, count_tokens=words)
+
+    await asyncio.gather(catalogue.get_entries(), catalogue.get_entries())
+    listing = await catalogue.list_documents(offset=40, limit=5)
+
+    assert base.requests == 3
+    assert listing.splitlines()[0] == "250 documents, à partir du n°41 :"
+    assert "- Titre: Document 040 | ID: id40 | Date: 2024-01-13" in listing
+    assert "Document 045" not in listing
+    assert listing.endswith("205 autres documents, suite avec offset=45")
+
+
+@pytest.mark.asyncio
+async def test_filters():
+    catalogue = DocumentCatalogue(FakeKnowledgeBase(250).fetch_page, count_tokens=words)
+
+    by_title = await catalogue.find(title_prefix="document 12")
+    by_date = await catalogue.find(since="2024-01-27", until="2024-01-28")
+
+    assert [entry.title for entry in by_title] == [f"Document {i}" for i in range(120, 130)]
+    assert {entry.date for entry in by_date} == {"2024-01-27", "2024-01-28"}
+    assert len(by_date) == 16
+    assert await catalogue.list_documents(title_prefix="rapport") == "Aucun document trouvé."
+
+
+@pytest.mark.asyncio
+async def test_listing_fits_the_token_budget():
+    catalogue = DocumentCatalogue(FakeKnowledgeBase(100).fetch_page, count_tokens=words)
+
+    listing = await catalogue.list_documents(limit=100, token_budget=60)
+
+    # 9 words per line
+    assert len([line for line in listing.splitlines() if line.startswith("- ")]) == 6
+    assert listing.endswith("suite avec offset=6")
+
+
+@pytest.mark.asyncio
+async def test_stale_catalogue_served_while_refreshed():
+    base = FakeKnowledgeBase(3)
+    catalogue = DocumentCatalogue(base.fetch_page, refresh_interval=0, count_tokens=words)
+    await catalogue.get_entries()
+    base.entries.append(CatalogueEntry(id="new", title="Nouveau"))
+
+    assert len(await catalogue.get_entries()) == 3
+    await catalogue._refreshing
+    assert len(await catalogue.get_entries()) == 4
+
+
+@pytest.mark.asyncio
+async def test_r2r_explorer_lists_the_configured_collection(monkeypatch):
+    calls = []
+
+    def list_documents(collection_id, offset=0, limit=100):
+        calls.append((collection_id, offset, limit))
+        return SimpleNamespace(results=[
+            SimpleNamespace(id="a1", title="Manuel chauffage", created_at=datetime(2024, 3, 1, 9, 30)),
+            SimpleNamespace(id="b2", title="Horaires", created_at=datetime(2023, 5, 2)),
+        ][offset:offset + limit])
+
+    monkeypatch.setenv("R2R_COLLECTION_ID", "collection-42")
+    client = SimpleNamespace(collections=SimpleNamespace(list_documents=list_documents))
+    explorer = R2RExplorer(R2RDocstore(client=client))
+
+    listing = await explorer.list_documents(since="2024-01-01")
+    await explorer.list_documents()
+
+    assert calls == [("collection-42", 0, 100)]
+    assert listing == "1 documents, à partir du n°1 :\n- Titre: Manuel chauffage | ID: a1 | Date: 2024-03-01"
+    explorer.docstore.close()
+
+
+@pytest.mark.asyncio
+async def test_local_explorer_lists_documents_not_chunks():
+    docstore = LocalVectorDocstore()
+    explorer = LocalExplorer(docstore)
+    await docstore.add_documents([
+        {"text": f"partie {i}", "metadata": {"title": "Manuel", "document_id": "manuel", "chunk": i}}
+        for i in range(3)
+    ])
+    assert (await explorer.list_documents()).count("- Titre: Manuel") == 1
+
+    await docstore.add_documents([{"text": "horaires", "metadata": {"title": "Horaires"}}])
+
+    assert "Titre: Horaires" in await explorer.list_documents()
+
+
+@pytest.mark.asyncio
+async def test_r2r_documents_added_are_listed_at_once():
+    documents = [SimpleNamespace(id="a1", title="Manuel chauffage", created_at=None)]
+
+    def create(raw_text, metadata=None, id=None):
+        documents.append(SimpleNamespace(id=id, title=metadata["title"], created_at=None))
+
+    client = SimpleNamespace(
+        collections=SimpleNamespace(
+            list_documents=lambda collection_id, offset=0, limit=100: SimpleNamespace(
+                results=documents[offset:offset + limit]
+            )
+        ),
+        documents=SimpleNamespace(create=create),
+    )
+    docstore = R2RDocstore(client=client)
+    explorer = R2RExplorer(docstore)
+    assert "Horaires" not in await explorer.list_documents()
+
+    await docstore.add_documents([{"id": "b2", "text": "horaires", "metadata": {"title": "Horaires"}}])
+
+    assert "- Titre: Horaires | ID: b2" in await explorer.list_documents()
+    docstore.close()
+
+
+@pytest.mark.asyncio
+async def test_fetch_started_before_an_invalidation_is_dropped():
+    base = FakeKnowledgeBase(3)
+    catalogue = DocumentCatalogue(base.fetch_page, count_tokens=words)
+    listing = asyncio.create_task(catalogue.get_entries())
+    await asyncio.sleep(0)
+    base.entries.append(CatalogueEntry(id="new", title="Nouveau"))
+
+    catalogue.invalidate()
+
+    assert len(await listing) == 4
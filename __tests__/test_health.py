@@ -0,0 +1,133 @@
+"""Tests for the health checks of the tools."""
+import asyncio
+
+import pytest
+
+from llmcompiler.src.llm_compiler.planner import Planner
+from llmcompiler.src.tools.base import Tool
+from tools.health import HealthRegistry
+from tools.tools_manager import ToolsManager
+
+
+class FakeProbe:
+    """Probe whose result is set by the test."""
+
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if isinstance(self.ok, Exception):
+            raise self.ok
+        return self.ok
+
+
+async def slow_probe():
+    await asyncio.sleep(1)
+    return True
+
+
+async def noop(*args) -> str:
+    return ""
+
+
+@pytest.mark.asyncio
+async def test_tool_is_down_after_consecutive_failures():
+    """A single failed probe is tolerated, the tool comes back on success."""
+    registry = HealthRegistry(failure_threshold=2)
+    probe = FakeProbe(ok=False)
+    registry.register("get_temperature", probe)
+    assert registry.is_healthy("get_temperature")
+
+    await registry.probe_all()
+    assert registry.is_healthy("get_temperature")
+    probe.ok = ConnectionError("Node-RED unreachable")
+    await registry.probe_all()
+    assert not registry.is_healthy("get_temperature")
+    assert registry.get_stats()["get_temperature"]["error"] == "Node-RED unreachable"
+
+    probe.ok = True
+    await registry.probe_all()
+    assert registry.is_healthy("get_temperature")
+    assert registry.get_stats()["get_temperature"]["failures"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_probe_times_out():
+    """A probe slower than the timeout is a failure."""
+    registry = HealthRegistry(probe_timeout=0.01, failure_threshold=1)
+    registry.register("search", slow_probe)
+
+    await registry.probe_all()
+
+    assert registry.healthy(["search", "unknown"]) == ["unknown"]
+
+
+@pytest.mark.asyncio
+async def test_background_probes():
+    """Probes run right away, then every interval, until stopped."""
+    registry = HealthRegistry(interval=0.01)
+    probe = FakeProbe()
+    registry.register("search", probe)
+
+    await registry.start()
+    await asyncio.sleep(0.05)
+    await registry.stop()
+    calls = probe.calls
+    await asyncio.sleep(0.02)
+
+    assert calls >= 2
+    assert probe.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_planner_leaves_down_tools_out_of_the_prompt():
+    """The tools that are down are not offered to the planner."""
+    registry = HealthRegistry(failure_threshold=1)
+    tools = [
+        Tool(
+            name="get_temperature",
+            func=noop,
+            description="get_temperature(date: str) -> str",
+            health_check=FakeProbe(ok=False),
+        ),
+        Tool(name="search", func=noop, description="search(query: str) -> str"),
+    ]
+    registry.register_tools(tools)
+    planner = Planner(
+        llm=None,
+        example_prompt="",
+        example_prompt_replan="",
+        tools=tools,
+        stop=None,
+        tool_filter=registry.is_healthy,
+    )
+    assert "get_temperature" in planner.get_system_prompts(planner.available_tools())[0].text
+
+    await registry.probe_all()
+
+    available = planner.available_tools()
+    assert [tool.name for tool in available] == ["search"]
+    assert "get_temperature" not in planner.get_system_prompts(available)[0].text
+
+
+@pytest.mark.asyncio
+async def test_tools_manager_hides_down_tools():
+    """Unavailable tools are neither listed nor returned."""
+
+    class FakeTool:
+        def __init__(self, name, probe):
+            self.config = {"name": name, "description": "", "category": "", "enabled": True}
+            self.validate_dependencies = probe
+
+    registry = HealthRegistry(failure_threshold=1)
+    manager = ToolsManager(health=registry)
+    manager.add_tool(FakeTool("jokes", FakeProbe(ok=False)))
+    manager.add_tool(FakeTool("get_temperature", FakeProbe()))
+
+    await registry.probe_all()
+
+    assert [tool["name"] for tool in manager.list_tools()] == ["get_temperature"]
+    with pytest.raises(ValueError, match="unavailable"):
+        manager.get_tool("jokes")
@@ -0,0 +1,70 @@
+"""Tests for the shared HTTP client of the tools."""
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tools.base_tool import ToolConfig
+from tools.http_client import close_http_session, get_http_session
+from tools.node_red_tools import NodeREDStatusTool
+
+CONFIG = ToolConfig(name="node_red_status", description="", category="node_red")
+
+
+@pytest_asyncio.fixture
+async def node_red():
+    """Fake Node-RED recording the client port of every request."""
+    ports = []
+
+    async def list_temperatures(request):
+        ports.append(request.transport.get_extra_info("peername")[1])
+        return web.json_response({"measurements": [{"date": "2025-02-04"}]})
+
+    app = web.Application()
+    app.router.add_get("/list/temperatures", list_temperatures)
+    server = TestServer(app)
+    await server.start_server()
+    yield server, ports
+    await server.close()
+    await close_http_session()
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_reuse_the_same_connection(node_red):
+    """Successive calls of the tools share one keep-alive connection."""
+    server, ports = node_red
+    tools = [NodeREDStatusTool(CONFIG) for _ in range(2)]
+    for tool in tools:
+        tool.endpoint = str(server.make_url("")).rstrip("/")
+
+    for tool in tools * 2:
+        response = json.loads(await tool.execute(""))
+        assert response["success"]
+
+    assert len(ports) == 4
+    assert len(set(ports)) == 1
+
+
+@pytest.mark.asyncio
+async def test_session_is_shared_and_recreated_after_close():
+    session = get_http_session()
+    assert get_http_session() is session
+
+    await close_http_session()
+    assert session.closed
+    assert get_http_session() is not session
+    await close_http_session()
+
+
+@pytest.mark.asyncio
+async def test_injected_session_is_used(node_red):
+    server, ports = node_red
+    session = get_http_session()
+    tool = NodeREDStatusTool(CONFIG, session=session)
+    await close_http_session()
+
+    # the tool keeps the session it was given, even once closed elsewhere
+    assert tool.session is session
+    assert not json.loads(await tool.execute(""))["success"]
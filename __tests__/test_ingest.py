@@ -0,0 +1,105 @@
+"""Tests for the buffered ingestion of the sensor readings."""
+import asyncio
+import sqlite3
+
+import pytest
+
+from db.ingest import MeasurementIngestor
+from tools.temperature_backends import SQLiteBackend
+
+
+def readings(count, sensor="office"):
+    return [
+        {"sensor": sensor, "timestamp": f"2025-02-03T{i // 60:02d}:{i % 60:02d}:00",
+         "temperature": 20.0, "humidity": 50.0}
+        for i in range(count)
+    ]
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.asyncio
+async def test_readings_are_written_in_batches(tmp_path):
+    db_path = str(tmp_path / "measurements.db")
+    ingestor = MeasurementIngestor(db_path, batch_size=100, flush_interval=60)
+    await ingestor.start()
+
+    for _ in range(3):
+        await ingestor.add(readings(100, "office"))
+        await asyncio.sleep(0.05)
+    # the same readings again are ignored
+    await ingestor.add(readings(100, "office"))
+    await ingestor.close()
+
+    stats = ingestor.get_stats()
+    assert count_rows(db_path) == 100
+    assert stats["received"] == 400
+    assert stats["written"] == 100
+    assert stats["ignored"] == 300
+    assert stats["batches"] == 4
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_flushed_after_the_interval(tmp_path):
+    db_path = str(tmp_path / "measurements.db")
+    ingestor = MeasurementIngestor(db_path, batch_size=1000, flush_interval=0.05)
+    await ingestor.start()
+
+    await ingestor.add(readings(10))
+    await asyncio.sleep(0.3)
+
+    assert count_rows(db_path) == 10
+    await ingestor.close()
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_waits_for_a_flush(tmp_path):
+    """Without the background flush, a full buffer is written by `add`."""
+    ingestor = MeasurementIngestor(str(tmp_path / "measurements.db"), max_buffer=150)
+
+    await ingestor.add(readings(100, "office"))
+    await ingestor.add(readings(100, "lab"))
+
+    assert ingestor.get_stats()["written"] == 100
+    assert ingestor.get_stats()["buffered"] == 100
+    await ingestor.close()
+
+
+@pytest.mark.asyncio
+async def test_invalid_batch_is_rejected(tmp_path):
+    ingestor = MeasurementIngestor(str(tmp_path / "measurements.db"))
+
+    with pytest.raises(ValueError):
+        await ingestor.add(readings(2) + [{"timestamp": "hier", "temperature": 1, "humidity": 2}])
+
+    assert ingestor.get_stats()["buffered"] == 0
+    await ingestor.close()
+
+
+@pytest.mark.asyncio
+async def test_start_migrates_the_database_for_the_readers(tmp_path):
+    """A database of the original schema gets its rollups before any write."""
+    db_path = str(tmp_path / "measurements.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE measurements (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, "
+        "temperature REAL NOT NULL, humidity REAL NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.execute("INSERT INTO measurements (date, temperature, humidity) VALUES ('2025-02-03', 21.0, 45.0)")
+    conn.commit()
+    conn.close()
+    ingestor = MeasurementIngestor(db_path)
+    await ingestor.start()
+    backend = SQLiteBackend(db_path)
+
+    stats = await backend.get_stats("2025-02-03", "2025-02-03")
+
+    assert stats[0]["temperature"]["mean"] == 21.0
+    await backend.close()
+    await ingestor.close()
@@ -0,0 +1,172 @@
+"""Tests for the document ingestion pipeline."""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from llmcompiler.src.docstore.ingestion import DocumentIngestor, chunk_text, read_documents
+from llmcompiler.src.docstore.local_index import LocalVectorDocstore
+from llmcompiler.src.docstore.r2r_rag import R2RDocstore
+
+
+class FakeDocstore:
+    """Docstore recording the batches, failing the first `failures` calls."""
+
+    def __init__(self, failures=0, fail_on=None):
+        self.failures = failures
+        self.fail_on = fail_on
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def add_documents(self, documents):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("R2R unreachable")
+            if self.fail_on and any(self.fail_on in doc["text"] for doc in documents):
+                raise ValueError("rejected")
+            self.batches.append(documents)
+        finally:
+            self.in_flight -= 1
+
+
+class R2RConflict(Exception):
+    status_code = 409
+
+
+class PartlyFailingR2RClient:
+    """R2R documents API failing once on `fail_on`, refusing duplicate ids."""
+
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.created = {}
+        self.lock = threading.Lock()
+        self.documents = SimpleNamespace(create=self.create, delete_by_filter=lambda filters: None)
+
+    def create(self, raw_text, metadata=None, id=None):
+        with self.lock:
+            if raw_text == self.fail_on:
+                self.fail_on = None
+                raise ConnectionError("R2R unreachable")
+            if id in self.created:
+                raise R2RConflict(f"Document {id} already exists")
+            self.created[id] = raw_text
+
+
+def documents(count):
+    return [{"id": f"doc{i}", "text": f"document {i}"} for i in range(count)]
+
+
+def test_chunk_text_splits_at_boundaries():
+    text = "\n\n".join(f"Paragraphe {i} " + "mot " * 40 for i in range(5))
+
+    chunks = chunk_text(text, chunk_size=500, overlap=50)
+
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.startswith("Paragraphe") or chunk.startswith("mot") for chunk in chunks)
+    assert "Paragraphe 4" in chunks[-1]
+    assert chunk_text("court", chunk_size=500) == ["court"]
+    assert chunk_text("   ") == []
+
+
+@pytest.mark.asyncio
+async def test_batches_uploaded_concurrently():
+    docstore = FakeDocstore()
+    ingestor = DocumentIngestor(docstore, batch_size=4, concurrency=3)
+
+    stats = await ingestor.ingest(documents(30))
+
+    assert sorted(len(batch) for batch in docstore.batches) == [2] + [4] * 7
+    assert docstore.max_in_flight == 3
+    assert stats.uploaded == 30 and stats.batches == 8
+    assert ingestor.get_stats()["chunks_per_second"] > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried():
+    docstore = FakeDocstore(failures=2)
+    ingestor = DocumentIngestor(docstore, batch_size=10, concurrency=1, backoff=0.001)
+
+    stats = await ingestor.ingest(documents(10))
+
+    assert stats.retries == 2
+    assert stats.uploaded == 10 and stats.failed == 0
+
+
+@pytest.mark.asyncio
+async def test_interrupted_load_resumes_from_the_checkpoint(tmp_path):
+    """Only the chunks missing from the checkpoint are uploaded again."""
+    checkpoint = str(tmp_path / "load.checkpoint")
+    failing = FakeDocstore(fail_on="document 7")
+    first = DocumentIngestor(
+        failing, batch_size=5, concurrency=2, max_retries=1, backoff=0.001,
+        checkpoint_path=checkpoint,
+    )
+    stats = await first.ingest(documents(20))
+    assert stats.uploaded == 15 and stats.failed == 5
+
+    docstore = FakeDocstore()
+    second = DocumentIngestor(docstore, batch_size=5, checkpoint_path=checkpoint)
+    stats = await second.ingest(documents(20))
+
+    assert stats.skipped == 15 and stats.uploaded == 5
+    assert sorted(doc["text"] for doc in docstore.batches[0]) == [
+        f"document {i}" for i in range(5, 10)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_files_loaded_into_the_local_index(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    (docs / "chauffage.md").write_text("Le réglage du chauffage. " * 200, encoding="utf-8")
+    (docs / "sub" / "horaires.txt").write_text("Horaires : le bureau ouvre à 8h.", encoding="utf-8")
+    (docs / "image.png").write_bytes(b"\x89PNG")
+    docstore = LocalVectorDocstore(str(tmp_path / "index"))
+
+    stats = await DocumentIngestor(docstore, chunk_size=1000).ingest(read_documents([str(docs)]))
+
+    assert stats.documents == 2
+    assert stats.uploaded == stats.chunks == len(docstore) > 2
+    found = await docstore.asearch("horaires du bureau", top_k=1, return_raw=True)
+    assert found[0].metadata["title"] == "horaires.txt"
+    assert found[0].metadata["chunks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retried_r2r_batch_does_not_duplicate_chunks():
+    """Chunks of a failed batch already in R2R are not uploaded twice."""
+    client = PartlyFailingR2RClient(fail_on="document 3")
+    docstore = R2RDocstore(client=client, max_workers=1)
+    ingestor = DocumentIngestor(docstore, batch_size=5, concurrency=1, backoff=0.001)
+
+    stats = await ingestor.ingest(documents(5))
+    docstore.close()
+
+    assert stats.retries == 1 and stats.uploaded == 5
+    assert sorted(client.created.values()) == [f"document {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_changed_document_replaces_its_chunks():
+    """Loading a document again, without checkpoint, leaves only its current chunks."""
+    docstore = LocalVectorDocstore()
+    text = "\n\n".join(f"Paragraphe {i} " + "mot " * 40 for i in range(5))
+    ingestor = DocumentIngestor(docstore, chunk_size=500, chunk_overlap=0)
+
+    await ingestor.ingest([{"id": "manuel", "text": text}])
+    first = {document["id"] for document in docstore.documents}
+    await ingestor.ingest([{"id": "manuel", "text": text}])
+    assert {document["id"] for document in docstore.documents} == first
+
+    await ingestor.ingest([{"id": "manuel", "text": text.replace("Paragraphe 4", "Chapitre 4")}])
+
+    texts = [document["text"] for document in docstore.documents]
+    assert len(texts) == len(first)
+    assert sum("Chapitre 4" in text for text in texts) == 1
+    assert not any("Paragraphe 4" in text for text in texts)
@@ -0,0 +1,184 @@
+"""Tests for the local vector index."""
+import json
+
+import numpy as np
+import pytest
+
+from llmcompiler.configs.ittpc import tools as ittpc_tools
+from llmcompiler.src.docstore.local_index import (
+    HashingEmbedder,
+    LocalExplorer,
+    LocalVectorDocstore,
+)
+from llmcompiler.src.docstore.r2r_rag import RetrievalCache
+
+DOCUMENTS = [
+    {"text": "Le réglage du chauffage se fait depuis le tableau du bureau", "metadata": {"title": "Chauffage"}},
+    {"text": "La climatisation de la salle serveur reste à 19 degrés", "metadata": {"title": "Climatisation"}},
+    {"text": "Les horaires d'ouverture du bureau sont de 8h à 18h", "metadata": {"title": "Horaires"}},
+]
+
+
+def corpus(documents):
+    rng = np.random.default_rng(0)
+    return [
+        {"text": " ".join(f"mot{i}" for i in rng.integers(0, 500, size=20))}
+        for _ in range(documents)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_search_returns_closest_documents():
+    docstore = LocalVectorDocstore()
+    await docstore.add_documents(DOCUMENTS)
+
+    documents = await docstore.asearch("Comment régler le chauffage du bureau ?", top_k=2, return_raw=True)
+    formatted = await docstore.asearch("climatisation salle serveur", top_k=1)
+
+    assert [doc.metadata["title"] for doc in documents][0] == "Chauffage"
+    assert len(documents) == 2
+    assert documents[0].metadata["score"] >= documents[1].metadata["score"]
+    assert formatted.startswith("La climatisation de la salle serveur")
+    assert "(Score: " in formatted
+
+
+@pytest.mark.asyncio
+async def test_empty_index():
+    docstore = LocalVectorDocstore()
+    assert await docstore.asearch("chauffage") == "Aucun résultat trouvé pour 'chauffage'."
+
+
+@pytest.mark.asyncio
+async def test_incremental_adds_are_persisted(tmp_path):
+    """An index reopened from disk has every document, memory-mapped."""
+    docstore = LocalVectorDocstore(str(tmp_path))
+    ids = await docstore.add_documents(DOCUMENTS[:2])
+    await docstore.add_documents(DOCUMENTS[2:])
+    docstore.close()
+
+    reopened = LocalVectorDocstore(str(tmp_path))
+    documents = await reopened.asearch("horaires d'ouverture", top_k=1, return_raw=True)
+
+    assert len(reopened) == 3
+    assert isinstance(reopened._vectors, np.memmap)
+    assert documents[0].metadata["title"] == "Horaires"
+    assert ids[0] in await LocalExplorer(reopened).list_documents()
+
+
+@pytest.mark.asyncio
+async def test_documents_already_indexed_are_not_added_again(tmp_path):
+    docstore = LocalVectorDocstore(str(tmp_path))
+    documents = [{**document, "id": f"id{i}"} for i, document in enumerate(DOCUMENTS)]
+    await docstore.add_documents(documents[:2])
+    docstore.close()
+
+    reopened = LocalVectorDocstore(str(tmp_path))
+    ids = await reopened.add_documents(documents + documents[2:])
+
+    assert ids == ["id0", "id1", "id2", "id2"]
+    assert [document["id"] for document in reopened.documents] == ["id0", "id1", "id2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index", ["flat", "ivf"])
+async def test_stale_chunks_are_removed(tmp_path, index):
+    docstore = LocalVectorDocstore(str(tmp_path), index=index)
+    await docstore.add_documents(
+        [{"id": f"old{i}", "text": text["text"], "metadata": {"document_id": "manuel"}}
+         for i, text in enumerate(corpus(40))]
+        + [{**DOCUMENTS[2], "id": "horaires"}]
+    )
+
+    removed = await docstore.remove_stale_chunks("manuel", keep=["old3"])
+    docstore.close()
+
+    reopened = LocalVectorDocstore(str(tmp_path), index=index)
+    found = await reopened.asearch("horaires d'ouverture", top_k=1, return_raw=True)
+    assert removed == 39
+    assert [document["id"] for document in reopened.documents] == ["old3", "horaires"]
+    assert found[0].metadata["id"] == "horaires"
+
+
+@pytest.mark.asyncio
+async def test_interrupted_add_is_discarded(tmp_path):
+    """Rows written after the last count of meta.json are ignored, then overwritten."""
+    docstore = LocalVectorDocstore(str(tmp_path))
+    await docstore.add_documents(DOCUMENTS[:2])
+    with open(tmp_path / "documents.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "partial", "text": "partial", "metadata": {}}) + "\n")
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.ones(docstore.dim, dtype=np.float32).tobytes())
+
+    reopened = LocalVectorDocstore(str(tmp_path))
+    await reopened.add_documents(DOCUMENTS[2:])
+
+    assert [doc["metadata"]["title"] for doc in LocalVectorDocstore(str(tmp_path)).documents] == [
+        "Chauffage", "Climatisation", "Horaires"
+    ]
+
+
+def test_other_embedder_is_refused(tmp_path):
+    docstore = LocalVectorDocstore(str(tmp_path))
+    docstore._add(DOCUMENTS)
+    with pytest.raises(ValueError, match="hashing-v2-384"):
+        LocalVectorDocstore(str(tmp_path), embed_fn=HashingEmbedder(dim=64))
+
+
+def test_index_of_the_previous_hashing_scheme_is_refused(tmp_path):
+    docstore = LocalVectorDocstore(str(tmp_path))
+    docstore._add(DOCUMENTS)
+    meta = json.loads((tmp_path / "meta.json").read_text())
+    (tmp_path / "meta.json").write_text(json.dumps({**meta, "embedder": "hashing-384"}))
+    with pytest.raises(ValueError, match="built with hashing-384"):
+        LocalVectorDocstore(str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_ivf_finds_the_documents(tmp_path):
+    """Each document is its own nearest neighbour, with the clustered index too."""
+    documents = corpus(400)
+    docstore = LocalVectorDocstore(str(tmp_path), index="ivf", n_probe=4)
+    await docstore.add_documents(documents[:200])
+    await docstore.add_documents(documents[200:])
+
+    assert docstore.get_stats()["lists"] == 20
+    for document in documents[::40]:
+        found = await docstore.asearch(document["text"], top_k=1, return_raw=True)
+        assert found[0].page_content == document["text"]
+
+    reopened = LocalVectorDocstore(str(tmp_path), index="ivf", n_probe=4)
+    assert reopened.get_stats()["lists"] == 20
+    found = await reopened.asearch(documents[123]["text"], top_k=1, return_raw=True)
+    assert found[0].page_content == documents[123]["text"]
+
+
+@pytest.mark.asyncio
+async def test_adding_documents_invalidates_the_cache():
+    cache = RetrievalCache()
+    docstore = LocalVectorDocstore(cache=cache)
+    await docstore.add_documents(DOCUMENTS[:1])
+    assert len(await docstore.asearch("horaires", return_raw=True)) == 1
+
+    await docstore.add_documents(DOCUMENTS[1:])
+
+    assert len(await docstore.asearch("horaires", return_raw=True)) == 3
+
+
+@pytest.mark.asyncio
+async def test_selected_in_ittpc(monkeypatch, tmp_path):
+    """With KNOWLEDGE_BACKEND=local, search_knowledge searches the local index."""
+    docstore = LocalVectorDocstore(str(tmp_path / "index"))
+    await docstore.add_documents(DOCUMENTS)
+    docstore.close()
+    monkeypatch.setenv("KNOWLEDGE_BACKEND", "local")
+    monkeypatch.setattr(ittpc_tools, "KNOWLEDGE_INDEX_PATH", str(tmp_path / "index"))
+    monkeypatch.setattr(ittpc_tools, "_r2r_explorer", None)
+
+    result = await ittpc_tools.search_knowledge("comment faire le réglage du chauffage du bureau", top_k=1)
+    similar = await ittpc_tools.search_knowledge("comment faire le le réglage du chauffage du bureau", top_k=1)
+    cache = (await ittpc_tools.get_r2r_explorer()).docstore.cache
+
+    assert result.startswith("Le réglage du chauffage")
+    assert similar == result and cache.get_stats()["similar_hits"] == 1
+    assert "Titre: Horaires" in await ittpc_tools.list_r2r_documents()
+    ittpc_tools.close_r2r()
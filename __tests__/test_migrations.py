@@ -0,0 +1,61 @@
+"""Tests for the migrations of the measurements database."""
+import sqlite3
+
+import pytest
+
+from db.migrations import SCHEMA_VERSION, connect, get_version, migrate
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """Database created by the original init_db.py, seeded twice."""
+    db_path = str(tmp_path / "measurements.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE measurements (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "date TEXT NOT NULL, temperature REAL NOT NULL, humidity REAL NOT NULL, "
+        "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    )
+    for temperature in (18.0, 21.0):
+        conn.executemany(
+            "INSERT INTO measurements (date, temperature, humidity) VALUES (?, ?, ?)",
+            [("2025-02-03", temperature, 50.0), ("2025-02-04", temperature, 55.0)],
+        )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_legacy_database_is_deduplicated_and_indexed(legacy_db):
+    conn = connect(legacy_db)
+
+    assert get_version(conn) == SCHEMA_VERSION
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    rows = conn.execute(
+        "SELECT sensor, timestamp, date, temperature FROM measurements ORDER BY date"
+    ).fetchall()
+    # the most recent of the duplicated rows is kept
+    assert rows == [
+        ("office", "2025-02-03T00:00:00", "2025-02-03", 21.0),
+        ("office", "2025-02-04T00:00:00", "2025-02-04", 21.0),
+    ]
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM measurements WHERE date = ?", ("2025-02-03",)
+    ).fetchall()
+    assert "idx_measurements_date" in plan[0][-1]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO measurements (timestamp, date, temperature, humidity) "
+            "VALUES ('2025-02-03T00:00:00', '2025-02-03', 0, 0)"
+        )
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = connect(str(tmp_path / "measurements.db"))
+    conn.execute(
+        "INSERT INTO measurements (timestamp, date, temperature, humidity) "
+        "VALUES ('2025-02-03T08:00:00', '2025-02-03', 19.0, 50.0)"
+    )
+
+    assert migrate(conn) == SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0] == 1
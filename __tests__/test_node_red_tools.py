@@ -0,0 +1,65 @@
+"""Tests for the Node-RED tools."""
+import json
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tools.base_tool import ToolConfig
+from tools.http_client import close_http_session
+from tools.node_red_tools import TemperatureTool
+from tools.temperature_backends import NodeREDBackend
+
+CONFIG = ToolConfig(name="get_temperature", description="", category="node_red")
+MEASUREMENTS = {"2025-02-03": 19.5, "2025-02-04": 21.0}
+
+
+@pytest_asyncio.fixture
+async def temperature_tool():
+    """Temperature tool backed by a fake Node-RED recording its requests."""
+    requests = []
+
+    async def query_temperature(request):
+        requests.append(dict(request.query))
+        date = request.query["date"]
+        if date == "latest" or (
+            date not in MEASUREMENTS and request.query.get("fallback") == "latest"
+        ):
+            date = max(MEASUREMENTS)
+        if date not in MEASUREMENTS:
+            return web.json_response({"status": "not_found"}, status=404)
+        return web.json_response({"date": date, "temperature": MEASUREMENTS[date]})
+
+    app = web.Application()
+    app.router.add_get("/query/temperature", query_temperature)
+    server = TestServer(app)
+    await server.start_server()
+    tool = TemperatureTool(
+        CONFIG, backend=NodeREDBackend(str(server.make_url("")).rstrip("/"))
+    )
+    yield tool, requests
+    await server.close()
+    await close_http_session()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "parameters, expected_date",
+    [
+        (None, "2025-02-04"),
+        ({"date": "date='2025-02-03'"}, "2025-02-03"),
+        ({"date": "2025-01-01"}, "2025-02-04"),
+        ({"date": "yesterday"}, "2025-02-04"),
+    ],
+)
+async def test_execute_makes_a_single_request(temperature_tool, parameters, expected_date):
+    """Missing, unknown and invalid dates fall back to the latest measurement."""
+    tool, requests = temperature_tool
+
+    response = json.loads(await tool.execute("", parameters))
+
+    assert response["success"]
+    assert response["data"]["date"] == expected_date
+    assert len(requests) == 1
+    assert requests[0]["fallback"] == "latest"
@@ -0,0 +1,139 @@
+"""Tests for the plan cache."""
+import asyncio
+
+import pytest
+
+from llmcompiler.src.llm_compiler.output_parser import LLMCompilerPlanParser
+from llmcompiler.src.llm_compiler.plan_cache import PlanCache, normalize_query
+from llmcompiler.src.llm_compiler.planner import Planner
+from llmcompiler.src.tools.base import Tool
+
+
+async def get_temperature(date: str) -> str:
+    return f"22.5 on {date}"
+
+
+async def search(query: str) -> str:
+    return f"result for {query}"
+
+
+TOOLS = [
+    Tool(
+        name="get_temperature",
+        func=get_temperature,
+        description="get_temperature(date: str) -> str",
+    ),
+    Tool(name="search", func=search, description="search(query: str) -> str"),
+]
+
+PLAN = (
+    "Thought: get the temperature\n"
+    '1. get_temperature("2025-02-04")\n'
+    '2. search("$1")\n'
+    "3. join()\n"
+)
+
+
+def parse(plan=PLAN, tools=TOOLS):
+    return LLMCompilerPlanParser(tools=tools).parse(plan)
+
+
+def test_normalize_query():
+    """Case, accents, punctuation and spacing do not change the key."""
+    assert normalize_query("Quelle est la  température aujourd'hui ?") == (
+        "quelle est la temperature aujourd hui"
+    )
+
+
+@pytest.mark.asyncio
+async def test_hit_returns_fresh_tasks():
+    """A cached plan is replayed as new tasks, without past observations."""
+    cache = PlanCache()
+    tasks = parse()
+    tasks[1].observation = "22.5"
+    await cache.store("Quelle est la température aujourd'hui ?", TOOLS, tasks)
+
+    replayed = await cache.lookup("quelle est la temperature aujourd'hui", TOOLS)
+
+    assert [task.name for task in replayed.values()] == [
+        "get_temperature",
+        "search",
+        "join",
+    ]
+    assert replayed[1].observation is None
+    assert replayed[1].thought == "get the temperature"
+    assert replayed[2].dependencies == [1]
+    assert await cache.lookup("liste les documents", TOOLS) is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_plans_are_kept_per_tool_set_until_expiry():
+    """A plan is served for its tool set only, and survives a change of tools."""
+    cache = PlanCache(ttl=0.05)
+    await cache.store("question", TOOLS, parse())
+    assert await cache.lookup("question", TOOLS[:1]) is None
+    # the tool set is back, e.g. a tool was briefly down
+    assert await cache.lookup("question", TOOLS) is not None
+
+    await asyncio.sleep(0.06)
+    assert await cache.lookup("question", TOOLS) is None
+
+
+@pytest.mark.asyncio
+async def test_similar_question_reuses_the_plan():
+    """With an embedding function, a close enough question is a hit."""
+    vectors = {
+        "temperature du jour": [1.0, 0.0],
+        "temperature d aujourd hui": [0.99, 0.05],
+        "liste les documents": [0.0, 1.0],
+    }
+    cache = PlanCache(embed_fn=vectors.__getitem__, similarity_threshold=0.9)
+    await cache.store("Température du jour", TOOLS, parse())
+
+    assert await cache.lookup("Température d'aujourd'hui", TOOLS) is not None
+    assert await cache.lookup("Liste les documents", TOOLS) is None
+    assert cache.get_stats()["similar_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_discard_forgets_the_plan_served_by_similarity():
+    """A plan found insufficient for a similar question is not replayed again."""
+    vectors = {
+        "temperature du jour": [1.0, 0.0],
+        "temperature d aujourd hui": [0.99, 0.05],
+        "temperature de ce jour": [0.98, 0.1],
+    }
+    cache = PlanCache(embed_fn=vectors.__getitem__, similarity_threshold=0.9)
+    await cache.store("Température du jour", TOOLS, parse())
+    assert await cache.lookup("Température d'aujourd'hui", TOOLS) is not None
+
+    cache.discard("Température d'aujourd'hui", TOOLS)
+
+    assert await cache.lookup("Température de ce jour", TOOLS) is None
+    assert await cache.lookup("Température du jour", TOOLS) is None
+
+
+@pytest.mark.asyncio
+async def test_planner_replays_cached_plan_into_the_queue():
+    """A hit fills the task queue without calling the planner LLM."""
+    cache = PlanCache()
+    planner = Planner(
+        llm=None,
+        example_prompt="",
+        example_prompt_replan="",
+        tools=TOOLS,
+        stop=None,
+        plan_cache=cache,
+    )
+    await cache.store("température ?", TOOLS, parse())
+
+    queue = asyncio.Queue()
+    await planner.aplan(
+        inputs={"input": "Température"}, task_queue=queue, is_replan=False
+    )
+
+    items = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [item.idx for item in items[:-1]] == [1, 2, 3]
+    assert items[-1] is None
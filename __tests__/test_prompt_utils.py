@@ -0,0 +1,77 @@
+"""Tests for the prompt prefix registry."""
+from types import SimpleNamespace
+
+import pytest
+
+from llmcompiler.src.callbacks.callbacks import AsyncStatsCallbackHandler
+from llmcompiler.src.utils import prompt_utils
+from llmcompiler.src.utils.prompt_utils import PromptPrefixRegistry
+
+
+@pytest.fixture
+def tokenised(monkeypatch):
+    """Count words instead of tokens, and record every tokenised text."""
+    texts = []
+
+    def count_tokens(text, model_name=None):
+        texts.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(prompt_utils, "count_tokens", count_tokens)
+    return texts
+
+
+def test_only_the_suffix_is_tokenised(tokenised):
+    """A registered prefix is tokenised once, whatever the number of prompts."""
+    registry = PromptPrefixRegistry()
+    prefix = registry.register("You are a planner.\n")
+
+    assert registry.count_tokens(prefix.text + "Question: a b") == 4 + 3
+    assert registry.count_tokens(prefix.text + "Question: c") == 4 + 2
+    assert registry.count_tokens("unknown prompt") == 2
+    assert tokenised == [
+        "You are a planner.\n",
+        "Question: a b",
+        "Question: c",
+        "unknown prompt",
+    ]
+
+
+def test_longest_prefix_is_used(tokenised):
+    registry = PromptPrefixRegistry()
+    registry.register("Instructions\n")
+    longest = registry.register("Instructions\nExamples\n")
+
+    assert registry.match("Instructions\nExamples\nQuestion") is longest
+    assert registry.register("Instructions\nExamples\n") is longest
+
+
+def test_least_recently_used_prefixes_are_forgotten(tokenised):
+    registry = PromptPrefixRegistry(max_entries=2)
+    first = registry.register("system prompt 1\n")
+    registry.register("system prompt 2\n")
+
+    assert registry.match("system prompt 1\nQuestion") is first
+    registry.register("system prompt 3 with more tools\n")
+
+    assert registry.match("system prompt 2\nQuestion") is None
+    assert registry.match("system prompt 1\n") is first
+    assert len(registry._prefixes) == 2
+
+
+@pytest.mark.asyncio
+async def test_stats_callback_counts_every_message(tokenised):
+    """In stream mode, the system and human messages are both counted."""
+    registry = PromptPrefixRegistry()
+    system = registry.register("system prompt with examples")
+    handler = AsyncStatsCallbackHandler(stream=True, prefixes=registry)
+    messages = [
+        SimpleNamespace(content=system.text),
+        SimpleNamespace(content="Question: quelle température ?"),
+    ]
+
+    await handler.on_chat_model_start({}, [messages])
+    await handler.on_chat_model_start({}, [messages])
+
+    assert handler.get_stats()["input_tokens"] == 2 * (4 + 4)
+    assert tokenised.count(system.text) == 1
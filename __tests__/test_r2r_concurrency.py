@@ -0,0 +1,105 @@
+"""Tests for the offloading of the R2R calls to a thread pool."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from llmcompiler.configs.ittpc import tools as ittpc_tools
+from llmcompiler.src.docstore.r2r_rag import R2RDocstore, R2RExplorer
+
+LATENCY = 0.2  # seconds of each call to R2R Cloud
+
+
+class FakeR2RClient:
+    """Synchronous client recording when each call runs."""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.retrieval = SimpleNamespace(rag=self.rag, search=self.search)
+        self.documents = SimpleNamespace(create=self.create)
+
+    def _call(self, name, **kwargs):
+        start = time.perf_counter()
+        time.sleep(LATENCY)
+        with self.lock:
+            self.calls.append((name, kwargs, start, time.perf_counter()))
+
+    def rag(self, query, **kwargs):
+        self._call("rag", query=query)
+        return SimpleNamespace(results=SimpleNamespace(generated_answer=f"answer to {query}"))
+
+    def search(self, query, search_settings=None):
+        self._call("search", query=query)
+        chunk = SimpleNamespace(text=f"chunk about {query}", score=0.9)
+        return SimpleNamespace(results=SimpleNamespace(chunk_search_results=[chunk]))
+
+    def create(self, raw_text, metadata=None, id=None):
+        self._call("create", raw_text=raw_text, metadata=metadata, id=id)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeR2RClient()
+    docstore = R2RDocstore(client=client, max_workers=4)
+    monkeypatch.setattr(ittpc_tools, "_r2r_explorer", R2RExplorer(docstore))
+    yield client
+    docstore.close()
+
+
+@pytest.mark.asyncio
+async def test_parallel_searches_overlap(client):
+    """Parallel searches run at once, and the event loop keeps running meanwhile."""
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    start = time.perf_counter()
+    answers = await asyncio.gather(
+        *(ittpc_tools.search_knowledge(f"question {i}") for i in range(4))
+    )
+    elapsed = time.perf_counter() - start
+    ticker.cancel()
+
+    assert answers == [f"answer to question {i}" for i in range(4)]
+    # serial calls would take 4 * LATENCY
+    assert elapsed < 2 * LATENCY
+    assert max(call[2] for call in client.calls) < min(call[3] for call in client.calls)
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded_and_queued_calls_are_cancelled(client):
+    """Calls beyond the pool size wait, and are never sent once cancelled."""
+    searches = [
+        asyncio.create_task(ittpc_tools.search_knowledge(f"question {i}")) for i in range(6)
+    ]
+    await asyncio.sleep(LATENCY / 2)
+    for search in searches[4:]:
+        search.cancel()
+    await asyncio.gather(*searches, return_exceptions=True)
+    # a cancelled call that had been sent anyway would be over by now
+    await asyncio.sleep(LATENCY * 1.5)
+
+    assert sorted(call[1]["query"] for call in client.calls) == [
+        f"question {i}" for i in range(4)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_asearch_and_add_documents(client):
+    """The async search and the ingestion go through the thread pool as well."""
+    docstore = ittpc_tools._r2r_explorer.docstore
+
+    documents = await docstore.asearch("chauffage", return_raw=True)
+    await docstore.add_documents([{"text": "a"}, {"text": "b", "metadata": {"title": "B"}}])
+
+    assert documents[0].page_content == "chunk about chauffage"
+    assert sorted(call[1]["raw_text"] for call in client.calls if call[0] == "create") == ["a", "b"]
@@ -0,0 +1,89 @@
+"""Tests for the retrieval cache of the R2R docstore."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llmcompiler.src.docstore.r2r_rag import R2RDocstore, R2RExplorer, RetrievalCache
+
+
+class FakeR2RClient:
+    """Synchronous client counting the RAG generations."""
+
+    def __init__(self):
+        self.generations = 0
+        self.retrieval = SimpleNamespace(rag=self.rag, search=self.search)
+        self.documents = SimpleNamespace(create=lambda raw_text, metadata=None, id=None: None)
+
+    def rag(self, query, **kwargs):
+        self.generations += 1
+        return SimpleNamespace(
+            results=SimpleNamespace(generated_answer=f"answer {self.generations}")
+        )
+
+    def search(self, query, search_settings=None):
+        chunk = SimpleNamespace(text=f"chunk about {query}", score=0.9)
+        return SimpleNamespace(results=SimpleNamespace(chunk_search_results=[chunk]))
+
+
+def make_explorer(cache):
+    client = FakeR2RClient()
+    return client, R2RExplorer(R2RDocstore(client=client, cache=cache))
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_is_not_generated_again():
+    """Case, accents and punctuation do not change the key, top_k does."""
+    client, explorer = make_explorer(RetrievalCache())
+
+    assert await explorer.search("Qu'est-ce que le chauffage ?") == "answer 1"
+    assert await explorer.search("qu est ce que le chauffage") == "answer 1"
+    assert await explorer.search("qu est ce que le chauffage", top_k=3) == "answer 2"
+    assert client.generations == 2
+    assert explorer.docstore.cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_similar_query_is_served_from_the_cache():
+    """With an embedding function, a close enough query is a hit."""
+    vectors = {
+        "reglage du chauffage": [1.0, 0.0],
+        "comment regler le chauffage": [0.98, 0.1],
+        "horaires du bureau": [0.0, 1.0],
+    }
+    cache = RetrievalCache(embed_fn=vectors.__getitem__, similarity_threshold=0.9)
+    client, explorer = make_explorer(cache)
+
+    await explorer.search("Réglage du chauffage")
+    assert await explorer.search("Comment régler le chauffage ?") == "answer 1"
+    assert await explorer.search("Horaires du bureau") == "answer 2"
+    assert cache.get_stats()["similar_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_adding_documents_invalidates_the_collection():
+    """Results of the changed collection are dropped, including the searches."""
+    cache = RetrievalCache()
+    client, explorer = make_explorer(cache)
+    docstore = explorer.docstore
+    await explorer.search("chauffage")
+    await docstore.asearch("chauffage")
+    await cache.put("rag", "other", 5, "chauffage", "other answer")
+
+    await docstore.add_documents([{"text": "Nouveau réglage du chauffage"}])
+
+    assert await cache.get("rag", "other", 5, "chauffage") == "other answer"
+    assert await explorer.search("chauffage") == "answer 2"
+    assert cache.get_stats()["entries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_expiry_and_lru_eviction():
+    cache = RetrievalCache(ttl=0.01, max_entries=2)
+    for query in ("a", "b", "c"):
+        await cache.put("rag", "default", 5, query, query)
+    assert await cache.get("rag", "default", 5, "a") is None
+    assert await cache.get("rag", "default", 5, "c") == "c"
+
+    await asyncio.sleep(0.02)
+    assert await cache.get("rag", "default", 5, "c") is None
@@ -0,0 +1,116 @@
+"""Tests for the streaming plan parser."""
+import asyncio
+
+import pytest
+
+from llmcompiler.src.llm_compiler.planner import StreamingGraphParser
+from llmcompiler.src.llm_compiler.task_fetching_unit import Task, TaskFetchingUnit
+from llmcompiler.src.tools.base import Tool
+
+
+async def search(query: str) -> str:
+    return f"result for {query}"
+
+
+TOOLS = [Tool(name="search", func=search, description="search(query: str) -> str")]
+
+
+def feed(parser, tokens):
+    """Ingest the tokens and return what was emitted after each one."""
+    return [parser.ingest_token(token) for token in tokens]
+
+
+def test_token_with_several_lines_emits_every_task():
+    """All the lines ended by a token are parsed, with their thoughts."""
+    parser = StreamingGraphParser(tools=TOOLS)
+    emitted = feed(
+        parser,
+        ['Thought: look it up\n1. search("béton")\n2. sea', 'rch("ciment")\n3. join()'],
+    )
+    emitted.append(parser.finalize())
+
+    first, second, last = emitted
+    assert [(task.idx, task.thought) for task in first] == [(1, "look it up")]
+    assert second[0].idx == 2 and second[0].args == ("ciment",)
+    assert last[0].is_join and last[0].dependencies == [1, 2]
+
+
+def test_parsers_do_not_share_state():
+    """Concurrent plans streamed to separate parsers do not mix."""
+    first = StreamingGraphParser(tools=TOOLS)
+    second = StreamingGraphParser(tools=TOOLS)
+
+    assert first.ingest_token("Thought: first\n1. search(") == []
+    assert second.ingest_token("Thought: second\n1. search(") == []
+    tasks = first.ingest_token('"a")\n') + second.ingest_token('"b")\n')
+
+    assert [(task.thought, task.args) for task in tasks] == [
+        ("first", ("a",)),
+        ("second", ("b",)),
+    ]
+
+
+def test_speculative_task_is_emitted_when_arguments_close():
+    """A task is emitted before its line ends, and not emitted twice."""
+    parser = StreamingGraphParser(tools=TOOLS, speculative=True)
+    emitted = feed(parser, ["1. search", '("béton', '")', "\n", "2. join()", "\n"])
+
+    assert emitted[:2] == [[], []]
+    assert emitted[2][0].idx == 1 and emitted[2][0].name == "search"
+    assert emitted[3] == []
+    assert emitted[5][0].is_join
+
+
+def test_speculative_task_is_corrected_at_end_of_line():
+    """If the line goes on after the parenthesis, the task is emitted again."""
+    parser = StreamingGraphParser(tools=TOOLS, speculative=True)
+    emitted = feed(parser, ['1. search("a")', ' + "b")', "\n"])
+
+    assert emitted[0][0].raw_args == '"a"'
+    assert emitted[1] == []
+    assert emitted[2][0].idx == 1
+    assert emitted[2][0].raw_args == '"a") + "b"'
+
+
+def test_tool_hint_is_given_once_per_line():
+    """The tool name is reported as soon as the call is opened."""
+    hints = []
+    parser = StreamingGraphParser(tools=TOOLS, on_tool_hint=hints.append)
+    emitted = feed(
+        parser, ["1. sea", "rch(", '"a', '")', "\n", "2. search(", '"b")', "\n"]
+    )
+
+    assert hints == ["search", "search"]
+    # without speculation, tasks still wait for the end of their line
+    assert [task.idx for tasks in emitted for task in tasks] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_replaced_speculative_task_is_cancelled():
+    """Registering a corrected task cancels the speculative one."""
+    started, finished = [], []
+
+    def make(args):
+        async def tool(*a):
+            started.append(args)
+            await asyncio.sleep(0.05)
+            finished.append(args)
+            return args
+
+        return Task(idx=1, name="search", tool=tool, args=[args], dependencies=[])
+
+    queue = asyncio.Queue()
+    unit = TaskFetchingUnit(speculative=True)
+    scheduler = asyncio.create_task(unit.aschedule(task_queue=queue, func=None))
+    await queue.put(make("speculated"))
+    await asyncio.sleep(0.01)
+    await queue.put(make("corrected"))
+    await queue.put(
+        Task(idx=2, name="join", tool=None, args=[], dependencies=[1], is_join=True)
+    )
+    await queue.put(None)
+    await asyncio.wait_for(scheduler, timeout=1)
+
+    assert started == ["speculated", "corrected"]
+    assert finished == ["corrected"]
+    assert unit.tasks[1].observation == "corrected"
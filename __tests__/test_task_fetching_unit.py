@@ -0,0 +1,201 @@
+"""Tests for the TaskFetchingUnit scheduler."""
+import asyncio
+import time
+
+import pytest
+
+from llmcompiler.src.executors.tool_cache import ToolResultCache
+from llmcompiler.src.executors.tool_executor import ToolExecutor, ToolLimits
+from llmcompiler.src.llm_compiler.constants import TASK_TIMEOUT
+from llmcompiler.src.llm_compiler.task_fetching_unit import Task, TaskFetchingUnit
+
+
+def make_task(idx, dependencies=(), delay=0.0, log=None, result=None, is_join=False):
+    """Build a task whose tool sleeps `delay` seconds and records its start/end."""
+
+    async def tool(*args):
+        if log is not None:
+            log.append(("start", idx, time.perf_counter()))
+        await asyncio.sleep(delay)
+        if log is not None:
+            log.append(("end", idx, time.perf_counter()))
+        return result if result is not None else f"obs{idx}({', '.join(map(str, args))})"
+
+    return Task(
+        idx=idx,
+        name="join" if is_join else f"tool{idx}",
+        tool=tool,
+        args=[f"${d}" for d in dependencies],
+        dependencies=list(dependencies),
+        is_join=is_join,
+    )
+
+
+@pytest.mark.asyncio
+async def test_schedule_respects_dependencies():
+    """A task only starts once all of its dependencies are done."""
+    log = []
+    tasks = {
+        1: make_task(1, delay=0.05, log=log),
+        2: make_task(2, delay=0.01, log=log),
+        3: make_task(3, dependencies=[1, 2], log=log),
+        4: make_task(4, dependencies=[1, 2, 3], is_join=True),
+    }
+    unit = TaskFetchingUnit()
+    unit.set_tasks(tasks)
+    await unit.schedule()
+
+    events = {(kind, idx): t for kind, idx, t in log}
+    assert events[("start", 3)] >= events[("end", 1)]
+    assert events[("start", 3)] >= events[("end", 2)]
+    assert tasks[3].observation == "obs3(obs1(), obs2())"
+    assert all(event.is_set() for event in unit.tasks_done.values())
+    assert not unit.remaining_tasks
+
+
+@pytest.mark.asyncio
+async def test_dependents_start_without_polling_delay():
+    """A long chain of instant tasks is not slowed down by a scheduling interval."""
+    num_tasks = 50
+    tasks = {1: make_task(1)}
+    for idx in range(2, num_tasks + 1):
+        tasks[idx] = make_task(idx, dependencies=[idx - 1])
+    unit = TaskFetchingUnit()
+    unit.set_tasks(tasks)
+
+    start = time.perf_counter()
+    await unit.schedule()
+    # the former polling scheduler needed at least 10 ms per hop
+    assert time.perf_counter() - start < num_tasks * 0.01 / 2
+
+
+@pytest.mark.asyncio
+async def test_aschedule_runs_tasks_as_they_arrive():
+    """Streamed tasks start before the end of the plan is received."""
+    log = []
+    queue = asyncio.Queue()
+    unit = TaskFetchingUnit()
+    scheduler = asyncio.create_task(unit.aschedule(task_queue=queue, func=None))
+
+    await queue.put(make_task(1, delay=0.01, log=log))
+    await asyncio.sleep(0.05)
+    # task 1 is done while the planner is still "streaming"
+    assert unit.tasks_done[1].is_set()
+
+    await queue.put(make_task(2, dependencies=[1], log=log))
+    await queue.put(make_task(3, dependencies=[1, 2], is_join=True))
+    await queue.put(None)
+    await asyncio.wait_for(scheduler, timeout=1)
+
+    assert unit.tasks[2].observation == "obs2(obs1())"
+    assert unit.tasks_done[3].is_set()
+
+
+@pytest.mark.asyncio
+async def test_failing_task_does_not_block_the_plan():
+    """A failing tool still releases the tasks depending on it."""
+
+    async def broken_tool(*args):
+        raise RuntimeError("boom")
+
+    tasks = {
+        1: Task(idx=1, name="broken", tool=broken_tool, args=[], dependencies=[]),
+        2: make_task(2, dependencies=[1], is_join=True),
+    }
+    unit = TaskFetchingUnit()
+    unit.set_tasks(tasks)
+    await asyncio.wait_for(unit.schedule(), timeout=1)
+
+    assert tasks[1].observation is None
+    assert unit.tasks_done[2].is_set()
+
+
+@pytest.mark.asyncio
+async def test_critical_path_tasks_start_first():
+    """With a single slot, the task heading the longest path runs first."""
+    executor = ToolExecutor()
+    executor.configure("search", ToolLimits(max_concurrency=1))
+    executor.record_latency("search", 0.01)
+    executor.record_latency("math", 5.0)
+    order = []
+
+    def search_task(idx, dependencies=()):
+        task = make_task(idx, dependencies)
+        task.name = "search"
+        tool = task.tool
+
+        async def traced(*args):
+            order.append(idx)
+            return await tool(*args)
+
+        task.tool = traced
+        return task
+
+    tasks = {
+        # 1 and 2 are independent, but only 2 is followed by a slow task
+        1: search_task(1),
+        2: search_task(2),
+        3: make_task(3, dependencies=[2]),
+        4: make_task(4, dependencies=[1, 2, 3], is_join=True),
+    }
+    tasks[3].name = "math"
+    # identical calls would be coalesced by a cache knowing "search"
+    unit = TaskFetchingUnit(executor=executor, cache=ToolResultCache())
+    unit.set_tasks(tasks)
+    await unit.schedule()
+
+    assert order == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_tool_timeout_marks_the_task_as_timed_out():
+    """A call outliving its tool's timeout gets the timeout observation."""
+    executor = ToolExecutor()
+    executor.configure("tool1", ToolLimits(timeout=0.01))
+    tasks = {
+        1: make_task(1, delay=1),
+        2: make_task(2, dependencies=[1], is_join=True),
+    }
+    unit = TaskFetchingUnit(executor=executor)
+    unit.set_tasks(tasks)
+    await asyncio.wait_for(unit.schedule(), timeout=0.5)
+
+    assert tasks[1].observation == TASK_TIMEOUT
+
+
+@pytest.mark.asyncio
+async def test_plan_deadline_keeps_partial_results():
+    """When the plan deadline passes, finished observations are kept."""
+    tasks = {
+        1: make_task(1, delay=0),
+        2: make_task(2, delay=1),
+        3: make_task(3, dependencies=[2]),
+        4: make_task(4, dependencies=[1, 2, 3], is_join=True),
+    }
+    unit = TaskFetchingUnit()
+    unit.set_tasks(tasks)
+    await asyncio.wait_for(unit.schedule(timeout=0.05), timeout=0.5)
+
+    assert tasks[1].observation == "obs1()"
+    assert tasks[2].observation == TASK_TIMEOUT
+    assert tasks[3].observation == TASK_TIMEOUT
+    assert not unit._running
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_schedule_cancels_running_tasks():
+    """Cancelling the request cancels every task still in flight."""
+    log = []
+    queue = asyncio.Queue()
+    unit = TaskFetchingUnit()
+    scheduler = asyncio.create_task(unit.aschedule(task_queue=queue, func=None))
+    await queue.put(make_task(1, delay=1, log=log))
+    await asyncio.sleep(0.01)
+
+    scheduler.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await scheduler
+
+    assert ("start", 1) in [(kind, idx) for kind, idx, _ in log]
+    assert ("end", 1) not in [(kind, idx) for kind, idx, _ in log]
+    assert not unit._running
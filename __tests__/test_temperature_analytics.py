@@ -0,0 +1,65 @@
+"""Tests for the temperature analytics tool."""
+import json
+
+import numpy as np
+import pytest
+
+from db.migrations import connect
+from tools.base_tool import ToolConfig
+from tools.temperature_analytics import TemperatureAnalyticsTool, analyze
+from tools.temperature_backends import SERIES_DTYPE, SQLiteBackend
+
+
+def make_series(temperatures, start="2025-02-01"):
+    dates = np.datetime64(start) + np.arange(len(temperatures))
+    return np.array(
+        list(zip(dates, temperatures, [50.0] * len(temperatures))), dtype=SERIES_DTYPE
+    )
+
+
+def test_trend_moving_average_and_anomalies():
+    temperatures = [10.0 + 0.5 * day for day in range(30)]
+    temperatures[20] = 60.0
+    summary = analyze(make_series(temperatures), "2025-02-01", "2025-03-02", window=7)
+
+    assert summary["count"] == summary["days"] == 30
+    assert summary["temperature"]["max"] == {"value": 60.0, "date": "2025-02-21"}
+    assert summary["trend"]["slope_per_day"] == pytest.approx(0.5, abs=0.1)
+    assert summary["moving_average"]["last"]["date"] == "2025-03-02"
+    assert summary["moving_average"]["last"]["value"] == pytest.approx(np.mean(temperatures[-7:]), abs=0.01)
+    assert [a["date"] for a in summary["anomalies"]] == ["2025-02-21"]
+
+
+def test_readings_are_averaged_by_day():
+    series = np.array(
+        [("2025-02-01", 10.0, 50.0), ("2025-02-01", 20.0, 50.0), ("2025-02-02", 16.0, 50.0)],
+        dtype=SERIES_DTYPE,
+    )
+    summary = analyze(series, "2025-02-01", "2025-02-02", window=2)
+
+    assert summary["days"] == 2
+    assert summary["trend"]["change"] == pytest.approx(1.0)
+    assert summary["moving_average"]["last"]["value"] == pytest.approx(15.5)
+
+
+@pytest.mark.asyncio
+async def test_tool_reads_the_range_from_sqlite(tmp_path):
+    db_path = str(tmp_path / "measurements.db")
+    conn = connect(db_path)
+    conn.executemany(
+        "INSERT INTO measurements (timestamp, date, temperature, humidity) VALUES (?, ?, ?, ?)",
+        [(f"2025-02-{day:02d}T00:00:00", f"2025-02-{day:02d}", 15.0 + day, 50.0) for day in range(1, 29)],
+    )
+    conn.close()
+    backend = SQLiteBackend(db_path)
+    tool = TemperatureAnalyticsTool(ToolConfig(name="temperature_analytics", description="", category="node_red"), backend=backend)
+
+    response = json.loads(await tool.execute("", {"start_date": "2025-02-10", "end_date": "2025-02-19"}))
+    empty = json.loads(await tool.execute("", {"start_date": "2025-03-01", "end_date": "2025-03-31"}))
+    await backend.close()
+
+    assert response["success"]
+    assert response["data"]["count"] == 10
+    assert response["data"]["temperature"]["min"] == {"value": 25.0, "date": "2025-02-10"}
+    assert response["data"]["trend"]["slope_per_day"] == pytest.approx(1.0)
+    assert not empty["success"]
@@ -0,0 +1,134 @@
+"""Tests for the backends of the temperature tools."""
+import json
+
+import pytest
+import pytest_asyncio
+
+from db.migrations import connect
+from tools.base_tool import ToolConfig
+from tools.node_red_tools import TemperatureTool
+from tools.temperature_backends import NodeREDBackend, SQLiteBackend, TemperatureBackendError
+from tools.temperature_tools import ListTemperatureTool
+
+MEASUREMENTS = [
+    ("2025-02-02", 18.0, 45.0),
+    ("2025-02-03", 19.5, 50.0),
+    ("2025-02-04", 21.0, 55.0),
+]
+
+
+@pytest_asyncio.fixture
+async def backend(tmp_path):
+    """SQLite backend on a small measurements database."""
+    db_path = tmp_path / "measurements.db"
+    conn = connect(str(db_path))
+    conn.executemany(
+        "INSERT INTO measurements (timestamp, date, temperature, humidity) VALUES (?, ?, ?, ?)",
+        [(f"{date}T12:00:00", date, temperature, humidity) for date, temperature, humidity in MEASUREMENTS],
+    )
+    conn.close()
+    backend = SQLiteBackend(str(db_path), pool_size=2)
+    yield backend
+    await backend.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "date, fallback, expected_date",
+    [
+        ("2025-02-03", False, "2025-02-03"),
+        ("latest", False, "2025-02-04"),
+        ("2025-01-01", True, "2025-02-04"),
+        ("2025-01-01", False, None),
+    ],
+)
+async def test_get_measurement(backend, date, fallback, expected_date):
+    measurement = await backend.get_measurement(date, fallback=fallback)
+
+    if expected_date is None:
+        assert measurement is None
+    else:
+        assert measurement["date"] == expected_date
+        assert measurement["metadata"]["data_source"] == "local_sqlite_db"
+
+
+@pytest.mark.asyncio
+async def test_latest_reading_of_the_day_first(backend):
+    conn = connect(backend.db_path)
+    conn.executemany(
+        "INSERT INTO measurements (sensor, timestamp, date, temperature, humidity) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [("lab", "2025-02-04T18:00:00", "2025-02-04", 23.0, 40.0),
+         ("lab", "2025-02-04T09:00:00", "2025-02-04", 20.0, 60.0)],
+    )
+    conn.close()
+
+    measurement = await backend.get_measurement("latest")
+    listed = await backend.list_measurements("2025-02-04", "2025-02-04")
+
+    assert measurement["temperature"] == 23.0
+    assert [m["temperature"] for m in listed] == [23.0, 21.0, 20.0]
+
+
+@pytest.mark.asyncio
+async def test_tools_answer_the_node_red_contract(backend):
+    """The tools answer the same payloads as through Node-RED."""
+    config = ToolConfig(name="temperature", description="", category="node_red")
+
+    single = json.loads(await TemperatureTool(config, backend=backend).execute(""))
+    listed = json.loads(
+        await ListTemperatureTool(config, backend=backend).execute(
+            "", {"start_date": "2025-02-03", "end_date": "2025-02-04"}
+        )
+    )
+
+    assert single["success"]
+    assert {"date", "temperature", "humidity", "metadata", "query_timestamp"} <= set(
+        single["data"]
+    )
+    assert single["data"]["query_timestamp"].endswith("Z")
+    assert [t["date"] for t in listed["data"]["temperatures"]] == [
+        "2025-02-04",
+        "2025-02-03",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_database_is_read_only(backend):
+    await backend.get_measurement("latest")
+
+    with pytest.raises(TemperatureBackendError):
+        await backend._run("DELETE FROM measurements", {})
+    assert len(await backend.list_measurements()) == len(MEASUREMENTS)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+async def test_stats_from_rollups_match_the_measurements(tmp_path, granularity):
+    """Rollups maintained on insert give the stats computed from the rows."""
+    db_path = str(tmp_path / "measurements.db")
+    conn = connect(db_path)
+    conn.executemany(
+        "INSERT INTO measurements (sensor, timestamp, date, temperature, humidity) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [
+            (sensor, f"{date}T{hour:02d}:00:00", date, temperature + hour, 50.0 + hour)
+            for sensor in ("office", "lab")
+            for date, temperature, _ in MEASUREMENTS + [("2025-03-01", 12.0, 0)]
+            for hour in range(3)
+        ],
+    )
+    conn.close()
+    backend = SQLiteBackend(db_path)
+    measurements = await backend.list_measurements()
+
+    class ListedBackend(NodeREDBackend):
+        async def list_measurements(self, start_date=None, end_date=None):
+            return [m for m in measurements if start_date <= m["date"] <= end_date]
+
+    stats = await backend.get_stats("2025-02-03", "2025-03-01", granularity)
+    await backend.close()
+
+    assert stats == await ListedBackend().get_stats("2025-02-03", "2025-03-01", granularity)
+    assert sum(period["count"] for period in stats) == {"day": 18, "week": 18, "month": 24}[granularity]
+    assert stats[-1]["temperature"] == {"min": 12.0, "max": 14.0, "mean": 13.0}
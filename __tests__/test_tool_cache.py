@@ -0,0 +1,147 @@
+"""Tests for the tool result cache."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llmcompiler.src.executors.tool_cache import ToolResultCache
+
+
+def make_tool(name, cacheable=True, cache_ttl=None):
+    return SimpleNamespace(name=name, cacheable=cacheable, cache_ttl=cache_ttl)
+
+
+def counting_call(counter, value, delay=0.0):
+    async def call():
+        counter.append(value)
+        await asyncio.sleep(delay)
+        return value
+
+    return call
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_hit_the_cache():
+    """A repeated call returns the cached result without calling the tool."""
+    cache = ToolResultCache()
+    cache.register_tools([make_tool("get_temperature")])
+    calls = []
+
+    first = await cache.get_or_call(
+        "get_temperature", ["2025-02-04"], counting_call(calls, "22.5")
+    )
+    second = await cache.get_or_call(
+        "get_temperature", ["2025-02-04"], counting_call(calls, "22.5")
+    )
+    other = await cache.get_or_call(
+        "get_temperature", ["2025-02-05"], counting_call(calls, "21.0")
+    )
+
+    assert (first, second, other) == ("22.5", "22.5", "21.0")
+    assert calls == ["22.5", "21.0"]
+    assert cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_in_flight_calls_are_coalesced():
+    """Concurrent identical calls share a single tool call."""
+    cache = ToolResultCache()
+    cache.register_tools([make_tool("search")])
+    calls = []
+
+    results = await asyncio.gather(
+        *[
+            cache.get_or_call("search", ["béton"], counting_call(calls, "doc", 0.02))
+            for _ in range(5)
+        ]
+    )
+
+    assert results == ["doc"] * 5
+    assert len(calls) == 1
+    assert cache.get_stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_opted_out_and_expired_entries_are_called_again():
+    """Non cacheable tools and expired results always call the tool."""
+    cache = ToolResultCache()
+    cache.register_tools(
+        [
+            make_tool("get_chuck_norris_joke", cacheable=False),
+            make_tool("status", cache_ttl=0.01),
+        ]
+    )
+    jokes, statuses = [], []
+
+    for _ in range(2):
+        await cache.get_or_call("get_chuck_norris_joke", [], counting_call(jokes, "joke"))
+    await cache.get_or_call("status", [], counting_call(statuses, "ok"))
+    await asyncio.sleep(0.02)
+    await cache.get_or_call("status", [], counting_call(statuses, "ok"))
+
+    assert len(jokes) == 2
+    assert len(statuses) == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_is_bounded_by_bytes():
+    """The least recently used results are evicted once over the byte budget."""
+    cache = ToolResultCache(max_bytes=100)
+    cache.register_tools([make_tool("search")])
+    calls = []
+
+    for query in ["a", "b", "c"]:
+        await cache.get_or_call("search", [query], counting_call(calls, query * 30))
+    # "a" was evicted to make room for "c"
+    await cache.get_or_call("search", ["a"], counting_call(calls, "a" * 30))
+
+    assert calls == ["a" * 30, "b" * 30, "c" * 30, "a" * 30]
+    assert cache.get_stats()["bytes"] <= 100
+    assert cache.get_stats()["evictions"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    """A failing call is retried by the next caller."""
+    cache = ToolResultCache()
+    cache.register_tools([make_tool("search")])
+
+    async def failing():
+        raise RuntimeError("R2R down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_call("search", ["x"], failing)
+    assert await cache.get_or_call("search", ["x"], counting_call([], "ok")) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_error_results_are_not_cached():
+    """A result refused by the tool's `cache_result` is returned but not stored."""
+    cache = ToolResultCache()
+    tool = make_tool("search_knowledge", cache_ttl=600)
+    tool.cache_result = lambda result: not result.startswith("Erreur")
+    cache.register_tools([tool])
+    calls = []
+
+    error = await cache.get_or_call(
+        "search_knowledge", ["x"], counting_call(calls, "Erreur lors de la recherche : timeout")
+    )
+    answer = await cache.get_or_call("search_knowledge", ["x"], counting_call(calls, "Paris"))
+    cached = await cache.get_or_call("search_knowledge", ["x"], counting_call(calls, "Lyon"))
+
+    assert error.startswith("Erreur")
+    assert (answer, cached) == ("Paris", "Paris")
+    assert len(calls) == 2
+    assert cache.get_stats()["uncached"] == 1
+
+
+def test_ittpc_tools_refuse_their_errors():
+    from llmcompiler.configs.ittpc import tools as ittpc_tools
+
+    tools = {tool.name: tool for tool in ittpc_tools.generate_tools()}
+
+    assert tools["get_temperature"].cache_result('{"success": true, "data": 21.5, "error": null}')
+    assert not tools["get_temperature"].cache_result('{"success": false, "data": null, "error": "timeout"}')
+    assert tools["search_knowledge"].cache_result("Paris est la capitale de la France")
+    assert not tools["search_knowledge"].cache_result("Erreur lors de la recherche : timeout")
+    assert not tools["list_r2r_documents"].cache_result("Erreur lors de la récupération des documents R2R : 503")
@@ -0,0 +1,119 @@
+"""Tests for the process-wide tool executor."""
+import asyncio
+import time
+
+import pytest
+
+from llmcompiler.src.executors.tool_executor import ToolExecutor, ToolLimits
+
+
+def tracked_call(state, delay=0.02, label=None, order=None):
+    """Build a call recording the peak number of concurrent runs."""
+
+    async def call():
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        if order is not None:
+            order.append(label)
+        await asyncio.sleep(delay)
+        state["running"] -= 1
+        return label
+
+    return call
+
+
+@pytest.mark.asyncio
+async def test_max_concurrency_is_enforced():
+    """No more than max_concurrency calls of a tool run at once."""
+    executor = ToolExecutor()
+    executor.configure("search", ToolLimits(max_concurrency=3))
+    state = {"running": 0, "peak": 0}
+
+    results = await asyncio.gather(
+        *[executor.run("search", tracked_call(state, label=i)) for i in range(10)]
+    )
+
+    assert results == list(range(10))
+    assert state["peak"] == 3
+    stats = executor.get_stats()["search"]
+    assert stats["calls"] == 10
+    assert stats["queue_depth"] == 0
+    assert stats["max_wait"] > 0
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_served_round_robin():
+    """A session with many queued calls does not starve another session."""
+    executor = ToolExecutor()
+    executor.configure("search", ToolLimits(max_concurrency=1))
+    state = {"running": 0, "peak": 0}
+    order = []
+
+    calls = [
+        executor.run("search", tracked_call(state, 0.01, f"a{i}", order), session="a")
+        for i in range(4)
+    ] + [
+        executor.run("search", tracked_call(state, 0.01, f"b{i}", order), session="b")
+        for i in range(2)
+    ]
+    await asyncio.gather(*calls)
+
+    # a0 got the free slot, then the queued calls alternate between sessions
+    assert order == ["a0", "a1", "b0", "a2", "b1", "a3"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_spaces_out_calls():
+    """Calls of a rate-limited tool are started at most `rate_limit` per second."""
+    executor = ToolExecutor()
+    executor.configure("joke", ToolLimits(rate_limit=50))
+    state = {"running": 0, "peak": 0}
+
+    start = time.monotonic()
+    await asyncio.gather(
+        *[executor.run("joke", tracked_call(state, delay=0)) for _ in range(5)]
+    )
+    assert time.monotonic() - start >= 4 / 50
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_frees_its_place():
+    """Cancelling a queued call removes it from the queue."""
+    executor = ToolExecutor()
+    executor.configure("search", ToolLimits(max_concurrency=1))
+    state = {"running": 0, "peak": 0}
+
+    first = asyncio.create_task(executor.run("search", tracked_call(state, 0.05)))
+    queued = asyncio.create_task(executor.run("search", tracked_call(state, 0.05)))
+    await asyncio.sleep(0.01)
+    assert executor.get_stats()["search"]["queue_depth"] == 1
+
+    queued.cancel()
+    await asyncio.sleep(0)
+    assert executor.get_stats()["search"]["queue_depth"] == 0
+    await first
+    assert executor.get_stats()["search"]["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_higher_priority_calls_are_served_first():
+    """Within a session, queued calls get the free slots by priority."""
+    executor = ToolExecutor()
+    executor.configure("search", ToolLimits(max_concurrency=1))
+    state = {"running": 0, "peak": 0}
+    order = []
+
+    await asyncio.gather(
+        *[
+            executor.run(
+                "search",
+                tracked_call(state, 0.01, label, order),
+                session="a",
+                priority=priority,
+            )
+            for label, priority in [("first", 0), ("low", 1), ("high", 3), ("mid", 2)]
+        ]
+    )
+
+    assert order == ["first", "high", "mid", "low"]
+    assert executor.get_stats()["search"]["mean_latency"] >= 0.01
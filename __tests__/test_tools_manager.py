@@ -0,0 +1,73 @@
+"""Tests for the tools manager."""
+import pytest
+
+from tools.base_tool import Tool
+from tools.health import HealthRegistry
+from tools.tools_manager import ToolsManager
+
+CONFIG = """
+tools:
+  - name: LazyTool
+    description: Built on first use
+    category: utils
+    required_parameters:
+      - name: query
+        description: Query
+"""
+
+
+@Tool.register
+class LazyTool:
+    """Tool counting its instances."""
+
+    instances = 0
+
+    def __init__(self, config):
+        LazyTool.instances += 1
+        self.config = config
+
+    async def validate_dependencies(self) -> bool:
+        return True
+
+    async def execute(self, query, parameters=None) -> str:
+        return query
+
+
+@pytest.fixture
+def manager(tmp_path):
+    path = tmp_path / "tools.yaml"
+    path.write_text(CONFIG)
+    LazyTool.instances = 0
+    return ToolsManager(str(path), health=HealthRegistry())
+
+
+def test_tools_are_built_on_first_use(manager):
+    """Loading and listing the tools does not build them, getting one does, once."""
+    assert manager.list_tools() == [
+        {
+            "name": "LazyTool",
+            "description": "Built on first use",
+            "category": "utils",
+            "enabled": True,
+        }
+    ]
+    assert LazyTool.instances == 0
+
+    tool = manager.get_tool("LazyTool")
+
+    assert manager.get_tool("LazyTool") is tool
+    assert LazyTool.instances == 1
+    assert tool.config["required_parameters"][0]["name"] == "query"
+    assert len(manager.list_tools()) == 1
+
+
+def test_built_tool_is_probed(manager):
+    """The health of a tool is probed once it is built."""
+    assert "LazyTool" not in manager.health.get_stats()
+    manager.get_tool("LazyTool")
+    assert "LazyTool" in manager.health.get_stats()
+
+
+def test_unknown_tool(manager):
+    with pytest.raises(ValueError, match="not found"):
+        manager.get_tool("missing")
@@ -0,0 +1,84 @@
+"""Compare the ingestion throughput of per-row inserts and of the batched ingestor.
+
+Usage, from the project root:
+    python -m benchmarks.ingest --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from db.ingest import INSERT_READING, MeasurementIngestor, parse_reading
+from db.migrations import connect
+
+SENSORS = ["office", "lab", "warehouse", "server_room"]
+
+
+def readings(rows: int) -> Iterator[Dict]:
+    """One reading per sensor and second."""
+    start = datetime(2025, 1, 1)
+    for i in range(rows):
+        yield {
+            "sensor": SENSORS[i % len(SENSORS)],
+            "timestamp": (start + timedelta(seconds=i // len(SENSORS))).isoformat(),
+            "temperature": 20.0 + i % 10,
+            "humidity": 50.0 + i % 20,
+        }
+
+
+def per_row(db_path: str, rows: int) -> None:
+    """Previous path: default settings, one transaction per reading."""
+    connect(db_path).close()
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    for reading in readings(rows):
+        conn.execute(INSERT_READING, parse_reading(reading))
+        conn.commit()
+    conn.close()
+
+
+async def batched(db_path: str, rows: int, request_size: int) -> None:
+    """Readings posted `request_size` at a time, as by the ingest endpoint."""
+    ingestor = MeasurementIngestor(db_path)
+    await ingestor.start()
+    request: List[Dict] = []
+    for reading in readings(rows):
+        request.append(reading)
+        if len(request) == request_size:
+            await ingestor.add(request)
+            request = []
+            # let the event loop serve other requests, as in the server
+            await asyncio.sleep(0)
+    await ingestor.add(request)
+    await ingestor.close()
+    print(f"  {ingestor.get_stats()}")
+
+
+def report(label: str, rows: int, elapsed: float) -> None:
+    print(f"{label:>8}: {rows / elapsed:10.0f} rows/s ({rows} rows in {elapsed:.2f} s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--per-row-rows", type=int, default=5_000,
+                        help="rows of the per-row path, it is much slower")
+    parser.add_argument("--request-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        per_row(os.path.join(tmp, "per_row.db"), args.per_row_rows)
+        report("per row", args.per_row_rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        asyncio.run(batched(os.path.join(tmp, "batched.db"), args.rows, args.request_size))
+        report("batched", args.rows, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
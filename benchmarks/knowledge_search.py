@@ -0,0 +1,111 @@
+"""Compare the search latency of the local vector index, flat and IVF, and of R2R Cloud.
+
+The local index is built from a synthetic corpus. The IVF recall is the share
+of the flat top-k it finds. R2R Cloud is searched when R2R_API_KEY is set.
+
+Usage, from the project root:
+    python -m benchmarks.knowledge_search --documents 100000 --queries 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Awaitable, List, Tuple
+
+import numpy as np
+
+from llmcompiler.src.docstore.local_index import DEFAULT_N_PROBE, LocalVectorDocstore
+
+VOCABULARY = 5000
+WORDS_PER_DOCUMENT = 40
+
+
+def corpus(documents: int, seed: int = 0) -> List[str]:
+    """Texts of random words, Zipf distributed as in natural text."""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.3, size=(documents, WORDS_PER_DOCUMENT)), VOCABULARY)
+    return [" ".join(f"mot{rank}" for rank in row) for row in ranks]
+
+
+async def bench(
+    label: str, search: Callable[[str], Awaitable[Any]], queries: List[str]
+) -> List[Any]:
+    """Run the queries one at a time, and print the latencies."""
+    await search(queries[0])
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(await search(query))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(
+        f"{label:>10}: p50 {statistics.median(latencies) * 1000:7.2f} ms"
+        f" | p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms"
+    )
+    return results
+
+
+async def build(
+    path: str, index: str, n_probe: int, texts: List[str]
+) -> Tuple[LocalVectorDocstore, float]:
+    docstore = LocalVectorDocstore(path, index=index, n_probe=n_probe)
+    start = time.perf_counter()
+    for i in range(0, len(texts), 10_000):
+        await docstore.add_documents([{"text": text} for text in texts[i:i + 10_000]])
+    return docstore, time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--n-probe", type=int, default=DEFAULT_N_PROBE,
+                        help="clusters scanned per query by the IVF index")
+    args = parser.parse_args()
+
+    texts = corpus(args.documents)
+    # queries: the beginning of random documents
+    rng = np.random.default_rng(1)
+    queries = [" ".join(texts[i].split()[:8]) for i in rng.choice(len(texts), args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for index in ("flat", "ivf"):
+            docstore, elapsed = await build(
+                os.path.join(tmp, index), index, args.n_probe, texts
+            )
+            print(f"{index:>10}: {args.documents} documents indexed in {elapsed:.1f} s")
+            results[index] = await bench(
+                index,
+                lambda query: docstore.asearch(query, top_k=args.top_k, return_raw=True),
+                queries,
+            )
+            docstore.close()
+
+    found = [
+        len({doc.page_content for doc in flat} & {doc.page_content for doc in ivf}) / len(flat)
+        for flat, ivf in zip(results["flat"], results["ivf"])
+    ]
+    print(f"{'ivf recall':>10}: {statistics.mean(found):.3f}")
+
+    if not os.getenv("R2R_API_KEY"):
+        print(f"{'r2r':>10}: R2R_API_KEY not set, skipped")
+        return
+    from llmcompiler.src.docstore.r2r_rag import R2RDocstore
+
+    docstore = R2RDocstore()
+    try:
+        await bench(
+            "r2r",
+            lambda query: docstore.asearch(query, top_k=args.top_k, return_raw=True),
+            queries[:20],
+        )
+    finally:
+        docstore.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
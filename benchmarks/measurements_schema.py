@@ -0,0 +1,99 @@
+"""Compare the queries of the Node-RED flows on the original and migrated schemas.
+
+Usage, from the project root:
+    python -m benchmarks.measurements_schema --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Tuple
+
+from db.migrations import connect
+
+SENSORS = ["office", "lab", "warehouse", "server_room"]
+
+# Queries of the flows, and of the temperature backends
+QUERIES = {
+    "date = ?": ("SELECT * FROM measurements WHERE date = ?", True),
+    "latest": ("SELECT * FROM measurements WHERE date = (SELECT MAX(date) FROM measurements) LIMIT 1", False),
+    "order by date desc": ("SELECT date, temperature, humidity FROM measurements ORDER BY date DESC LIMIT 100", False),
+}
+
+
+def readings(rows: int) -> Iterator[Tuple[str, str, str, float, float]]:
+    """One reading per sensor and minute."""
+    start = datetime(2020, 1, 1)
+    for i in range(rows):
+        at = start + timedelta(minutes=i // len(SENSORS))
+        yield (
+            SENSORS[i % len(SENSORS)],
+            at.isoformat(),
+            at.date().isoformat(),
+            round(random.uniform(15.0, 30.0), 2),
+            round(random.uniform(40.0, 80.0), 2),
+        )
+
+
+def timed(label: str, func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed * 1000:10.2f} ms")
+    return elapsed
+
+
+def bench_queries(conn: sqlite3.Connection, repeat: int) -> None:
+    dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM measurements")]
+    for label, (sql, by_date) in QUERIES.items():
+        def run() -> None:
+            for _ in range(repeat):
+                params = (random.choice(dates),) if by_date else ()
+                conn.execute(sql, params).fetchall()
+        timed(f"{label} x{repeat}", run)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "measurements.db")
+
+        print(f"Original schema, {args.rows} rows")
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE measurements (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "date TEXT NOT NULL, temperature REAL NOT NULL, humidity REAL NOT NULL, "
+            "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO measurements (date, temperature, humidity) VALUES (?, ?, ?)",
+            ((date, t, h) for _, _, date, t, h in readings(args.rows)),
+        )
+        conn.execute("COMMIT")
+        bench_queries(conn, args.repeat)
+        conn.close()
+
+        os.remove(db_path)
+        print(f"Migrated schema, {args.rows} rows")
+        conn = connect(db_path)
+        conn.execute("BEGIN")
+        timed("insert", lambda: conn.executemany(
+            "INSERT INTO measurements (sensor, timestamp, date, temperature, humidity) "
+            "VALUES (?, ?, ?, ?, ?)",
+            readings(args.rows),
+        ))
+        conn.execute("COMMIT")
+        bench_queries(conn, args.repeat)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
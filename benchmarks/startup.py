@@ -0,0 +1,106 @@
+"""Measure the startup of the server: until it accepts connections, and until the chat is ready.
+
+The chain is built in the background, so the first time should be well below
+the second, which is when the server used to start accepting connections.
+The imports of the chain are timed apart, in a fresh interpreter.
+
+Usage, from the project root:
+    python -m benchmarks.startup --runs 3
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional, Tuple
+
+CHAIN_IMPORTS = (
+    "import llmcompiler.src.llm_compiler.llm_compiler, "
+    "llmcompiler.configs.ittpc.configs, llmcompiler.src.utils.model_utils"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_health(port: int) -> Optional[dict]:
+    """The health of the server, None while it does not accept connections."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+            return json.load(resp)
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def start_server(timeout: float) -> Tuple[float, Optional[float]]:
+    """Seconds until the server accepts connections, and until the chat is ready."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:create_app", "--factory",
+         "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    accepted = ready = None
+    try:
+        while time.perf_counter() - start < timeout and server.poll() is None:
+            health = get_health(port)
+            if health is not None:
+                accepted = accepted or time.perf_counter() - start
+                if health["ready"]:
+                    ready = time.perf_counter() - start
+                    break
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    if accepted is None:
+        raise RuntimeError("the server did not start")
+    return accepted, ready
+
+
+def time_chain_imports() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", CHAIN_IMPORTS], check=True, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def report(label: str, times: List[float]) -> None:
+    if not times:
+        print(f"{label:>12}: not reached")
+        return
+    print(f"{label:>12}: median {statistics.median(times):.2f} s, "
+          f"min {min(times):.2f} s, max {max(times):.2f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    accepted, ready = [], []
+    for _ in range(args.runs):
+        run_accepted, run_ready = start_server(args.timeout)
+        accepted.append(run_accepted)
+        if run_ready is not None:
+            ready.append(run_ready)
+
+    report("accepting", accepted)
+    # not reached without OPENAI_API_KEY, the chain fails to build
+    report("chat ready", ready)
+    report("chain import", [time_chain_imports() for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("TEMPERATURE_DB_PATH", os.path.join("db", "measurements.db"))
+    main()
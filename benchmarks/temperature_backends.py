@@ -0,0 +1,75 @@
+"""Compare the Node-RED and in-process SQLite read paths of the temperature tools.
+
+Usage, from the project root, with Node-RED running for the HTTP path:
+    python -m benchmarks.temperature_backends --requests 1000 --concurrency 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from tools.base_tool import ToolConfig
+from tools.http_client import close_http_session
+from tools.node_red_tools import TemperatureTool
+from tools.temperature_backends import (
+    DEFAULT_DB_PATH,
+    NODE_RED_URL,
+    NodeREDBackend,
+    SQLiteBackend,
+    TemperatureBackend,
+)
+
+CONFIG = ToolConfig(name="temperature", description="Get temperature data", category="node_red")
+
+
+async def bench(backend: TemperatureBackend, requests: int, concurrency: int) -> None:
+    """Run `requests` tool calls, `concurrency` at a time, and print the latencies."""
+    if not await backend.is_available():
+        print(f"{backend.name:>8}: unavailable, skipped")
+        return
+    tool = TemperatureTool(CONFIG, backend=backend)
+    # warm up the connections
+    await tool.execute("")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def call() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await tool.execute("")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"{backend.name:>8}: {requests / elapsed:8.0f} req/s"
+        f" | p50 {statistics.median(latencies) * 1000:6.2f} ms"
+        f" | p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--node-red-url", default=NODE_RED_URL)
+    args = parser.parse_args()
+
+    backends = [NodeREDBackend(args.node_red_url), SQLiteBackend(args.db_path)]
+    try:
+        for backend in backends:
+            await bench(backend, args.requests, args.concurrency)
+    finally:
+        for backend in backends:
+            await backend.close()
+        await close_http_session()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+"""Buffered ingestion of the sensor readings.
+
+Readings are buffered in memory and written in batches, each batch in a
+single transaction, from a dedicated writer thread. The buffer is flushed
+when it holds `batch_size` readings, or every `flush_interval` seconds. It is
+bounded: when `max_buffer` readings are waiting, `add` waits for a flush.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from .migrations import connect
+
+INSERT_READING = (
+    "INSERT OR IGNORE INTO measurements (sensor, timestamp, date, temperature, humidity) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+
+Row = Tuple[str, str, str, float, float]
+
+
+def parse_reading(reading: Dict[str, Any]) -> Row:
+    """Row of a reading.
+
+    Args:
+        reading: Reading with `timestamp` (ISO 8601), `temperature`, `humidity`
+            and optionally `sensor` (default: "office")
+
+    Returns:
+        The values of the row to insert
+
+    Raises:
+        ValueError: If the reading is invalid
+    """
+    try:
+        timestamp = datetime.fromisoformat(str(reading["timestamp"]))
+        return (
+            str(reading.get("sensor") or "office"),
+            timestamp.isoformat(),
+            timestamp.date().isoformat(),
+            float(reading["temperature"]),
+            float(reading["humidity"]),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid reading {reading!r}: {e}") from e
+
+
+class MeasurementIngestor:
+    """Batched writer of the sensor readings."""
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_buffer: int = 50_000,
+    ):
+        """Initialize the ingestor.
+
+        Args:
+            db_path: Path of the measurements database
+            batch_size: Number of buffered readings triggering a flush
+            flush_interval: Maximum delay before a reading is written, in seconds
+            max_buffer: Maximum number of buffered readings
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[Row] = []
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        # one thread, so that the connection is only used where it was opened
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="measurements-writer")
+        self._conn = None
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self._stats = {"received": 0, "written": 0, "ignored": 0, "batches": 0, "flush_time": 0.0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counts of readings and batches, and time spent writing."""
+        return {**self._stats, "buffered": len(self._buffer)}
+
+    async def start(self) -> None:
+        """Migrate the database, then start flushing the buffer in the background.
+
+        The readers open the database read-only, so it must be migrated
+        before they query it, not on the first write.
+        """
+        if self._task is None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._open_connection)
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Write the buffered readings and stop the writer."""
+        # stopped rather than cancelled, a cancellation can be lost by wait_for
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    async def add(self, readings: Iterable[Dict[str, Any]]) -> int:
+        """Buffer readings, they are all validated first.
+
+        Args:
+            readings: Readings, see `parse_reading`
+
+        Returns:
+            Number of buffered readings
+
+        Raises:
+            ValueError: If a reading is invalid, none is buffered then
+        """
+        rows = [parse_reading(reading) for reading in readings]
+        while self._buffer and len(self._buffer) + len(rows) > self.max_buffer:
+            # backpressure, wait for the readings to be written
+            await self.flush()
+        self._buffer.extend(rows)
+        self._stats["received"] += len(rows)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+        return len(rows)
+
+    async def flush(self) -> int:
+        """Write the buffered readings, in one transaction.
+
+        Returns:
+            Number of written readings, duplicates are ignored
+        """
+        async with self._flush_lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            start = time.perf_counter()
+            try:
+                written = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._write, rows
+                )
+            except Exception:
+                # keep the readings for the next flush
+                self._buffer[:0] = rows
+                raise
+            self._stats["flush_time"] += time.perf_counter() - start
+            self._stats["batches"] += 1
+            self._stats["written"] += written
+            self._stats["ignored"] += len(rows) - written
+            return written
+
+    async def _flush_periodically(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to write {len(self._buffer)} readings: {e}")
+
+    def _open_connection(self) -> None:
+        if self._conn is None:
+            self._conn = connect(self.db_path)
+
+    def _write(self, rows: List[Row]) -> int:
+        self._open_connection()
+        self._conn.execute("BEGIN")
+        try:
+            # rowcount leaves out the rows changed by the rollup triggers
+            written = self._conn.executemany(INSERT_READING, rows).rowcount
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return written
+
+    def _close_connection(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,206 @@
+"""Versioned schema of the measurements database.
+
+The schema version is stored in `PRAGMA user_version`. Each migration brings
+the database from the previous version to its own, in one transaction, so
+that running `migrate` again is a no-op.
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+# Applied on every connection
+CONNECTION_PRAGMAS = [
+    # wait for the writer instead of failing with "database is locked"
+    "PRAGMA busy_timeout = 5000",
+    # with WAL, fsync at checkpoints only, still safe against app crashes
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",  # 20 MB
+]
+
+
+def create_measurements(conn: sqlite3.Connection) -> None:
+    """Original schema, one row per day."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS measurements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        temperature REAL NOT NULL,
+        humidity REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def add_sensor_timestamp(conn: sqlite3.Connection) -> None:
+    """Readings identified by sensor and timestamp, indexed.
+
+    The table is rebuilt, as SQLite cannot add constraints to existing
+    columns. Duplicated rows are dropped, the most recent one is kept.
+    Existing rows become readings of the "office" sensor at midnight.
+    """
+    conn.execute('''
+    CREATE TABLE measurements_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sensor TEXT NOT NULL DEFAULT 'office',
+        timestamp TEXT NOT NULL,
+        date TEXT NOT NULL,
+        temperature REAL NOT NULL,
+        humidity REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    INSERT INTO measurements_new (id, sensor, timestamp, date, temperature, humidity, created_at)
+    SELECT id, 'office', date || 'T00:00:00', date, temperature, humidity, created_at
+    FROM measurements
+    WHERE id IN (SELECT MAX(id) FROM measurements GROUP BY date)
+    ''')
+    conn.execute("DROP TABLE measurements")
+    conn.execute("ALTER TABLE measurements_new RENAME TO measurements")
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_measurements_sensor_timestamp "
+        "ON measurements (sensor, timestamp)"
+    )
+    # WHERE date = $date and ORDER BY date DESC of the Node-RED flows
+    conn.execute("CREATE INDEX idx_measurements_date ON measurements (date)")
+
+
+# First day of the period of a date, by granularity (SQL expressions on `date`)
+ROLLUP_PERIODS = {
+    "day": "date({date})",
+    "week": "date({date}, '-6 days', 'weekday 1')",  # monday
+    "month": "date({date}, 'start of month')",
+}
+
+
+def rollup_upsert(date: str) -> str:
+    """Statements adding a reading on `date` to the rollups of its periods."""
+    return "\n".join(
+        f"""
+        INSERT INTO measurement_rollups VALUES (
+            '{granularity}', {period.format(date=date)}, 1,
+            NEW.temperature, NEW.temperature, NEW.temperature,
+            NEW.humidity, NEW.humidity, NEW.humidity
+        )
+        ON CONFLICT (granularity, period_start) DO UPDATE SET
+            count = count + 1,
+            temperature_min = MIN(temperature_min, excluded.temperature_min),
+            temperature_max = MAX(temperature_max, excluded.temperature_max),
+            temperature_sum = temperature_sum + excluded.temperature_sum,
+            humidity_min = MIN(humidity_min, excluded.humidity_min),
+            humidity_max = MAX(humidity_max, excluded.humidity_max),
+            humidity_sum = humidity_sum + excluded.humidity_sum;"""
+        for granularity, period in ROLLUP_PERIODS.items()
+    )
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute the rollups from the measurements.
+
+    The triggers only maintain them on insert, as minimums and maximums
+    cannot be updated incrementally: call this after deleting or updating
+    measurements.
+    """
+    conn.execute("DELETE FROM measurement_rollups")
+    for granularity, period in ROLLUP_PERIODS.items():
+        conn.execute(f'''
+        INSERT INTO measurement_rollups
+        SELECT '{granularity}', {period.format(date="date")}, COUNT(*),
+            MIN(temperature), MAX(temperature), SUM(temperature),
+            MIN(humidity), MAX(humidity), SUM(humidity)
+        FROM measurements
+        GROUP BY 2
+        ''')
+
+
+def add_rollups(conn: sqlite3.Connection) -> None:
+    """Daily, weekly and monthly aggregates, maintained on insert."""
+    conn.execute('''
+    CREATE TABLE measurement_rollups (
+        granularity TEXT NOT NULL,
+        period_start TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        temperature_min REAL NOT NULL,
+        temperature_max REAL NOT NULL,
+        temperature_sum REAL NOT NULL,
+        humidity_min REAL NOT NULL,
+        humidity_max REAL NOT NULL,
+        humidity_sum REAL NOT NULL,
+        PRIMARY KEY (granularity, period_start)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER measurements_rollup_insert AFTER INSERT ON measurements
+    BEGIN
+        {rollup_upsert("NEW.date")}
+    END
+    ''')
+    rebuild_rollups(conn)
+
+
+# (version, migration), in order
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, create_measurements),
+    (2, add_sensor_timestamp),
+    (3, add_rollups),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Schema version of the database, 0 if it is empty."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0:
+        # databases created before the migrations have the original schema
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'measurements'"
+        ).fetchone()
+        if exists:
+            return 1
+    return version
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply the pending migrations.
+
+    Args:
+        conn: Connection to the database
+
+    Returns:
+        Schema version of the database
+    """
+    version = get_version(conn)
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        # explicit transaction, so that DDL is rolled back on failure too
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        version = target
+    return version
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open the database for writing, in WAL mode, migrated to the last schema.
+
+    WAL lets the readers (Node-RED, the tools) run while a writer inserts.
+
+    Args:
+        db_path: Path of the database
+
+    Returns:
+        The connection, in autocommit mode
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    migrate(conn)
+    return conn
@@ -12,6 +12,7 @@ export interface ChatMessage {
   type?: 'thought' | 'response' | 'error';
   icon?: string;
   table?: TableData;
+  streaming?: boolean;
 }
 
 interface WebSocketMessage {
@@ -19,6 +20,8 @@ interface WebSocketMessage {
   text: string;
   icon?: string;
   table?: TableData;
+  delta?: boolean;
+  done?: boolean;
 }
 
 function createChatStore() {
@@ -44,13 +47,25 @@ function createChatStore() {
         console.log(' Store: Message parsé:', message);
         update(messages => {
           console.log(' Store: Mise à jour des messages avec:', message);
+          const last = messages[messages.length - 1];
+          if ((message.delta || message.done) && last?.streaming) {
+            // Les tokens de la réponse complètent le même message,
+            // le message final remplace le texte reçu jusque-là
+            return [...messages.slice(0, -1), {
+              ...last,
+              text: message.done ? message.text : last.text + message.text,
+              icon: message.icon ?? last.icon,
+              streaming: !message.done
+            }];
+          }
           return [...messages, {
             text: message.text,
             isUser: false,
             timestamp: new Date(),
             type: message.type,
             icon: message.icon,
-            table: message.table
+            table: message.table,
+            streaming: message.delta
           }];
         });
       } catch (e) {
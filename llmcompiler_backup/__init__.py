@@ -1,5 +1,13 @@
 """LLMCompiler package."""
-from llmcompiler.src.llm_compiler.llm_compiler import LLMCompiler
 from llmcompiler.src.utils.logger_utils import enable_logging, log
 
 __all__ = ["LLMCompiler", "enable_logging", "log"]
+
+
+def __getattr__(name):
+    # LLMCompiler imports langchain, only when it is used
+    if name == "LLMCompiler":
+        from llmcompiler.src.llm_compiler.llm_compiler import LLMCompiler
+
+        return LLMCompiler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -62,7 +62,7 @@ SYSTEM_PROMPT = (
     "  (1) Search[query]: Search in R2R knowledge base\n"
     "  (2) Joke[]: Get a random Chuck Norris joke\n"
     "  (3) Table[[\"col1\", \"col2\"], [[\"row1val1\", \"row1val2\"], [\"row2val1\", \"row2val2\"]]]: Create a formatted table\n"
-    "  (4) list_r2r_documents[]: List all available documents in R2R knowledge base\n"
+    "  (4) list_r2r_documents[title_prefix, since, until, offset, limit]: List a page of the documents in R2R knowledge base, all arguments optional\n"
     "  (5) join(): Return the answer and finish the task\n\n"
     "Guidelines:\n"
     "  - Each action MUST be in the format: <action_id>. <action_name>[<args>]\n"
@@ -1,17 +1,108 @@
 """Tools configuration for ITTPC."""
-from typing import Any, List, Optional, Dict
+import asyncio
+import json
+import os
+from functools import partial
+from typing import TYPE_CHECKING, Any, List, Optional, Dict, Union
 
 from llmcompiler.src.tools.base import Tool as LLMCompilerTool
-from tools.node_red_tools import NodeREDStatusTool, TemperatureTool
+from tools.node_red_tools import NODE_RED_URL, NodeREDStatusTool, TemperatureTool
 from tools.base_tool import ToolConfig
+from tools.http_client import prewarm_connection
 from tools.jokes_tools import ChuckNorrisJokeTool
-from llmcompiler.src.docstore.r2r_rag import R2RDocstore, R2RExplorer
+from tools.temperature_analytics import TemperatureAnalyticsTool
+from tools.temperature_tools import TemperatureStatsTool
+from loguru import logger
 from pydantic import BaseModel
 
+if TYPE_CHECKING:
+    from llmcompiler.src.docstore.local_index import LocalExplorer
+    from llmcompiler.src.docstore.r2r_rag import R2RExplorer
+
+# Knowledge base of search_knowledge and list_r2r_documents: "r2r" for R2R
+# Cloud, "local" for a local vector index, without network
+KNOWLEDGE_BACKEND_ENV = "KNOWLEDGE_BACKEND"
+KNOWLEDGE_INDEX_PATH = os.getenv(
+    "KNOWLEDGE_INDEX_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "db", "knowledge_index"),
+)
+
+# The R2R client is built on first use, or in the background at startup, so
+# that importing the tools neither imports r2r nor calls R2R Cloud
+_r2r_explorer: Optional[Union["R2RExplorer", "LocalExplorer"]] = None
+_r2r_lock = asyncio.Lock()
+
+
+def _create_r2r_explorer() -> Union["R2RExplorer", "LocalExplorer"]:
+    from llmcompiler.src.docstore.r2r_rag import R2RDocstore, R2RExplorer, RetrievalCache
+
+    backend = os.getenv(KNOWLEDGE_BACKEND_ENV, "r2r")
+    if backend == "local":
+        from llmcompiler.src.docstore.local_index import LocalExplorer, LocalVectorDocstore
+
+        docstore = LocalVectorDocstore(
+            KNOWLEDGE_INDEX_PATH,
+            index=os.getenv("KNOWLEDGE_INDEX", "flat"),
+            benchmark=True,
+            char_limit=1000,
+        )
+        # similar questions are served the same results, embedded like the index
+        docstore.cache = RetrievalCache(embed_fn=docstore.embed_query)
+        return LocalExplorer(docstore)
+    if backend != "r2r":
+        raise ValueError(f"Unknown knowledge backend {backend}, expected 'r2r' or 'local'")
+
+    # repeated questions are answered without a new RAG generation; there is
+    # no local embedder of the R2R collection, so only the same questions are
+    return R2RExplorer(
+        R2RDocstore(benchmark=True, char_limit=1000, cache=RetrievalCache())
+    )
+
+
+async def get_r2r_explorer() -> Union["R2RExplorer", "LocalExplorer"]:
+    """Get the explorer of the knowledge base, built in a thread on the first call.
+    
+    Raises:
+        ValueError: If the R2R client cannot be initialized
+    """
+    global _r2r_explorer
+    async with _r2r_lock:
+        if _r2r_explorer is None:
+            _r2r_explorer = await asyncio.to_thread(_create_r2r_explorer)
+    return _r2r_explorer
+
+
+async def start_r2r() -> None:
+    """Build the R2R client ahead of the first question, and list the documents
+    in the background."""
+    try:
+        explorer = await get_r2r_explorer()
+    except Exception as e:
+        logger.warning(f"R2R unavailable: {e}")
+        return
+    explorer.catalogue.start()
+
+
+def close_r2r() -> None:
+    """Stop the threads of the R2R client, or unmap the local index, if built."""
+    if _r2r_explorer is not None:
+        _r2r_explorer.catalogue.close()
+        _r2r_explorer.docstore.close()
+
+# The tools return their errors as results, these must not be cached: an
+# outage would be replayed for the whole TTL of the tool
+def is_success(result: str) -> bool:
+    """Whether a ToolResponse JSON string reports a success."""
+    try:
+        return bool(json.loads(result).get("success"))
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def is_not_error(result: str) -> bool:
+    """Whether a knowledge base answer is not an error message."""
+    return not str(result).startswith("Erreur")
 
-# Initialize R2R docstore and explorer
-r2r_docstore = R2RDocstore(benchmark=True, char_limit=1000)
-r2r_explorer = R2RExplorer(r2r_docstore)
 
 class TableOutput(BaseModel):
     """Output format for table data."""
@@ -38,23 +129,48 @@ class CreateTableTool:
         table = TableOutput(headers=headers, rows=rows)
         return table.format()
 
+# Tools are built once, they share the application HTTP session
+node_red_status_tool = NodeREDStatusTool(ToolConfig(
+    name="node_red_status",
+    description="Get Node-RED status",
+    category="node_red"
+))
+temperature_tool = TemperatureTool(ToolConfig(
+    name="temperature",
+    description="Get temperature data",
+    category="node_red"
+))
+temperature_stats_tool = TemperatureStatsTool(ToolConfig(
+    name="temperature_stats",
+    description="Get temperature stats by period",
+    category="node_red"
+))
+temperature_analytics_tool = TemperatureAnalyticsTool(ToolConfig(
+    name="temperature_analytics",
+    description="Analyse the temperatures of a date range",
+    category="node_red"
+))
+chuck_norris_joke_tool = ChuckNorrisJokeTool(ToolConfig(
+    name="chuck_norris_joke",
+    description="Get a random Chuck Norris joke",
+    category="fun"
+))
+create_table_tool = CreateTableTool(ToolConfig(
+    name="create_table",
+    description="Create a formatted table",
+    category="utils"
+))
+
+# Open the connection to Node-RED while the planner is still writing the call
+prewarm_node_red = partial(prewarm_connection, NODE_RED_URL)
+
 async def node_red_status() -> str:
     """Get Node-RED status."""
-    tool = NodeREDStatusTool(ToolConfig(
-        name="node_red_status",
-        description="Get Node-RED status",
-        category="node_red"
-    ))
-    result = await tool.execute("")
+    result = await node_red_status_tool.execute("")
     return result
 
 async def get_temperature(date: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:
     """Get temperature data."""
-    tool = TemperatureTool(ToolConfig(
-        name="temperature",
-        description="Get temperature data",
-        category="node_red"
-    ))
     parameters = {}
     if date:
         parameters["date"] = date
@@ -63,22 +179,37 @@ async def get_temperature(date: Optional[str] = None, start_date: Optional[str]
     if end_date:
         parameters["end_date"] = end_date
     
-    result = await tool.execute("", parameters)
+    result = await temperature_tool.execute("", parameters)
+    return result
+
+async def get_temperature_stats(start_date: str, end_date: str, granularity: str = "day") -> str:
+    """Get temperature stats by period."""
+    parameters = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "granularity": granularity
+    }
+    result = await temperature_stats_tool.execute("", parameters)
+    return result
+
+async def temperature_analytics(start_date: str, end_date: str) -> str:
+    """Analyse the temperatures of a date range."""
+    parameters = {
+        "start_date": start_date,
+        "end_date": end_date
+    }
+    result = await temperature_analytics_tool.execute("", parameters)
     return result
 
 async def get_chuck_norris_joke() -> str:
     """Get a random Chuck Norris joke."""
-    tool = ChuckNorrisJokeTool(ToolConfig(
-        name="chuck_norris_joke",
-        description="Get a random Chuck Norris joke",
-        category="fun"
-    ))
-    result = await tool.execute("")
+    result = await chuck_norris_joke_tool.execute("")
     return result
 
 async def search_knowledge(query: str, top_k: int = 5) -> str:
     """Search in R2R knowledge base."""
     try:
+        r2r_explorer = await get_r2r_explorer()
         results = await r2r_explorer.search(query, top_k=top_k)
         return results
     except Exception as e:
@@ -86,27 +217,31 @@ async def search_knowledge(query: str, top_k: int = 5) -> str:
 
 async def create_table(headers: List[str], rows: List[List[str]]) -> str:
     """Create a formatted table string."""
-    tool = CreateTableTool(ToolConfig(
-        name="create_table",
-        description="Create a formatted table",
-        category="utils"
-    ))
     parameters = {
         "headers": headers,
         "rows": rows
     }
-    result = await tool.execute("", parameters)
+    result = await create_table_tool.execute("", parameters)
     return result
 
-async def list_r2r_documents() -> str:
-    """Liste les documents disponibles dans R2R.
+async def list_r2r_documents(
+    title_prefix: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 20,
+) -> str:
+    """Liste les documents disponibles dans R2R, par page.
     
     Returns:
         Chaîne formatée avec la liste des documents
     """
     try:
-        # Utiliser la méthode list_documents de R2RExplorer
-        return await r2r_explorer.list_documents()
+        # Utiliser la méthode list_documents de R2RExplorer, servie par son catalogue
+        r2r_explorer = await get_r2r_explorer()
+        return await r2r_explorer.list_documents(
+            title_prefix=title_prefix, since=since, until=until, offset=offset, limit=limit
+        )
     except Exception as e:
         return f"Erreur lors de la récupération des documents R2R : {str(e)}"
 
@@ -116,16 +251,24 @@ def generate_tools(args=None) -> List[LLMCompilerTool]:
         LLMCompilerTool(
             name="node_red_status",
             func=node_red_status,
+            cache_result=is_success,
+            health_check=node_red_status_tool.validate_dependencies,
             description=(
                 "node_red_status() -> str:\n"
                 " - Get the current status of Node-RED server\n"
                 " - Returns status information as JSON string\n"
             ),
             stringify_rule=lambda args: "node_red_status()",
+            max_concurrency=8,
+            cache_ttl=5,
+            timeout=10,
+            prewarm=prewarm_node_red,
         ),
         LLMCompilerTool(
             name="get_temperature",
             func=get_temperature,
+            cache_result=is_success,
+            health_check=temperature_tool.validate_dependencies,
             description=(
                 "get_temperature(date: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:\n"
                 " - Get temperature data for a specific date or date range\n"
@@ -139,20 +282,74 @@ def generate_tools(args=None) -> List[LLMCompilerTool]:
                 f"start_date={repr(args[1] if len(args) > 1 else None)}, "
                 f"end_date={repr(args[2] if len(args) > 2 else None)})"
             ),
+            max_concurrency=8,
+            timeout=10,
+            prewarm=prewarm_node_red,
+        ),
+        LLMCompilerTool(
+            name="get_temperature_stats",
+            func=get_temperature_stats,
+            cache_result=is_success,
+            health_check=temperature_stats_tool.validate_dependencies,
+            description=(
+                "get_temperature_stats(start_date: str, end_date: str, granularity: str = \"day\") -> str:\n"
+                " - Get min, max and mean temperature and humidity for each day, week or month of a date range\n"
+                " - start_date and end_date: Date range in YYYY-MM-DD format\n"
+                " - granularity: \"day\", \"week\" or \"month\"\n"
+                " - Prefer it over get_temperature for questions on a period (average, highest, lowest)\n"
+                " - Returns the stats of each period as JSON string\n"
+            ),
+            stringify_rule=lambda args: (
+                f"get_temperature_stats("
+                f"start_date={repr(args[0])}, "
+                f"end_date={repr(args[1])}, "
+                f"granularity={repr(args[2] if len(args) > 2 else 'day')})"
+            ),
+            max_concurrency=8,
+            cache_ttl=60,
+            timeout=10,
+        ),
+        LLMCompilerTool(
+            name="temperature_analytics",
+            func=temperature_analytics,
+            cache_result=is_success,
+            health_check=temperature_analytics_tool.validate_dependencies,
+            description=(
+                "temperature_analytics(start_date: str, end_date: str) -> str:\n"
+                " - Analyse the temperatures of a date range in one call\n"
+                " - start_date and end_date: Date range in YYYY-MM-DD format\n"
+                " - Returns mean, std, min and max with their date, the 7-day moving average, "
+                "the linear trend (slope per day, change over the range) and the anomalies (z-score > 3)\n"
+                " - Use it for averages, trends or unusual values instead of computing them yourself\n"
+            ),
+            stringify_rule=lambda args: (
+                f"temperature_analytics("
+                f"start_date={repr(args[0])}, "
+                f"end_date={repr(args[1])})"
+            ),
+            max_concurrency=4,
+            cache_ttl=60,
+            timeout=10,
         ),
         LLMCompilerTool(
             name="get_chuck_norris_joke",
             func=get_chuck_norris_joke,
+            health_check=chuck_norris_joke_tool.validate_dependencies,
             description=(
                 "get_chuck_norris_joke() -> str:\n"
                 " - Get a random Chuck Norris joke\n"
                 " - Returns joke as string\n"
             ),
             stringify_rule=lambda args: "get_chuck_norris_joke()",
+            rate_limit=5,
+            # every call must return a new joke
+            cacheable=False,
+            timeout=5,
         ),
         LLMCompilerTool(
             name="search_knowledge",
             func=search_knowledge,
+            cache_result=is_not_error,
             description=(
                 "search_knowledge(query: str, top_k: int = 5) -> str:\n"
                 " - Search for information in the R2R knowledge base\n"
@@ -161,6 +358,9 @@ def generate_tools(args=None) -> List[LLMCompilerTool]:
                 " - Returns formatted search results\n"
             ),
             stringify_rule=lambda args: f"search_knowledge(query={repr(args[0])}, top_k={repr(args[1]) if len(args) > 1 else 5})",
+            max_concurrency=4,
+            cache_ttl=600,
+            timeout=30,
         ),
         LLMCompilerTool(
             name="create_table",
@@ -177,11 +377,26 @@ def generate_tools(args=None) -> List[LLMCompilerTool]:
         LLMCompilerTool(
             name="list_r2r_documents",
             func=list_r2r_documents,
+            cache_result=is_not_error,
             description=(
-                "list_r2r_documents() -> str:\n"
-                " - List available documents in R2R\n"
-                " - Returns formatted list of documents\n"
+                "list_r2r_documents(title_prefix: Optional[str] = None, since: Optional[str] = None, "
+                "until: Optional[str] = None, offset: int = 0, limit: int = 20) -> str:\n"
+                " - List available documents in R2R, sorted by title, one page at a time\n"
+                " - title_prefix: Only the documents whose title starts with it\n"
+                " - since and until: Only the documents created in this date range, YYYY-MM-DD\n"
+                " - offset and limit: Page of the list, the result gives the offset of the next page\n"
+                " - Returns the number of matching documents and a page of their titles and ids\n"
+            ),
+            stringify_rule=lambda args: (
+                f"list_r2r_documents("
+                f"title_prefix={repr(args[0] if len(args) > 0 else None)}, "
+                f"since={repr(args[1] if len(args) > 1 else None)}, "
+                f"until={repr(args[2] if len(args) > 2 else None)}, "
+                f"offset={repr(args[3] if len(args) > 3 else 0)}, "
+                f"limit={repr(args[4] if len(args) > 4 else 20)})"
             ),
-            stringify_rule=lambda args: "list_r2r_documents()",
+            max_concurrency=2,
+            cache_ttl=60,
+            timeout=30,
         ),
     ]
@@ -1,8 +1,11 @@
 import time
+from typing import Any, Callable
 
-import tiktoken
 from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
 
+from llmcompiler.src.llm_compiler.constants import JOINNER_FINISH
+from llmcompiler.src.utils.prompt_utils import PromptPrefixRegistry, prompt_prefixes
+
 
 class StatsCallbackHandler(BaseCallbackHandler):
     """Collect useful stats about the run.
@@ -45,13 +48,15 @@ class AsyncStatsCallbackHandler(AsyncCallbackHandler):
     """Collect useful stats about the run.
     Add more stats as needed."""
 
-    def __init__(self, stream: bool = False) -> None:
+    def __init__(
+        self, stream: bool = False, prefixes: PromptPrefixRegistry = prompt_prefixes
+    ) -> None:
         super().__init__()
         self.cnt = 0
         self.input_tokens = 0
         self.output_tokens = 0
-        # same for gpt-3.5
-        self.encoder = tiktoken.encoding_for_model("gpt-4")
+        # static prompt prefixes are only tokenised once
+        self.prefixes = prefixes
         self.stream = stream
         self.all_times = []
         self.additional_fields = {}
@@ -64,7 +69,9 @@ class AsyncStatsCallbackHandler(AsyncCallbackHandler):
             # therefore, we need to count input token based on the
             # prompt length at the beginning
             self.cnt += 1
-            self.input_tokens += len(self.encoder.encode(prompts[0][0].content))
+            self.input_tokens += sum(
+                self.prefixes.count_tokens(message.content) for message in prompts[0]
+            )
 
     async def on_llm_new_token(self, token, *args, **kwargs):
         if self.stream:
@@ -98,3 +105,47 @@ class AsyncStatsCallbackHandler(AsyncCallbackHandler):
             "all_times": self.all_times,
             **self.additional_fields,
         }
+
+
+class AsyncAnswerStreamCallbackHandler(AsyncCallbackHandler):
+    """Forward the final answer of the joinner as it is generated.
+
+    The joinner output is expected to be `Thought: xxx\\nAction: Finish(yyy)`.
+    Only `yyy` is forwarded, up to the closing parenthesis, the same way it is
+    parsed by `LLMCompiler._parse_joinner_output`. Replans are never forwarded.
+    """
+
+    def __init__(self, on_token: Callable[[str], Any]) -> None:
+        """
+        Args:
+            on_token: Called with every chunk of the answer.
+        """
+        super().__init__()
+        self.on_token = on_token
+        self.marker = f"Action: {JOINNER_FINISH}("
+        # output received before the answer
+        self.head = ""
+        self.in_answer = False
+        self.done = False
+
+    async def on_llm_new_token(self, token, *args, **kwargs):
+        if self.done:
+            return
+        if not self.in_answer:
+            # only look for the marker around the new token
+            start = max(0, len(self.head) - len(self.marker))
+            self.head += token
+            position = self.head.find(self.marker, start)
+            if position == -1:
+                return
+            self.in_answer = True
+            token = self.head[position + len(self.marker) :]
+        end = min(
+            (i for i in (token.find(")"), token.find("\n")) if i != -1),
+            default=-1,
+        )
+        if end != -1:
+            token = token[:end]
+            self.done = True
+        if token:
+            self.on_token(token)
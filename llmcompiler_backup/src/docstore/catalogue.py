@@ -0,0 +1,246 @@
+"""Cached catalogue of the documents of a knowledge base.
+
+Listing a collection goes through the network, page by page, and a whole
+listing can be too long for a prompt. The catalogue keeps the list in
+memory, sorted by title, and refreshes it in the background every
+`refresh_interval` seconds: a listing older than that is still served while
+the new one is fetched. Listings are filtered by title prefix and date,
+paginated, and cut to a token budget, with the offset of the next page.
+"""
+import asyncio
+import bisect
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from loguru import logger
+
+DEFAULT_PAGE_SIZE = 100  # documents per request to the knowledge base
+DEFAULT_REFRESH_INTERVAL = 300.0  # seconds
+DEFAULT_LIMIT = 20  # documents per listing
+DEFAULT_TOKEN_BUDGET = 800  # tokens per listing
+
+
+@dataclass
+class CatalogueEntry:
+    """A document of the catalogue."""
+
+    id: str
+    title: str
+    created_at: Optional[str] = None  # ISO 8601
+
+    @property
+    def date(self) -> Optional[str]:
+        return self.created_at[:10] if self.created_at else None
+
+
+# Fetches the documents [offset, offset + limit) of the knowledge base
+FetchPage = Callable[[int, int], Awaitable[List[CatalogueEntry]]]
+
+
+def _sort_key(title: str) -> str:
+    return title.strip().casefold()
+
+
+_encoder_unavailable = False
+
+
+def _count_tokens(text: str) -> int:
+    global _encoder_unavailable
+    if not _encoder_unavailable:
+        try:
+            from llmcompiler.src.utils.prompt_utils import count_tokens
+
+            return count_tokens(text)
+        except Exception as e:
+            # tiktoken downloads its encoding on first use, which fails offline
+            logger.warning(f"Token counts estimated, tiktoken unavailable: {e}")
+            _encoder_unavailable = True
+    return len(text) // 4 + 1
+
+
+class DocumentCatalogue:
+    """Documents of a knowledge base, listed once and refreshed in the background."""
+
+    def __init__(
+        self,
+        fetch_page: FetchPage,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        count_tokens: Callable[[str], int] = _count_tokens,
+    ) -> None:
+        """Initialize the catalogue, empty until the first listing.
+
+        Args:
+            fetch_page: Coroutine function returning the documents from
+                `offset`, at most `limit`
+            page_size: Documents fetched per call to `fetch_page`
+            refresh_interval: Age in seconds after which the catalogue is refreshed
+            count_tokens: Counts the tokens of a line of a listing
+        """
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.count_tokens = count_tokens
+        self.entries: List[CatalogueEntry] = []
+        self._keys: List[str] = []
+        self.refreshed_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        # incremented by `invalidate`, a list fetched before is dropped
+        self._generation = 0
+
+    async def _fetch_all(self) -> None:
+        generation = self._generation
+        entries: List[CatalogueEntry] = []
+        while True:
+            page = await self.fetch_page(len(entries), self.page_size)
+            entries.extend(page)
+            if len(page) < self.page_size:
+                break
+        if generation != self._generation:
+            return
+        entries.sort(key=lambda entry: _sort_key(entry.title))
+        # swapped at once, listings never see a partial catalogue
+        self.entries, self._keys = entries, [_sort_key(entry.title) for entry in entries]
+        self.refreshed_at = time.monotonic()
+        logger.info(f"Document catalogue refreshed: {len(entries)} documents")
+
+    async def refresh(self) -> None:
+        """Fetch the whole list again, concurrent calls share one fetch."""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._fetch_all())
+        await asyncio.shield(self._refreshing)
+
+    def is_stale(self) -> bool:
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.refresh_interval
+        )
+
+    def invalidate(self) -> None:
+        """Fetch the list again before the next listing, e.g. after adding documents."""
+        self.refreshed_at = None
+        self.entries, self._keys = [], []
+        self._generation += 1
+        # a fetch in progress may have missed the change, the next one starts over
+        self._refreshing = None
+
+    async def get_entries(self) -> List[CatalogueEntry]:
+        """The documents, sorted by title.
+
+        The first call waits for the list. Later calls return the cached
+        list at once, and start a refresh if it is stale.
+        """
+        if self.refreshed_at is None:
+            while self.refreshed_at is None:
+                await self.refresh()
+        elif self.is_stale() and (self._refreshing is None or self._refreshing.done()):
+            self._refreshing = asyncio.create_task(self._fetch_all())
+            # a failure is only logged, the cached list is still served
+            self._refreshing.add_done_callback(self._log_failure)
+        return self.entries
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Document catalogue refresh failed: {task.exception()}")
+
+    async def find(
+        self,
+        title_prefix: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> List[CatalogueEntry]:
+        """Documents matching the filters, sorted by title.
+
+        Args:
+            title_prefix: Beginning of the title, case insensitive
+            since: First creation date, YYYY-MM-DD, included
+            until: Last creation date, YYYY-MM-DD, included
+
+        Returns:
+            The documents, those without a date are left out by the date filters
+        """
+        entries = await self.get_entries()
+        if title_prefix:
+            prefix = _sort_key(title_prefix)
+            start = bisect.bisect_left(self._keys, prefix)
+            end = start
+            while end < len(self._keys) and self._keys[end].startswith(prefix):
+                end += 1
+            entries = entries[start:end]
+        if since or until:
+            entries = [
+                entry for entry in entries
+                if entry.date
+                and (not since or entry.date >= since[:10])
+                and (not until or entry.date <= until[:10])
+            ]
+        return entries
+
+    async def list_documents(
+        self,
+        title_prefix: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        offset: int = 0,
+        limit: int = DEFAULT_LIMIT,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+    ) -> str:
+        """Listing of the documents for the LLM.
+
+        Args:
+            title_prefix: Beginning of the title, case insensitive
+            since: First creation date, YYYY-MM-DD, included
+            until: Last creation date, YYYY-MM-DD, included
+            offset: Documents of the filtered list to skip
+            limit: Maximum number of documents listed
+            token_budget: Maximum number of tokens of the listed documents
+
+        Returns:
+            One line per document, and the offset of the next page if any
+        """
+        entries = await self.find(title_prefix, since, until)
+        if not entries:
+            return "Aucun document trouvé."
+        offset = max(offset, 0)
+        lines = [f"{len(entries)} documents, à partir du n°{offset + 1} :"]
+        tokens = 0
+        listed = 0
+        for entry in entries[offset:offset + max(limit, 1)]:
+            line = f"- Titre: {entry.title} | ID: {entry.id}"
+            if entry.date:
+                line += f" | Date: {entry.date}"
+            tokens += self.count_tokens(line)
+            # at least one document, so that paging always progresses
+            if listed and tokens > token_budget:
+                break
+            lines.append(line)
+            listed += 1
+        if offset + listed < len(entries):
+            lines.append(
+                f"... {len(entries) - offset - listed} autres documents,"
+                f" suite avec offset={offset + listed}"
+            )
+        return "\n".join(lines)
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Document catalogue refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        """Refresh in the background, the first listing is fetched right away."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_periodically())
+
+    def close(self) -> None:
+        """Stop the background refresh."""
+        for task in (self._task, self._refreshing):
+            if task is not None:
+                task.cancel()
+        self._task = None
@@ -0,0 +1,320 @@
+"""Streaming ingestion of documents into a docstore.
+
+Documents are read lazily, from files or any iterable, split into chunks,
+grouped in batches, and uploaded by a bounded number of workers through the
+docstore's `add_documents`. A failed batch is retried with exponential
+backoff. The ids of the uploaded chunks are appended to a checkpoint file, so
+that an interrupted load resumes where it stopped.
+
+A chunk id is derived from the document id, the position and the text of the
+chunk: a chunk that changed gets a new id. Once every chunk of a changed
+document is uploaded, its previous chunks are removed from the docstore.
+
+Usage, from the project root:
+    python -m llmcompiler.src.docstore.ingestion docs/ --backend local --checkpoint docs.checkpoint
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from loguru import logger
+
+DEFAULT_CHUNK_SIZE = 2000  # characters
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 1.0  # seconds, doubled at each retry
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_PATTERNS = ("*.txt", "*.md")
+
+
+def chunk_text(
+    text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP
+) -> List[str]:
+    """Split a text in chunks of at most `chunk_size` characters.
+
+    Chunks end at a paragraph, line or word boundary when there is one in
+    their second half, and the next one repeats about the last `overlap`
+    characters, from a word.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while len(text) - start > chunk_size:
+        end = start + chunk_size
+        for separator in ("\n\n", "\n", " "):
+            boundary = text.rfind(separator, start + chunk_size // 2, end)
+            if boundary != -1:
+                end = boundary
+                break
+        chunks.append(text[start:end].strip())
+        # the overlap starts at a word
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if overlap and space != -1 else next_start
+    if text[start:].strip():
+        chunks.append(text[start:].strip())
+    return chunks
+
+
+def chunk_id(document_id: str, index: int, text: str) -> str:
+    """Stable UUID of a chunk, a new one when its text changes."""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}#{index}#{digest}"))
+
+
+def read_documents(
+    paths: Sequence[str], patterns: Sequence[str] = DEFAULT_PATTERNS
+) -> Iterator[Dict[str, Any]]:
+    """Documents of files, and of the files matching `patterns` in directories.
+
+    Args:
+        paths: Files or directories, searched recursively
+        patterns: Glob patterns of the files of the directories
+
+    Yields:
+        Documents, with the path as id and the file name as title
+    """
+    for path in map(Path, paths):
+        files = (
+            sorted({file for pattern in patterns for file in path.rglob(pattern)})
+            if path.is_dir()
+            else [path]
+        )
+        for file in files:
+            yield {
+                "id": str(file),
+                "text": file.read_text(encoding="utf-8", errors="replace"),
+                "metadata": {"title": file.name, "source": str(file)},
+            }
+
+
+@dataclass
+class IngestionStats:
+    """Counts of an ingestion."""
+
+    documents: int = 0
+    chunks: int = 0
+    skipped: int = 0  # chunks uploaded by a previous run
+    uploaded: int = 0
+    failed: int = 0
+    batches: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.uploaded / self.elapsed if self.elapsed else 0.0
+
+
+class DocumentIngestor:
+    """Chunks, batches and uploads documents, with retries and checkpoints."""
+
+    def __init__(
+        self,
+        docstore: Any,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        checkpoint_path: Optional[str] = None,
+    ) -> None:
+        """Initialize the ingestor.
+
+        Args:
+            docstore: Docstore with an async `add_documents`, e.g. R2RDocstore
+                or LocalVectorDocstore
+            batch_size: Chunks per call to `add_documents`
+            concurrency: Batches uploaded at once
+            max_retries: Retries of a failed batch before giving up on it
+            backoff: Delay before the first retry, in seconds, doubled at each retry
+            max_backoff: Maximum delay between two retries, in seconds
+            chunk_size: Maximum characters per chunk
+            chunk_overlap: Characters repeated at the start of the next chunk
+            checkpoint_path: File listing the uploaded chunks, to resume a load
+        """
+        self.docstore = docstore
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.checkpoint_path = checkpoint_path
+        self._done: Set[str] = set()
+        # ids of the chunks of the documents with new chunks, and the
+        # documents with failed chunks, whose previous chunks are kept
+        self._changed: Dict[str, List[str]] = {}
+        self._failed: Set[str] = set()
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding="utf-8") as f:
+                self._done = {line.strip() for line in f if line.strip()}
+        self.stats = IngestionStats()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counts of the last ingestion, and its throughput."""
+        return {**asdict(self.stats), "chunks_per_second": round(self.stats.chunks_per_second, 2)}
+
+    def chunks(self, documents: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Chunks of the documents not uploaded yet, with stable ids."""
+        for document in documents:
+            self.stats.documents += 1
+            document_id = document.get("id") or hashlib.sha1(
+                document["text"].encode("utf-8")
+            ).hexdigest()
+            texts = chunk_text(document["text"], self.chunk_size, self.chunk_overlap)
+            chunk_ids = [chunk_id(document_id, index, text) for index, text in enumerate(texts)]
+            for index, text in enumerate(texts):
+                self.stats.chunks += 1
+                if chunk_ids[index] in self._done:
+                    self.stats.skipped += 1
+                    continue
+                self._changed[document_id] = chunk_ids
+                yield {
+                    "id": chunk_ids[index],
+                    "text": text,
+                    "metadata": {
+                        **(document.get("metadata") or {}),
+                        "document_id": document_id,
+                        "chunk": index,
+                        "chunks": len(texts),
+                    },
+                }
+
+    async def _upload(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.docstore.add_documents(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats.failed += len(batch)
+                    self._failed.update(chunk["metadata"]["document_id"] for chunk in batch)
+                    logger.error(f"Giving up on a batch of {len(batch)} chunks: {e}")
+                    return
+                self.stats.retries += 1
+                # jitter, so that the workers do not retry in step
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        self.stats.uploaded += len(batch)
+        self.stats.batches += 1
+        self._checkpoint(batch)
+
+    def _checkpoint(self, batch: List[Dict[str, Any]]) -> None:
+        ids = [chunk["id"] for chunk in batch]
+        self._done.update(ids)
+        if self.checkpoint_path:
+            with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{chunk_id}\n" for chunk_id in ids)
+
+    async def _remove_stale_chunks(self) -> None:
+        """Remove the previous chunks of the documents fully uploaded."""
+        remove = getattr(self.docstore, "remove_stale_chunks", None)
+        if remove is None:
+            return
+        for document_id, chunk_ids in self._changed.items():
+            if document_id in self._failed:
+                continue
+            try:
+                await remove(document_id, chunk_ids)
+            except Exception as e:
+                logger.warning(f"Previous chunks of {document_id} not removed: {e}")
+
+    async def ingest(self, documents: Iterable[Dict[str, Any]]) -> IngestionStats:
+        """Upload the documents, read as the workers need them.
+
+        Args:
+            documents: Documents with a `text`, and optionally an `id` and a
+                `metadata` dict, e.g. from `read_documents`
+
+        Returns:
+            The counts of the ingestion
+        """
+        self.stats = IngestionStats()
+        self._changed, self._failed = {}, set()
+        start = time.perf_counter()
+        # bounded, so that the documents are not read faster than uploaded
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+
+        async def worker() -> None:
+            while (batch := await batches.get()) is not None:
+                await self._upload(batch)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            batch: List[Dict[str, Any]] = []
+            for chunk in self.chunks(documents):
+                batch.append(chunk)
+                if len(batch) == self.batch_size:
+                    await batches.put(batch)
+                    batch = []
+            if batch:
+                await batches.put(batch)
+            for _ in workers:
+                await batches.put(None)
+            await asyncio.gather(*workers)
+            await self._remove_stale_chunks()
+        finally:
+            for task in workers:
+                task.cancel()
+            self.stats.elapsed = time.perf_counter() - start
+        logger.info(
+            f"Ingested {self.stats.uploaded} chunks of {self.stats.documents} documents"
+            f" in {self.stats.elapsed:.1f}s ({self.stats.chunks_per_second:.1f} chunks/s),"
+            f" {self.stats.skipped} already uploaded, {self.stats.failed} failed"
+        )
+        return self.stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load files into the knowledge base.")
+    parser.add_argument("paths", nargs="+", help="files or directories")
+    parser.add_argument("--pattern", action="append", help="glob of the files of the directories")
+    parser.add_argument("--backend", choices=("r2r", "local"), default="r2r")
+    parser.add_argument("--index-path", default=os.path.join("db", "knowledge_index"),
+                        help="directory of the local index")
+    parser.add_argument("--checkpoint", help="file listing the uploaded chunks, to resume")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
+    args = parser.parse_args()
+
+    if args.backend == "local":
+        from llmcompiler.src.docstore.local_index import LocalVectorDocstore
+
+        docstore = LocalVectorDocstore(args.index_path)
+    else:
+        from llmcompiler.src.docstore.r2r_rag import R2RDocstore
+
+        docstore = R2RDocstore(max_workers=args.concurrency * args.batch_size)
+
+    ingestor = DocumentIngestor(
+        docstore,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint,
+    )
+    try:
+        asyncio.run(ingestor.ingest(read_documents(args.paths, args.pattern or DEFAULT_PATTERNS)))
+    finally:
+        docstore.close()
+    print(ingestor.get_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+"""Local vector index, a drop-in replacement of R2RDocstore without network.
+
+The embeddings are stored as a float32 matrix in a file, memory-mapped, so
+that the index is not loaded in memory and is shared by the processes using
+it. The texts and metadata are stored as JSON lines next to it. The top-k
+search is brute force, or IVF: the vectors are clustered with k-means and
+only the clusters closest to the query are scanned.
+
+Layout of an index directory:
+    meta.json        dimension, number of documents, embedder
+    vectors.f32      embeddings, one row per document
+    documents.jsonl  id, text and metadata, one line per document
+    ivf.npz          centroids and cluster of each row, for the IVF search
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.document import Document
+from loguru import logger
+
+from llmcompiler.src.docstore.catalogue import (
+    DEFAULT_LIMIT,
+    DEFAULT_TOKEN_BUDGET,
+    CatalogueEntry,
+    DocumentCatalogue,
+)
+from llmcompiler.src.docstore.r2r_rag import RetrievalCache
+from llmcompiler.src.utils.cache_utils import normalize_query
+
+DEFAULT_DIM = 384
+DEFAULT_TOP_K = 5
+DEFAULT_N_PROBE = 8
+# rows per cluster, the number of clusters grows as the square root of the rows
+MIN_ROWS_PER_LIST = 4
+KMEANS_ITERATIONS = 10
+BATCH_ROWS = 65536
+
+# Embeds a batch of texts into a (len(texts), dim) matrix
+EmbedTextsFn = Callable[[Sequence[str]], np.ndarray]
+
+
+class HashingEmbedder:
+    """Embeddings of the words and word pairs of a text, hashed into `dim` buckets.
+
+    No model nor network: good enough for lexical retrieval, and to test the
+    index. Pass a model's embedding function to the docstore for semantic
+    retrieval.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM) -> None:
+        self.dim = dim
+        # versioned, so that indexes of other hashing schemes are refused
+        self.name = f"hashing-v2-{dim}"
+
+    def _embed(self, text: str, out: np.ndarray) -> None:
+        words = normalize_query(text).split()
+        # each feature counts once, so that repeated words do not dominate
+        features = set(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+        if not features:
+            return
+        hashes = np.array(
+            [zlib.crc32(feature.encode("utf-8")) for feature in sorted(features)], dtype=np.uint64
+        )
+        # the hash picks the bucket, and its high bit the sign
+        signs = np.where(hashes >> np.uint64(31) & np.uint64(1), -1.0, 1.0)
+        np.add.at(out, (hashes % np.uint64(self.dim)).astype(np.intp), signs)
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for text, out in zip(texts, vectors):
+            self._embed(text, out)
+        return vectors
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first."""
+    if k < len(scores):
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid of each row, by batches of rows."""
+    return np.concatenate([
+        np.argmax(vectors[start:start + BATCH_ROWS] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), BATCH_ROWS)
+    ]).astype(np.int32)
+
+
+def kmeans(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """Centroids of the clusters of unit `vectors`, by cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(len(vectors), n_lists, replace=False)])
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # an empty cluster keeps its centroid
+        filled = np.bincount(assignments, minlength=n_lists) > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+class LocalVectorDocstore(Docstore):
+    """Documents searched by the cosine similarity of their embeddings."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        embed_fn: Optional[EmbedTextsFn] = None,
+        index: str = "flat",
+        n_probe: int = DEFAULT_N_PROBE,
+        collection_name: str = "local",
+        benchmark: bool = False,
+        char_limit: Optional[int] = None,
+        cache: Optional[RetrievalCache] = None,
+    ) -> None:
+        """Open the index at `path`, or create it.
+
+        Args:
+            path: Directory of the index, in memory only if None
+            embed_fn: Embeds a batch of texts, by default a `HashingEmbedder`;
+                it must be the same each time an index is opened
+            index: "flat" for brute force search, "ivf" for the clustered index
+            n_probe: Clusters scanned per query, with the IVF index
+            collection_name: Name of the collection, as in R2RDocstore
+            benchmark: Whether to collect performance metrics
+            char_limit: Maximum number of characters to return per document
+            cache: Optional cache of the search results, invalidated when
+                documents are added
+        """
+        if index not in ("flat", "ivf"):
+            raise ValueError(f"Unknown index {index}, expected 'flat' or 'ivf'")
+        self.path = path
+        self.embed_fn = embed_fn or HashingEmbedder()
+        self.embedder_name = getattr(self.embed_fn, "name", type(self.embed_fn).__name__)
+        self.index = index
+        self.n_probe = n_probe
+        self.collection_name = collection_name
+        self.benchmark = benchmark
+        self.char_limit = char_limit
+        self.cache = cache
+        self.all_times = []
+
+        self.dim: Optional[int] = getattr(self.embed_fn, "dim", None)
+        self.documents: List[Dict[str, Any]] = []
+        self._ids: Set[str] = set()
+        # rows of the in-memory index, its capacity doubles as it fills
+        self._buffer: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._trained_rows = 0
+        self._lists: Optional[tuple] = None
+        self._lock = threading.RLock()
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+
+    # --- Storage ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._file("meta.json")):
+            return
+        with open(self._file("meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["embedder"] != self.embedder_name:
+            raise ValueError(
+                f"Index {self.path} was built with {meta['embedder']}, not {self.embedder_name}"
+            )
+        self.dim = meta["dim"]
+        count = meta["count"]
+        # the count is written last: rows after it are from an interrupted add
+        with open(self._file("documents.jsonl"), encoding="utf-8") as f:
+            lines = f.readlines()
+        if len(lines) > count:
+            with open(self._file("documents.jsonl"), "w", encoding="utf-8") as f:
+                f.writelines(lines[:count])
+        self.documents = [json.loads(line) for line in lines[:count]]
+        self._ids = {document["id"] for document in self.documents}
+        self._map(count)
+        if os.path.exists(self._file("ivf.npz")):
+            ivf = np.load(self._file("ivf.npz"))
+            self._centroids = ivf["centroids"]
+            self._assignments = ivf["assignments"][:count]
+            self._trained_rows = int(ivf["trained_rows"])
+            if len(self._assignments) < count:
+                # rows added by an add interrupted before saving the lists
+                rows = self._vectors[len(self._assignments):]
+                self._assignments = np.concatenate(
+                    [self._assignments, _assign(rows, self._centroids)]
+                )
+        logger.info(f"Loaded {count} documents from {self.path}")
+
+    def _map(self, count: int) -> None:
+        if count:
+            self._vectors = np.memmap(
+                self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dim)
+            )
+
+    def _append(self, vectors: np.ndarray, documents: List[Dict[str, Any]]) -> None:
+        count = len(self.documents) + len(documents)
+        if self.path is None:
+            size = len(self.documents)
+            if self._buffer is None or count > len(self._buffer):
+                buffer = np.empty((max(count, 2 * size, 64), self.dim), dtype=np.float32)
+                if size:
+                    buffer[:size] = self._vectors
+                self._buffer = buffer
+            self._buffer[size:count] = vectors
+            self.documents.extend(documents)
+            self._ids.update(document["id"] for document in documents)
+            self._vectors = self._buffer[:count]
+            return
+
+        size = len(self.documents)
+        with open(self._file("vectors.f32"), "r+b" if size else "wb") as f:
+            # drop the rows of an interrupted add
+            f.truncate(size * self.dim * 4)
+            f.seek(0, os.SEEK_END)
+            f.write(vectors.astype(np.float32).tobytes())
+        with open(self._file("documents.jsonl"), "a" if size else "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(document, ensure_ascii=False) + "\n" for document in documents)
+        self.documents.extend(documents)
+        self._ids.update(document["id"] for document in documents)
+        self._write_meta()
+        self._map(count)
+
+    def _keep(self, rows: np.ndarray) -> None:
+        """Drop the other rows of the index, the files are rewritten."""
+        vectors = np.ascontiguousarray(self._vectors[rows], dtype=np.float32)
+        documents = [self.documents[row] for row in rows]
+        if self._centroids is not None:
+            self._assignments = self._assignments[rows]
+            self._lists = None
+        self.documents = documents
+        self._ids = {document["id"] for document in documents}
+        if self.path is None:
+            self._buffer = vectors
+            self._vectors = vectors if len(rows) else None
+            return
+
+        # the memory map is released before its file is replaced
+        self._vectors = None
+        with open(self._file("documents.jsonl.tmp"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(document, ensure_ascii=False) + "\n" for document in documents)
+        with open(self._file("vectors.f32.tmp"), "wb") as f:
+            f.write(vectors.tobytes())
+        os.replace(self._file("documents.jsonl.tmp"), self._file("documents.jsonl"))
+        os.replace(self._file("vectors.f32.tmp"), self._file("vectors.f32"))
+        self._write_meta()
+        self._map(len(documents))
+        self._save_ivf()
+
+    def _write_meta(self) -> None:
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"dim": self.dim, "count": len(self.documents), "embedder": self.embedder_name}, f
+            )
+        os.replace(tmp, self._file("meta.json"))
+
+    def _save_ivf(self) -> None:
+        if self.path is not None and self._centroids is not None:
+            np.savez(
+                self._file("ivf.npz"),
+                centroids=self._centroids,
+                assignments=self._assignments,
+                trained_rows=self._trained_rows,
+            )
+
+    # --- IVF ---
+
+    def _train(self) -> None:
+        """Cluster the rows, again each time their number doubles."""
+        count = len(self.documents)
+        n_lists = int(np.sqrt(count))
+        if count < 2 * self._trained_rows or count < n_lists * MIN_ROWS_PER_LIST or n_lists < 2:
+            return
+        start = time.time()
+        self._centroids = kmeans(self._vectors, n_lists)
+        self._assignments = _assign(self._vectors, self._centroids)
+        self._trained_rows = count
+        self._lists = None
+        logger.info(f"Clustered {count} documents in {n_lists} lists in {time.time() - start:.2f}s")
+
+    def _add_to_lists(self, vectors: np.ndarray) -> None:
+        if self._centroids is not None:
+            self._assignments = np.concatenate([self._assignments, _assign(vectors, self._centroids)])
+            self._lists = None
+        self._train()
+        self._save_ivf()
+
+    def _candidates(self, query: np.ndarray, k: int) -> Optional[np.ndarray]:
+        """Rows of the clusters closest to the query, None to scan every row."""
+        if self.index != "ivf" or self._centroids is None:
+            return None
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind="stable")
+            offsets = np.concatenate(
+                [[0], np.cumsum(np.bincount(self._assignments, minlength=len(self._centroids)))]
+            )
+            self._lists = (order, offsets)
+        order, offsets = self._lists
+        probes = _top_k(self._centroids @ query, self.n_probe)
+        candidates = np.concatenate([order[offsets[i]:offsets[i + 1]] for i in probes])
+        return candidates if len(candidates) >= k else None
+
+    # --- Search ---
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed_fn(list(texts)), dtype=np.float32)
+        return _normalize(vectors.reshape(len(texts), -1))
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalised embedding of a query, e.g. for the similarity lookups of a cache."""
+        return self._embed([query])[0]
+
+    def _add(self, documents: List[Dict[str, Any]]) -> List[str]:
+        records = [
+            {
+                "id": document.get("id") or str(uuid.uuid4()),
+                "text": document["text"],
+                "metadata": document.get("metadata") or {},
+            }
+            for document in documents
+        ]
+        # documents already in the index, e.g. loaded again, are not added twice
+        with self._lock:
+            new = list({
+                record["id"]: record for record in records if record["id"] not in self._ids
+            }.values())
+        if new:
+            vectors = self._embed([record["text"] for record in new])
+            with self._lock:
+                # added meanwhile by another thread
+                rows = [row for row, record in enumerate(new) if record["id"] not in self._ids]
+                if len(rows) < len(new):
+                    new, vectors = [new[row] for row in rows], vectors[rows]
+                if new:
+                    self.dim = self.dim or vectors.shape[1]
+                    self._append(vectors, new)
+                    if self.index == "ivf":
+                        self._add_to_lists(vectors)
+        return [record["id"] for record in records]
+
+    def _remove_stale(self, document_id: str, keep: Iterable[str]) -> int:
+        keep = set(keep)
+        with self._lock:
+            rows = [
+                row for row, document in enumerate(self.documents)
+                if document["metadata"].get("document_id") != document_id or document["id"] in keep
+            ]
+            removed = len(self.documents) - len(rows)
+            if removed:
+                self._keep(np.asarray(rows, dtype=np.int64))
+        return removed
+
+    def _search(self, query: str, top_k: int) -> List[Document]:
+        with self._lock:
+            if not self.documents:
+                return []
+            vector = self._embed([query])[0]
+            candidates = self._candidates(vector, top_k)
+            if candidates is None:
+                scores = np.asarray(self._vectors @ vector)
+                rows = _top_k(scores, top_k)
+                return self._documents(rows, scores[rows])
+            # sorted, to read the memory map in order
+            candidates = np.sort(candidates)
+            scores = np.asarray(self._vectors[candidates] @ vector)
+            top = _top_k(scores, top_k)
+            return self._documents(candidates[top], scores[top])
+
+    def _documents(self, rows: np.ndarray, scores: np.ndarray) -> List[Document]:
+        return [
+            Document(
+                page_content=self.documents[row]["text"],
+                metadata={
+                    **self.documents[row]["metadata"],
+                    "id": self.documents[row]["id"],
+                    "score": float(score),
+                    "collection": self.collection_name,
+                },
+            )
+            for row, score in zip(rows, scores)
+        ]
+
+    def reset(self) -> None:
+        """Reset performance metrics."""
+        self.all_times = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get performance statistics."""
+        return {
+            "all_times": self.all_times,
+            "documents": len(self.documents),
+            "lists": 0 if self._centroids is None else len(self._centroids),
+        }
+
+    def close(self) -> None:
+        """Release the memory map."""
+        with self._lock:
+            self._vectors = None
+            self._buffer = None
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        return_raw: bool = False
+    ) -> Union[str, List[Document]]:
+        """Search the documents closest to the query.
+
+        Args:
+            query: Search query
+            top_k: Number of results to return
+            return_raw: If True, return raw Document objects instead of formatted string
+
+        Returns:
+            Either formatted string of results or list of Document objects
+        """
+        start_time = time.time()
+        try:
+            documents = None
+            if self.cache is not None:
+                documents = await self.cache.get("search", self.collection_name, top_k, query)
+            if documents is None:
+                documents = await asyncio.to_thread(self._search, query, top_k)
+                if self.cache is not None:
+                    await self.cache.put("search", self.collection_name, top_k, query, documents)
+
+            if not documents:
+                return [] if return_raw else f"Aucun résultat trouvé pour '{query}'."
+            if return_raw:
+                return list(documents)
+
+            formatted_results = []
+            for doc in documents:
+                content = doc.page_content
+                if self.char_limit:
+                    content = content[:self.char_limit] + ("..." if len(content) > self.char_limit else "")
+                formatted_results.append(f"{content}\n(Score: {doc.metadata['score']:.2f})")
+            return "\n\n".join(formatted_results)
+        finally:
+            if self.benchmark:
+                self.all_times.append(time.time() - start_time)
+
+    def search(self, search_term: str) -> List[Document]:
+        """Search for documents (required by Docstore interface).
+
+        Args:
+            search_term: Search query
+
+        Returns:
+            List of matching documents
+        """
+        return self._search(search_term, DEFAULT_TOP_K)
+
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> List[str]:
+        """Embed and add documents, they are written to disk before returning.
+
+        Args:
+            documents: List of documents to add
+                Each document should have:
+                - text: str
+                - metadata: Dict[str, str] (optional)
+                - id: str (optional)
+
+        Returns:
+            The ids of the documents
+        """
+        start_time = time.time()
+        try:
+            ids = await asyncio.to_thread(self._add, documents)
+            logger.info(f"Added {len(documents)} documents to collection {self.collection_name}")
+            return ids
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(self.collection_name)
+            if self.benchmark:
+                self.all_times.append(time.time() - start_time)
+
+    async def remove_stale_chunks(self, document_id: str, keep: Iterable[str]) -> int:
+        """Remove the chunks of a document that are not in `keep`.
+
+        Args:
+            document_id: The `document_id` metadata of the chunks
+            keep: Ids of the current chunks of the document
+
+        Returns:
+            The number of chunks removed
+        """
+        removed = await asyncio.to_thread(self._remove_stale, document_id, keep)
+        if removed:
+            logger.info(f"Removed {removed} stale chunks of {document_id}")
+            if self.cache is not None:
+                self.cache.invalidate(self.collection_name)
+        return removed
+
+
+class LocalExplorer:
+    """Same interface as R2RExplorer, over a local index.
+
+    There is no answer generation: the search returns the closest chunks.
+    """
+
+    def __init__(self, docstore: LocalVectorDocstore) -> None:
+        self.docstore = docstore
+        self.catalogue = DocumentCatalogue(self._fetch_documents)
+        self._entries: List[CatalogueEntry] = []
+        self._catalogued = 0  # rows of the index in the catalogue
+
+    async def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> str:
+        """Search for documents.
+
+        Args:
+            query: Search query
+            top_k: Number of results to return
+
+        Returns:
+            The closest documents, formatted
+        """
+        return await self.docstore.asearch(query, top_k=top_k)
+
+    async def _fetch_documents(self, offset: int, limit: int) -> List[CatalogueEntry]:
+        if offset == 0:
+            # one entry per ingested document, not per chunk
+            entries: Dict[str, CatalogueEntry] = {}
+            for row in self.docstore.documents:
+                metadata = row["metadata"]
+                document_id = metadata.get("document_id", row["id"])
+                if document_id not in entries:
+                    entries[document_id] = CatalogueEntry(
+                        id=document_id,
+                        title=metadata.get("title") or document_id,
+                        created_at=metadata.get("created_at"),
+                    )
+            self._entries = list(entries.values())
+            self._catalogued = len(self.docstore)
+        return self._entries[offset:offset + limit]
+
+    async def list_documents(
+        self,
+        title_prefix: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        offset: int = 0,
+        limit: int = DEFAULT_LIMIT,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+    ) -> str:
+        """Liste les documents de l'index local, voir `R2RExplorer.list_documents`.
+
+        Returns:
+            Chaîne formatée avec la liste des documents
+        """
+        if len(self.docstore) != self._catalogued:
+            self.catalogue.invalidate()
+        return await self.catalogue.list_documents(
+            title_prefix, since, until, offset, limit, token_budget
+        )
@@ -1,16 +1,117 @@
-"""Wrapper around R2R Cloud API."""
+"""Wrapper around R2R Cloud API.
+
+The R2R client is synchronous: its calls run in a bounded thread pool, so
+that a search does not block the event loop, and with it the other sessions
+and the other tasks of the plan. A call cancelled while waiting for a thread
+is never sent; a call already sent runs to completion in its thread.
+
+The results are cached by `RetrievalCache`, until the collection changes.
+"""
+import asyncio
 import os
 import time
-from typing import List, Optional, Dict, Any, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
 from langchain_community.docstore.base import Docstore
 from langchain_community.docstore.document import Document
-from r2r import R2RClient
 from loguru import logger
 from dotenv import load_dotenv
 
+from llmcompiler.src.docstore.catalogue import (
+    DEFAULT_LIMIT,
+    DEFAULT_TOKEN_BUDGET,
+    CatalogueEntry,
+    DocumentCatalogue,
+)
+from llmcompiler.src.utils.cache_utils import (
+    DEFAULT_SIMILARITY_THRESHOLD,
+    EmbedFn,
+    QueryCache,
+    normalize_query,
+)
+
 # Load environment variables
 load_dotenv()
 
+# Calls to R2R Cloud running at once, the others wait for a thread
+DEFAULT_MAX_WORKERS = 8
+# Collection listed by R2RExplorer.list_documents, unless R2R_COLLECTION_ID is set
+DEFAULT_COLLECTION_ID = "8283f90a-ba4f-54bc-8b4f-3cea2fa300d1"
+
+
+# Retrieval cache
+DEFAULT_CACHE_TTL = 600.0  # seconds
+DEFAULT_CACHE_MAX_ENTRIES = 512
+
+
+def _is_conflict(error: Exception) -> bool:
+    """Whether R2R refused to create a document whose id exists."""
+    return getattr(error, "status_code", None) == 409 or "already exists" in str(error).lower()
+
+
+def _chunk_results(response: Any) -> List[Any]:
+    """Chunks of a search response."""
+    results = getattr(response, "results", response)
+    return list(getattr(results, "chunk_search_results", None) or [])
+
+
+class RetrievalCache(QueryCache):
+    """Two-level cache of retrieval results.
+
+    The first level is an LRU keyed on the normalised query, `top_k` and the
+    collection. When `embed_fn` is given, a query missing from it may also be
+    served the result of a cached query whose embedding is similar enough,
+    for the same kind of retrieval, collection and `top_k`.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        embed_fn: Optional[EmbedFn] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ) -> None:
+        """Initialize the cache.
+        
+        Args:
+            ttl: Lifetime of a result in seconds
+            max_entries: Number of results kept before evicting the least recently used
+            embed_fn: Optional function, or coroutine function, embedding a
+                normalised query, used for similarity lookups
+            similarity_threshold: Minimum cosine similarity for a similar
+                query to be served a cached result
+        """
+        super().__init__(ttl, max_entries, embed_fn, similarity_threshold)
+
+    async def get(self, kind: str, collection: str, top_k: int, query: str) -> Optional[Any]:
+        """Cached result of a retrieval, None on a miss.
+        
+        Args:
+            kind: Kind of retrieval, e.g. "search" or "rag"
+            collection: Collection searched
+            top_k: Number of results
+            query: Query
+        """
+        _, entry = await self._lookup((kind, collection, top_k, normalize_query(query)))
+        return None if entry is None else entry.value
+
+    async def put(
+        self, kind: str, collection: str, top_k: int, query: str, value: Any
+    ) -> None:
+        """Cache the result of a retrieval, see `get`."""
+        await self._put((kind, collection, top_k, normalize_query(query)), value)
+
+    def invalidate(self, collection: Optional[str] = None) -> None:
+        """Drop the results of a collection, or every result."""
+        # keys are (kind of retrieval, collection, top_k, normalised query)
+        if collection is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[1] == collection]:
+            del self._entries[key]
+
+
 class R2RDocstore(Docstore):
     """Wrapper around R2R Cloud API."""
 
@@ -18,7 +119,11 @@ class R2RDocstore(Docstore):
         self,
         collection_name: str = "default",
         benchmark: bool = False,
-        char_limit: Optional[int] = None
+        char_limit: Optional[int] = None,
+        client: Optional[Any] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        cache: Optional[RetrievalCache] = None,
+        collection_id: Optional[str] = None,
     ) -> None:
         """Initialize R2R Cloud docstore.
         
@@ -26,14 +131,32 @@ class R2RDocstore(Docstore):
             collection_name: Name of the collection to use, defaults to "default"
             benchmark: Whether to collect performance metrics
             char_limit: Maximum number of characters to return per document
+            client: R2R client, by default one authenticated with R2R_API_KEY
+            max_workers: Maximum number of calls to R2R running at once
+            cache: Optional cache of the search results, invalidated when
+                documents are added
+            collection_id: Id of the collection listed, by default
+                R2R_COLLECTION_ID or DEFAULT_COLLECTION_ID
         """
         self.collection_name = collection_name
+        self.collection_id = collection_id or os.getenv("R2R_COLLECTION_ID", DEFAULT_COLLECTION_ID)
         self.char_limit = char_limit
         self.benchmark = benchmark
         self.all_times = []
+        self.max_workers = max_workers
+        self.cache = cache
+        # called when documents are added, e.g. to refresh a document listing
+        self.on_change: List[Callable[[], None]] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        if client is not None:
+            self.client = client
+            return
         
         # Initialize R2R client
         try:
+            from r2r import R2RClient
+            
             self.client = R2RClient()
             # Configure API key from environment variable
             api_key = os.getenv("R2R_API_KEY")
@@ -48,6 +171,32 @@ class R2RDocstore(Docstore):
         """Reset performance metrics."""
         self.all_times = []
 
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call a method of the synchronous R2R client in the thread pool.
+        
+        Args:
+            func: Method of the client
+            *args: Positional arguments
+            **kwargs: Keyword arguments
+            
+        Returns:
+            The result of the call
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="r2r"
+            )
+        # cancelling the awaiting task cancels the call if it has not started
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+
+    def close(self) -> None:
+        """Stop the thread pool, the calls not started yet are cancelled."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     def get_stats(self) -> Dict[str, List[float]]:
         """Get performance statistics."""
         return {
@@ -72,30 +221,19 @@ class R2RDocstore(Docstore):
         """
         start_time = time.time()
         try:
-            # Perform semantic search
-            results = await self.client.search(
-                query=query,
-                top_k=top_k,
-                collection=self.collection_name
-            )
+            documents = None
+            if self.cache is not None:
+                documents = await self.cache.get("search", self.collection_name, top_k, query)
+            if documents is None:
+                documents = await self._search(query, top_k)
+                if self.cache is not None:
+                    await self.cache.put("search", self.collection_name, top_k, query, documents)
             
-            if not results:
+            if not documents:
                 return [] if return_raw else f"Aucun résultat trouvé pour '{query}'."
             
-            # Convert to Documents
-            documents = []
-            for result in results:
-                doc = Document(
-                    page_content=result.text,
-                    metadata={
-                        "score": result.score,
-                        "collection": self.collection_name
-                    }
-                )
-                documents.append(doc)
-            
             if return_raw:
-                return documents
+                return list(documents)
             
             # Format results for display
             formatted_results = []
@@ -116,6 +254,25 @@ class R2RDocstore(Docstore):
             if self.benchmark:
                 self.all_times.append(time.time() - start_time)
 
+    async def _search(self, query: str, top_k: int) -> List[Document]:
+        # Perform semantic search
+        response = await self.run(
+            self.client.retrieval.search,
+            query=query,
+            search_settings={"limit": top_k},
+        )
+        # Convert to Documents
+        return [
+            Document(
+                page_content=result.text,
+                metadata={
+                    "score": result.score,
+                    "collection": self.collection_name
+                }
+            )
+            for result in _chunk_results(response)
+        ]
+
     def search(self, search_term: str) -> List[Document]:
         """Search for documents (required by Docstore interface).
         
@@ -126,13 +283,10 @@ class R2RDocstore(Docstore):
             List of matching documents
         """
         try:
-            results = self.client.retrieval.search(
-                query=search_term,
-                collection=self.collection_name
-            )
+            response = self.client.retrieval.search(query=search_term)
             
             documents = []
-            for result in results.chunk_search_results:
+            for result in _chunk_results(response):
                 doc = Document(
                     page_content=result.text,
                     metadata={
@@ -155,20 +309,68 @@ class R2RDocstore(Docstore):
                 Each document should have:
                 - text: str
                 - metadata: Dict[str, str] (optional)
+                - id: str (optional), a UUID, so that retrying a partly
+                  added batch does not add the same document twice
         """
         start_time = time.time()
         try:
-            # Add documents to collection
-            await self.client.add_documents(documents, collection=self.collection_name)
+            # Add documents to collection, one ingestion per document
+            await asyncio.gather(*(
+                self.run(self._create_document, document) for document in documents
+            ))
             logger.info(f"Added {len(documents)} documents to collection {self.collection_name}")
         except Exception as e:
             logger.error(f"Error adding documents to R2R: {str(e)}")
             raise
         finally:
+            # some documents may have been added, even on failure
+            if self.cache is not None:
+                self.cache.invalidate(self.collection_name)
+            for callback in self.on_change:
+                callback()
             if self.benchmark:
                 self.all_times.append(time.time() - start_time)
 
 
+    async def remove_stale_chunks(self, document_id: str, keep: Iterable[str]) -> None:
+        """Delete the chunks of a document that are not in `keep`.
+
+        Each chunk is an R2R document, with the id of its source document in
+        its metadata.
+
+        Args:
+            document_id: The `document_id` metadata of the chunks
+            keep: Ids of the current chunks of the document
+        """
+        filters = {
+            "$and": [
+                {"metadata.document_id": {"$eq": document_id}},
+                {"document_id": {"$nin": list(keep)}},
+            ]
+        }
+        try:
+            await self.run(self.client.documents.delete_by_filter, filters)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(self.collection_name)
+            for callback in self.on_change:
+                callback()
+
+    def _create_document(self, document: Dict[str, Any]) -> None:
+        try:
+            self.client.documents.create(
+                raw_text=document["text"],
+                metadata=document.get("metadata") or {},
+                id=document.get("id"),
+            )
+        except Exception as e:
+            # already added, by an attempt that failed on another document
+            if document.get("id") and _is_conflict(e):
+                logger.debug(f"Document {document['id']} already in R2R")
+                return
+            raise
+
+
 class R2RExplorer:
     """Helper class for exploring R2R Cloud documents."""
 
@@ -187,6 +389,10 @@ class R2RExplorer:
         self.documents: List[Document] = []
         self.char_limit = char_limit
         self.last_query = ""
+        # the document list is fetched once, then refreshed in the background
+        # and as soon as documents are added
+        self.catalogue = DocumentCatalogue(self._fetch_documents)
+        docstore.on_change.append(self.catalogue.invalidate)
 
     async def search(self, query: str, top_k: int = 5) -> str:
         """Search for documents and format results using RAG.
@@ -198,9 +404,18 @@ class R2RExplorer:
         Returns:
             Generated response based on search results
         """
+        cache = self.docstore.cache
+        collection = self.docstore.collection_name
         try:
-            # Faire une recherche RAG selon la doc
-            results = self.docstore.client.retrieval.rag(
+            # La génération coûte cher : réponse en cache pour une question déjà posée
+            if cache is not None:
+                answer = await cache.get("rag", collection, top_k, query)
+                if answer is not None:
+                    return answer
+            
+            # Faire une recherche RAG selon la doc, dans le pool de threads
+            results = await self.docstore.run(
+                self.docstore.client.retrieval.rag,
                 query=query,
                 search_settings={
                     "use_semantic_search": True,
@@ -218,7 +433,10 @@ class R2RExplorer:
             
             # Extraire la réponse générée
             if hasattr(results, 'results') and hasattr(results.results, 'generated_answer'):
-                return results.results.generated_answer
+                answer = results.results.generated_answer
+                if cache is not None:
+                    await cache.put("rag", collection, top_k, query, answer)
+                return answer
             
             return f"Aucun résultat trouvé pour '{query}'."
             
@@ -272,29 +490,51 @@ class R2RExplorer:
         
         return "\n\n".join(formatted_results)
 
-    async def list_documents(self) -> str:
-        """Liste tous les documents disponibles dans la collection par défaut.
+    async def _fetch_documents(self, offset: int, limit: int) -> List[CatalogueEntry]:
+        response = await self.docstore.run(
+            self.docstore.client.collections.list_documents,
+            self.docstore.collection_id,
+            offset=offset,
+            limit=limit,
+        )
+        return [
+            CatalogueEntry(
+                id=str(doc.id),
+                title=getattr(doc, "title", None) or str(doc.id),
+                created_at=(
+                    doc.created_at.isoformat()
+                    if hasattr(getattr(doc, "created_at", None), "isoformat")
+                    else getattr(doc, "created_at", None)
+                ),
+            )
+            for doc in getattr(response, "results", None) or []
+        ]
+
+    async def list_documents(
+        self,
+        title_prefix: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        offset: int = 0,
+        limit: int = DEFAULT_LIMIT,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+    ) -> str:
+        """Liste les documents de la collection, depuis le catalogue en cache.
         
+        Args:
+            title_prefix: Début du titre, sans tenir compte de la casse
+            since: Première date de création, YYYY-MM-DD
+            until: Dernière date de création, YYYY-MM-DD
+            offset: Nombre de documents à sauter
+            limit: Nombre maximum de documents listés
+            token_budget: Nombre maximum de tokens de la liste
+            
         Returns:
             Chaîne formatée avec la liste des documents
         """
         try:
-            # Obtenir la liste des documents de la collection par défaut
-            docs = self.docstore.client.collections.list_documents("8283f90a-ba4f-54bc-8b4f-3cea2fa300d1")
-            
-            if not hasattr(docs, 'results') or not docs.results:
-                return "Aucun document trouvé dans la collection par défaut."
-            
-            # Formater les résultats
-            formatted_docs = []
-            for doc in docs.results:
-                doc_info = [
-                    f"Document:",
-                    f"- Titre: {doc.title}",
-                    f"- ID: {doc.id}"
-                ]
-                formatted_docs.append("\n".join(doc_info))
-            
-            return "\n\n".join(formatted_docs)
+            return await self.catalogue.list_documents(
+                title_prefix, since, until, offset, limit, token_budget
+            )
         except Exception as e:
             return f"Erreur lors de la récupération des documents R2R : {str(e)}"
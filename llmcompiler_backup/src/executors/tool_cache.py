@@ -0,0 +1,167 @@
+"""Process-wide memoization of tool calls."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+DEFAULT_TTL = 60.0  # seconds
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+CacheKey = Tuple[str, str]
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    expires_at: float
+    size: int
+
+
+class ToolResultCache:
+    """LRU cache of tool results keyed on (tool name, resolved arguments).
+
+    Identical calls issued while a first one is still running wait for its
+    result instead of calling the tool again. Entries expire after the TTL of
+    their tool and the least recently used ones are evicted once the cache
+    holds more than `max_bytes`.
+
+    Only registered tools are cached; a tool opts out with `cacheable=False`.
+    Tools returning their errors as results tell them apart with
+    `cache_result`, those results are shared with the waiters but not stored.
+    """
+
+    def __init__(
+        self, max_bytes: int = DEFAULT_MAX_BYTES, default_ttl: float = DEFAULT_TTL
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._ttls: Dict[str, float] = {}
+        self._result_filters: Dict[str, Callable[[Any], bool]] = {}
+        self._entries: OrderedDict[CacheKey, _CacheEntry] = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+        self.num_bytes = 0
+        self.reset_stats()
+
+    def register_tools(self, tools: Sequence[Any]) -> None:
+        """Enable caching for the tools from their `cacheable` and `cache_ttl`."""
+        for tool in tools:
+            if getattr(tool, "cacheable", True):
+                ttl = getattr(tool, "cache_ttl", None)
+                self._ttls[tool.name] = self.default_ttl if ttl is None else ttl
+                cache_result = getattr(tool, "cache_result", None)
+                if cache_result is not None:
+                    self._result_filters[tool.name] = cache_result
+                else:
+                    self._result_filters.pop(tool.name, None)
+            else:
+                self._ttls.pop(tool.name, None)
+                self._result_filters.pop(tool.name, None)
+                self.invalidate(tool.name)
+
+    def is_cacheable(self, name: str) -> bool:
+        return name in self._ttls
+
+    @staticmethod
+    def make_key(name: str, args: Sequence[Any]) -> CacheKey:
+        return name, repr(tuple(args))
+
+    async def get_or_call(
+        self, name: str, args: Sequence[Any], call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the cached result of `name(*args)`, calling `call()` on a miss."""
+        if not self.is_cacheable(name):
+            return await call()
+
+        key = self.make_key(name, args)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            self._evict(key)
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # we were cancelled ourselves
+                    raise
+            # the first caller was cancelled, make the call on our own
+            return await self.get_or_call(name, args, call)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # waiters may all be gone, do not warn about unretrieved exceptions
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = future
+        try:
+            value = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # failures are not cached, the waiters get the same exception
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            cache_result = self._result_filters.get(name)
+            if cache_result is None or cache_result(value):
+                self._store(key, value, self._ttls.get(name, self.default_ttl))
+            else:
+                # an error returned as a result, e.g. during an outage
+                self.uncached += 1
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _store(self, key: CacheKey, value: Any, ttl: float) -> None:
+        size = len(key[1]) + len(str(value).encode("utf-8"))
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = _CacheEntry(value, time.monotonic() + ttl, size)
+        self.num_bytes += size
+        while self.num_bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _evict(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self.num_bytes -= entry.size
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drop the cached results of the tool `name`, or of every tool."""
+        for key in [k for k in self._entries if name is None or k[0] == name]:
+            self._evict(key)
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.uncached = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "uncached": self.uncached,
+            "entries": len(self._entries),
+            "bytes": self.num_bytes,
+        }
+
+
+# Export a singleton instance
+tool_cache = ToolResultCache()
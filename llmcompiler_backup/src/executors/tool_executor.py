@@ -0,0 +1,246 @@
+"""Process-wide tool executor enforcing per-tool concurrency and rate limits."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# latency assumed for the tools that never ran, in seconds
+DEFAULT_LATENCY = 1.0
+# weight of the last call in the moving average of a tool's latency
+LATENCY_SMOOTHING = 0.2
+
+
+@dataclass
+class ToolLimits:
+    """Limits applied to every call of a tool, whatever the session."""
+
+    max_concurrency: Optional[int] = None
+    rate_limit: Optional[float] = None  # calls per second
+    timeout: Optional[float] = None  # seconds
+
+
+@dataclass
+class ToolQueueStats:
+    calls: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record(self, wait: float) -> None:
+        self.calls += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class _ToolLane:
+    """Admission queue of a single tool.
+
+    Waiting calls are grouped by session and sessions are served round-robin,
+    so that one plan with many calls to a tool cannot starve the others.
+    Within a session, the call with the highest priority is served first.
+    """
+
+    def __init__(self, limits: ToolLimits) -> None:
+        self.limits = limits
+        self.active = 0
+        self.queue_depth = 0
+        self.stats = ToolQueueStats()
+        self.latency: Optional[float] = None
+        self._waiters: OrderedDict[
+            Hashable, List[Tuple[float, int, asyncio.Future]]
+        ] = OrderedDict()
+        self._counter = itertools.count()
+        self._next_start = 0.0
+
+    def _has_free_slot(self) -> bool:
+        max_concurrency = self.limits.max_concurrency
+        return max_concurrency is None or self.active < max_concurrency
+
+    async def acquire(self, session: Hashable, priority: float = 0.0) -> None:
+        if self._has_free_slot() and not self._waiters:
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(
+                self._waiters.setdefault(session, []),
+                (-priority, next(self._counter), future),
+            )
+            self.queue_depth += 1
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # the slot was handed over right before the cancellation
+                    self.release()
+                else:
+                    self._remove_waiter(session, future)
+                raise
+
+        try:
+            await self._throttle()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake_waiters()
+
+    def _remove_waiter(self, session: Hashable, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(session)
+        entry = next((w for w in waiters or () if w[2] is future), None)
+        if entry is None:
+            return
+        waiters.remove(entry)
+        heapq.heapify(waiters)
+        self.queue_depth -= 1
+        if not waiters:
+            del self._waiters[session]
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._has_free_slot():
+            session, waiters = next(iter(self._waiters.items()))
+            _, _, future = heapq.heappop(waiters)
+            self.queue_depth -= 1
+            if waiters:
+                # give the other sessions a turn before this one is served again
+                self._waiters.move_to_end(session)
+            else:
+                del self._waiters[session]
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    async def _throttle(self) -> None:
+        """Space the starts of the calls according to the rate limit."""
+        if not self.limits.rate_limit:
+            return
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + 1.0 / self.limits.rate_limit
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class ToolExecutor:
+    """Runs tool calls under the limits declared by the tools.
+
+    A single instance is shared by all the `LLMCompiler` invocations of the
+    process, so the limits hold across concurrent requests. Tools that were
+    never configured run without any limit.
+    """
+
+    def __init__(self) -> None:
+        self._lanes: Dict[str, _ToolLane] = {}
+
+    def configure(self, name: str, limits: ToolLimits) -> None:
+        """Set the limits of a tool, keeping its queue if it already exists."""
+        lane = self._lanes.get(name)
+        if lane is None:
+            self._lanes[name] = _ToolLane(limits)
+        else:
+            lane.limits = limits
+            # the new limits may allow more calls to run
+            lane._wake_waiters()
+
+    def register_tools(self, tools: Sequence[Any]) -> None:
+        """Configure the limits of tools from their `max_concurrency`,
+        `rate_limit` and `timeout`."""
+        for tool in tools:
+            self.configure(
+                tool.name,
+                ToolLimits(
+                    max_concurrency=getattr(tool, "max_concurrency", None),
+                    rate_limit=getattr(tool, "rate_limit", None),
+                    timeout=getattr(tool, "timeout", None),
+                ),
+            )
+
+    def _get_lane(self, name: str) -> _ToolLane:
+        if name not in self._lanes:
+            self._lanes[name] = _ToolLane(ToolLimits())
+        return self._lanes[name]
+
+    def record_latency(self, name: str, latency: float) -> None:
+        """Fold the duration of a call into the moving average of the tool."""
+        lane = self._get_lane(name)
+        if lane.latency is None:
+            lane.latency = latency
+        else:
+            lane.latency += LATENCY_SMOOTHING * (latency - lane.latency)
+
+    def estimated_latency(self, name: str) -> float:
+        """Expected duration of a call of the tool `name`, from its history."""
+        lane = self._lanes.get(name)
+        if lane is None or lane.latency is None:
+            return DEFAULT_LATENCY
+        return lane.latency
+
+    async def run(
+        self,
+        name: str,
+        call: Callable[[], Awaitable[Any]],
+        session: Hashable = None,
+        priority: float = 0.0,
+    ) -> Any:
+        """Wait for a free slot of the tool `name`, then await `call()`.
+
+        Raises `asyncio.TimeoutError` if the call outlasts the tool's timeout,
+        the time spent waiting for a slot is not counted.
+
+        Args:
+            name: Name of the tool.
+            call: Zero-argument coroutine function doing the actual call.
+            session: Identifier of the request issuing the call, used to
+                share the slots fairly between concurrent requests.
+            priority: Calls of a session with a higher priority get a slot first.
+        """
+        lane = self._get_lane(name)
+        queued_at = time.monotonic()
+        await lane.acquire(session, priority)
+        try:
+            started_at = time.monotonic()
+            lane.stats.record(started_at - queued_at)
+            result = await asyncio.wait_for(call(), lane.limits.timeout)
+            self.record_latency(name, time.monotonic() - started_at)
+            return result
+        finally:
+            lane.release()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for name, lane in self._lanes.items():
+            calls = lane.stats.calls
+            stats[name] = {
+                "active": lane.active,
+                "queue_depth": lane.queue_depth,
+                "calls": calls,
+                "mean_wait": lane.stats.total_wait / calls if calls else 0.0,
+                "max_wait": lane.stats.max_wait,
+                "mean_latency": lane.latency,
+            }
+        return stats
+
+    def reset_stats(self) -> None:
+        for lane in self._lanes.values():
+            lane.stats = ToolQueueStats()
+
+
+# Export a singleton instance
+tool_executor = ToolExecutor()
@@ -2,3 +2,6 @@ END_OF_PLAN = "<END_OF_PLAN>"
 
 JOINNER_FINISH = "Finish"
 JOINNER_REPLAN = "Replan"
+
+# Observation of the tasks that did not finish before their deadline
+TASK_TIMEOUT = "Timed out: the action did not finish in time, no result is available."
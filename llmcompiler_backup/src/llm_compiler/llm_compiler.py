@@ -1,5 +1,18 @@
 import asyncio
-from typing import Any, Dict, List, Mapping, Optional, Sequence, Union, cast
+import uuid
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+    cast,
+)
 
 from langchain.callbacks.manager import (
     AsyncCallbackManagerForChainRun,
@@ -10,13 +23,20 @@ from langchain.llms import BaseLLM
 from langchain.llms.base import BaseLLM
 from langchain.prompts.base import StringPromptValue
 
-from llmcompiler.src.callbacks.callbacks import AsyncStatsCallbackHandler
+from llmcompiler.src.callbacks.callbacks import (
+    AsyncAnswerStreamCallbackHandler,
+    AsyncStatsCallbackHandler,
+)
 from llmcompiler.src.chains.chain import Chain
+from llmcompiler.src.executors.tool_cache import tool_cache
+from llmcompiler.src.executors.tool_executor import tool_executor
 from llmcompiler.src.llm_compiler.constants import JOINNER_REPLAN
+from llmcompiler.src.llm_compiler.plan_cache import PlanCache
 from llmcompiler.src.llm_compiler.planner import Planner
 from llmcompiler.src.llm_compiler.task_fetching_unit import Task, TaskFetchingUnit
 from llmcompiler.src.tools.base import StructuredTool, Tool
 from llmcompiler.src.utils.logger_utils import log
+from llmcompiler.src.utils.prompt_utils import prompt_prefixes
 
 
 class LLMCompilerAgent:
@@ -40,6 +60,49 @@ class LLMCompilerAgent:
         raise ValueError("LLM must be either BaseChatModel or BaseLLM")
 
 
+@dataclass
+class RunContext:
+    """State of a single invocation of the compiler.
+
+    Every invocation gets its own stats callbacks, scheduler and frame sink,
+    so that concurrent requests served by the same `LLMCompiler` never share
+    state. The streaming plan parser is created per plan by the planner.
+    """
+
+    # all the replans of a query share their tool slots as a single session
+    session: str = field(default_factory=lambda: uuid.uuid4().hex)
+    planner_callback: Optional[AsyncStatsCallbackHandler] = None
+    executor_callback: Optional[AsyncStatsCallbackHandler] = None
+    task_fetching_unit: Optional[TaskFetchingUnit] = None
+    # called with the frames described in `LLMCompiler.astream`
+    emit: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def on_task_start(self, task: Task) -> None:
+        text = task.get_though_action_observation(include_action_idx=True)
+        self.emit({"type": "thought", "text": text.strip(), "icon": "🔧"})
+
+    def on_task_done(self, task: Task) -> None:
+        text = task.get_though_action_observation(
+            include_thought=False, include_action_idx=True
+        )
+        self.emit({"type": "thought", "text": text.strip(), "icon": "✅"})
+
+    def on_answer_token(self, token: str) -> None:
+        self.emit({"type": "response", "text": token, "delta": True})
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self.planner_callback is None or self.executor_callback is None:
+            return {}
+        stats = {
+            "planner": self.planner_callback.get_stats(),
+            "executor": self.executor_callback.get_stats(),
+        }
+        stats["total"] = {
+            k: v + stats["executor"].get(k, 0) for k, v in stats["planner"].items()
+        }
+        return stats
+
+
 class LLMCompiler(Chain, extra="allow"):
     """LLMCompiler Engine."""
 
@@ -61,6 +124,10 @@ class LLMCompiler(Chain, extra="allow"):
         joinner_prompt_final: Optional[str],
         max_replans: int,
         benchmark: bool,
+        plan_timeout: Optional[float] = None,
+        planner_speculative: bool = False,
+        plan_cache: Optional[PlanCache] = None,
+        tool_filter: Optional[Callable[[str], bool]] = None,
         **kwargs,
     ) -> None:
         """
@@ -68,6 +135,8 @@ class LLMCompiler(Chain, extra="allow"):
             tools: List of tools to use.
             max_replans: Maximum number of replans to do.
             benchmark: Whether to collect benchmark stats.
+            plan_timeout: Deadline in seconds for executing each plan. When it
+                passes, the joinner runs with the observations available so far.
 
         Planner Args:
             planner_llm: LLM to use for planning.
@@ -77,6 +146,13 @@ class LLMCompiler(Chain, extra="allow"):
                 If not assigned, default to `planner_example_prompt`.
             planner_stop: Stop tokens for planning.
             planner_stream: Whether to stream the planning.
+            planner_speculative: Whether to start streamed actions as soon as
+                their arguments are complete, before the end of their line.
+                Only used with `planner_stream`.
+            plan_cache: Cache of the first plan of the questions already
+                answered. A hit skips the planner LLM.
+            tool_filter: Whether a tool, by name, can be used in the next plan,
+                e.g. whether its dependencies are up. Defaults to all tools.
 
         Agent Args:
             agent_llm: LLM to use for agent.
@@ -98,39 +174,56 @@ class LLMCompiler(Chain, extra="allow"):
             example_prompt_replan=planner_example_prompt_replan,
             tools=tools,
             stop=planner_stop,
+            plan_cache=plan_cache,
+            tool_filter=tool_filter,
         )
 
+        # tool limits and cached results are shared process-wide,
+        # across all the compilers
+        tool_executor.register_tools(tools)
+        tool_cache.register_tools(tools)
+
         self.agent = LLMCompilerAgent(agent_llm)
         self.joinner_prompt = joinner_prompt
         self.joinner_prompt_final = joinner_prompt_final or joinner_prompt
+        # instructions and examples come first and never change
+        self.joinner_prefix = prompt_prefixes.register(f"{self.joinner_prompt}\n")
+        self.joinner_prefix_final = prompt_prefixes.register(
+            f"{self.joinner_prompt_final}\n"
+        )
         self.planner_stream = planner_stream
+        self.planner_speculative = planner_speculative
         self.max_replans = max_replans
+        self.plan_timeout = plan_timeout
 
-        # callbacks
+        # callbacks are created for every run, see `RunContext`
         self.benchmark = benchmark
-        if benchmark:
-            self.planner_callback = AsyncStatsCallbackHandler(stream=planner_stream)
-            self.executor_callback = AsyncStatsCallbackHandler(stream=False)
-        else:
-            self.planner_callback = None
-            self.executor_callback = None
+        self.agent_stream = getattr(agent_llm, "streaming", False)
+        self.last_run_stats = {}
+
+    def _new_run(
+        self, emit: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> RunContext:
+        run = RunContext(emit=emit)
+        if self.benchmark:
+            run.planner_callback = AsyncStatsCallbackHandler(stream=self.planner_stream)
+            run.executor_callback = AsyncStatsCallbackHandler(stream=self.agent_stream)
+        return run
 
     def get_all_stats(self):
+        """Stats of the last finished run, with the process-wide tool stats."""
         stats = {}
         if self.benchmark:
-            stats["planner"] = self.planner_callback.get_stats()
-            stats["executor"] = self.executor_callback.get_stats()
-            stats["total"] = {
-                k: v + stats["executor"].get(k, 0) for k, v in stats["planner"].items()
-            }
+            stats.update(self.last_run_stats)
+            stats["tools"] = tool_executor.get_stats()
+            stats["tool_cache"] = tool_cache.get_stats()
+            if self.planner.plan_cache is not None:
+                stats["plan_cache"] = self.planner.plan_cache.get_stats()
 
         return stats
 
     def reset_all_stats(self):
-        if self.planner_callback:
-            self.planner_callback.reset()
-        if self.executor_callback:
-            self.executor_callback.reset()
+        self.last_run_stats = {}
 
     @property
     def input_keys(self) -> List[str]:
@@ -200,22 +293,35 @@ class LLMCompiler(Chain, extra="allow"):
         return formatted_contexts
 
     async def join(
-        self, input_query: str, agent_scratchpad: str, is_final: bool
+        self,
+        input_query: str,
+        agent_scratchpad: str,
+        is_final: bool,
+        on_answer_token: Optional[Callable[[str], None]] = None,
+        stats_callback: Optional[AsyncStatsCallbackHandler] = None,
     ) -> str:
+        """Ask the agent to answer or to replan.
+
+        Args:
+            stats_callback: Collects the token counts of the agent call.
+            on_answer_token: Called with the chunks of the final answer as the
+                agent generates them. The agent LLM must be streaming.
+        """
         if is_final:
-            joinner_prompt = self.joinner_prompt_final
+            joinner_prefix = self.joinner_prefix_final
         else:
-            joinner_prompt = self.joinner_prompt
+            joinner_prefix = self.joinner_prefix
         prompt = (
-            f"{joinner_prompt}\n"  # Instructions and examples
-            f"Question: {input_query}\n\n"  # User input query
-            f"{agent_scratchpad}\n"  # T-A-O
+            joinner_prefix.text  # Instructions and examples
+            + f"Question: {input_query}\n\n"  # User input query
+            + f"{agent_scratchpad}\n"  # T-A-O
             # "---\n"
         )
         log("Joining prompt:\n", prompt, block=True)
-        response = await self.agent.arun(
-            prompt, callbacks=[self.executor_callback] if self.benchmark else None
-        )
+        callbacks = [stats_callback] if stats_callback else []
+        if on_answer_token:
+            callbacks.append(AsyncAnswerStreamCallbackHandler(on_answer_token))
+        response = await self.agent.arun(prompt, callbacks=callbacks or None)
         raw_answer = cast(str, response)
         log("Question: \n", input_query, block=True)
         log("Raw Answer: \n", raw_answer, block=True)
@@ -237,6 +343,50 @@ class LLMCompiler(Chain, extra="allow"):
         inputs: Dict[str, Any],
         run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
     ) -> Dict[str, Any]:
+        return await self._run(inputs, self._new_run())
+
+    async def astream(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Answer `query`, yielding chat frames as the answer progresses.
+
+        Frames are dicts with a `type` and a `text`:
+        - "thought" frames for every action when it starts, and again with its
+          observation when it is done;
+        - "response" frames with `delta` set for each chunk of the answer;
+        - a last "response" frame with `done` set and the whole answer.
+
+        With `benchmark`, the last frame also holds the `stats` of this run.
+
+        Closing the generator cancels the planner and the running tools.
+        """
+        events: asyncio.Queue[Optional[Dict[str, Any]]] = asyncio.Queue()
+        run = self._new_run(emit=events.put_nowait)
+        handle = asyncio.create_task(self._run({self.input_key: query}, run))
+        handle.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            outputs = handle.result()
+        finally:
+            if not handle.done():
+                handle.cancel()
+                await asyncio.gather(handle, return_exceptions=True)
+        frame = {"type": "response", "text": outputs[self.output_key], "done": True}
+        if self.benchmark:
+            frame["stats"] = run.get_stats()
+        yield frame
+
+    async def _run(self, inputs: Dict[str, Any], run: RunContext) -> Dict[str, Any]:
+        """Plan, execute and join until the agent has an answer."""
+        try:
+            return await self._plan_and_join(inputs, run)
+        finally:
+            self.last_run_stats = run.get_stats()
+
+    async def _plan_and_join(
+        self, inputs: Dict[str, Any], run: RunContext
+    ) -> Dict[str, Any]:
+        streaming = run.emit is not None
+        planner_callbacks = [run.planner_callback] if run.planner_callback else None
         contexts = []
         joinner_thought = ""
         agent_scratchpad = ""
@@ -244,36 +394,53 @@ class LLMCompiler(Chain, extra="allow"):
             is_first_iter = i == 0
             is_final_iter = i == self.max_replans - 1
 
-            task_fetching_unit = TaskFetchingUnit()
+            task_fetching_unit = run.task_fetching_unit = TaskFetchingUnit(
+                session=run.session,
+                speculative=self.planner_stream and self.planner_speculative,
+                on_task_start=run.on_task_start if streaming else None,
+                on_task_done=run.on_task_done if streaming else None,
+            )
             if self.planner_stream:
                 task_queue = asyncio.Queue()
-                asyncio.create_task(
+                planner_task = asyncio.create_task(
                     self.planner.aplan(
                         inputs=inputs,
                         task_queue=task_queue,
                         is_replan=not is_first_iter,
-                        callbacks=(
-                            [self.planner_callback] if self.planner_callback else None
-                        ),
+                        callbacks=planner_callbacks,
+                        speculative=self.planner_speculative,
                     )
                 )
-                await task_fetching_unit.aschedule(
-                    task_queue=task_queue, func=lambda x: None
-                )
+                try:
+                    await task_fetching_unit.aschedule(
+                        task_queue=task_queue,
+                        func=lambda x: None,
+                        timeout=self.plan_timeout,
+                    )
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    # the request was cancelled, the planner may still be streaming
+                    planner_task.cancel()
+                    raise
+                if task_fetching_unit.timed_out:
+                    # the plan deadline passed, the planner may still be streaming
+                    planner_task.cancel()
+                    await asyncio.gather(planner_task, return_exceptions=True)
+                else:
+                    # the plan is complete, the planner may still be caching
+                    # it; its errors are raised here
+                    await planner_task
             else:
                 tasks = await self.planner.plan(
                     inputs=inputs,
                     is_replan=not is_first_iter,
                     # callbacks=run_manager.get_child() if run_manager else None,
-                    callbacks=(
-                        [self.planner_callback] if self.planner_callback else None
-                    ),
+                    callbacks=planner_callbacks,
                 )
                 log("Graph of tasks: ", tasks, block=True)
-                if self.benchmark:
-                    self.planner_callback.additional_fields["num_tasks"] = len(tasks)
+                if run.planner_callback:
+                    run.planner_callback.additional_fields["num_tasks"] = len(tasks)
                 task_fetching_unit.set_tasks(tasks)
-                await task_fetching_unit.schedule()
+                await task_fetching_unit.schedule(timeout=self.plan_timeout)
             tasks = task_fetching_unit.tasks
 
             # collect thought-action-observation
@@ -294,10 +461,17 @@ class LLMCompiler(Chain, extra="allow"):
                 inputs["input"],
                 agent_scratchpad=agent_scratchpad,
                 is_final=is_final_iter,
+                on_answer_token=run.on_answer_token if streaming else None,
+                stats_callback=run.executor_callback,
             )
             if not is_replan:
                 log("Break out of replan loop.")
                 break
+            if is_first_iter and self.planner.plan_cache is not None:
+                # the plan was not enough to answer, do not replay it
+                self.planner.plan_cache.discard(
+                    inputs["input"], self.planner.available_tools()
+                )
 
             # Collect contexts for the subsequent replanner
             context = self._generate_context_for_replanner(
@@ -1,5 +1,6 @@
 """LLM Compiler Output Parser"""
 
+import ast
 import re
 from typing import Any, Dict, List, Optional, Sequence, Union
 
@@ -13,12 +14,24 @@ THOUGHT_PATTERN = r"Thought: ([^\n]*)"
 ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)(\s*#\w+\n)?"
 # $1 or ${1} -> 1
 ID_PATTERN = r"\$\{?(\d+)\}?"
+# <idx>. <tool_name>( at the start of a line, the arguments may be incomplete
+PARTIAL_ACTION_PATTERN = r"\n*(\d+)\. (\w+)\("
+# <idx>. <tool_name>(<args>) with nothing after the closing parenthesis yet
+CLOSED_ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)$"
+
+# Plan grammar, compiled once for every parser
+THOUGHT_REGEX = re.compile(THOUGHT_PATTERN)
+ACTION_REGEX = re.compile(ACTION_PATTERN)
+PLAN_REGEX = re.compile(rf"(?:{THOUGHT_PATTERN}\n)?{ACTION_PATTERN}")
+PARTIAL_ACTION_REGEX = re.compile(PARTIAL_ACTION_PATTERN)
+CLOSED_ACTION_REGEX = re.compile(CLOSED_ACTION_PATTERN)
+ID_REGEX = re.compile(ID_PATTERN)
 
 END_OF_PLAN = "<END_OF_PLAN>"
 
 
 def default_dependency_rule(idx, args: str):
-    matches = re.findall(ID_PATTERN, args)
+    matches = ID_REGEX.findall(args)
     numbers = [int(match) for match in matches]
     return idx in numbers
 
@@ -32,8 +45,7 @@ class LLMCompilerPlanParser:
     def parse(self, text: str) -> list[str]:
         # 1. search("Ronaldo number of kids") -> 1, "search", '"Ronaldo number of kids"'
         # pattern = r"(\d+)\. (\w+)\(([^)]+)\)"
-        pattern = rf"(?:{THOUGHT_PATTERN}\n)?{ACTION_PATTERN}"
-        matches = re.findall(pattern, text)
+        matches = PLAN_REGEX.findall(text)
 
         graph_dict = {}
 
@@ -115,6 +127,7 @@ def instantiate_task(
     args: str,
     thought: str,
 ) -> Task:
+    raw_args = args
     dependencies = _get_dependencies_from_graph(idx, tool_name, args)
     args = _parse_llm_compiler_action_args(args)
     if tool_name == "join":
@@ -134,4 +147,5 @@ def instantiate_task(
         stringify_rule=stringify_rule,
         thought=thought,
         is_join=tool_name == "join",
+        raw_args=raw_args,
     )
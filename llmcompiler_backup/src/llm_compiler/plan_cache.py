@@ -0,0 +1,142 @@
+"""Cache of the plans generated for previously seen questions."""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+from llmcompiler.src.llm_compiler.output_parser import instantiate_task
+from llmcompiler.src.llm_compiler.task_fetching_unit import Task
+from llmcompiler.src.tools.base import StructuredTool, Tool
+from llmcompiler.src.utils.cache_utils import (
+    DEFAULT_SIMILARITY_THRESHOLD,
+    EmbedFn,
+    QueryCache,
+    normalize_query,
+)
+
+DEFAULT_TTL = 600.0  # seconds
+DEFAULT_MAX_ENTRIES = 1024
+
+PlanKey = Tuple[str, str]
+
+
+def tools_fingerprint(tools: Sequence[Union[Tool, StructuredTool]]) -> str:
+    """Identify a tool set, so that plans are not replayed on different tools."""
+    digest = hashlib.sha1()
+    for tool in sorted(tools, key=lambda tool: tool.name):
+        digest.update(f"{tool.name}\0{tool.description}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedAction:
+    """An action of a plan, as written by the planner."""
+
+    idx: int
+    name: str
+    raw_args: str
+    thought: str
+    dependencies: List[int]
+
+
+class PlanCache(QueryCache):
+    """LRU cache of plans keyed on the normalised question and the tool set.
+
+    Only the actions are stored; a hit instantiates fresh tasks from them, so
+    that the observations of a previous run are never reused. When `embed_fn`
+    is given, a question missing from the cache may also reuse the plan of a
+    cached question whose embedding is similar enough.
+
+    A plan is only served for the tool set it was made with. The plans of the
+    other tool sets are kept, e.g. while a tool is down, and are evicted by
+    the LRU and the TTL.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        embed_fn: Optional[EmbedFn] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ) -> None:
+        """
+        Args:
+            ttl: Lifetime of a plan in seconds.
+            max_entries: Number of plans kept before evicting the least recently used.
+            embed_fn: Optional function, or coroutine function, embedding a
+                normalised question, used for similarity lookups.
+            similarity_threshold: Minimum cosine similarity for a similar
+                question to reuse a cached plan.
+        """
+        super().__init__(ttl, max_entries, embed_fn, similarity_threshold)
+        # key of the plan served for a question, when it was a similar one
+        self._served: OrderedDict[PlanKey, PlanKey] = OrderedDict()
+
+    async def lookup(
+        self, query: str, tools: Sequence[Union[Tool, StructuredTool]]
+    ) -> Optional[Dict[int, Task]]:
+        """Return a fresh task graph for `query` if a plan is cached for it."""
+        fingerprint = tools_fingerprint(tools)
+        key = (fingerprint, normalize_query(query))
+        served_key, entry = await self._lookup(key)
+        if entry is None:
+            return None
+        if served_key != key:
+            # the plan of a similar question
+            self._served[key] = served_key
+            self._served.move_to_end(key)
+            while len(self._served) > self.max_entries:
+                self._served.popitem(last=False)
+
+        return {
+            action.idx: instantiate_task(
+                tools=tools,
+                idx=action.idx,
+                tool_name=action.name,
+                args=action.raw_args,
+                thought=action.thought,
+            )
+            for action in entry.value
+        }
+
+    async def store(
+        self,
+        query: str,
+        tools: Sequence[Union[Tool, StructuredTool]],
+        tasks: Mapping[int, Task],
+    ) -> None:
+        """Cache the plan generated for `query`. Plans without a join are ignored."""
+        if self.ttl <= 0 or not any(task.is_join for task in tasks.values()):
+            return
+        fingerprint = tools_fingerprint(tools)
+        query = normalize_query(query)
+        actions = [
+            CachedAction(
+                idx=task.idx,
+                name=task.name,
+                raw_args=task.raw_args or "",
+                thought=task.thought or "",
+                dependencies=list(task.dependencies),
+            )
+            for task in tasks.values()
+        ]
+        key = (fingerprint, query)
+        self._served.pop(key, None)
+        await self._put(key, actions)
+
+    def discard(self, query: str, tools: Sequence[Union[Tool, StructuredTool]]) -> None:
+        """Forget the plan served for `query`, e.g. because it was not enough to answer.
+
+        When it was the plan of a similar question, that plan is forgotten,
+        so that it is not replayed for the next similar questions either.
+        """
+        key = (tools_fingerprint(tools), normalize_query(query))
+        self._entries.pop(self._served.pop(key, key), None)
+
+    def invalidate(self) -> None:
+        """Drop every cached plan."""
+        self._entries.clear()
+        self._served.clear()
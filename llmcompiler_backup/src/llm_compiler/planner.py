@@ -1,8 +1,8 @@
 """LLM Compiler Planner"""
 
+import ast
 import asyncio
-import re
-from typing import Any, Optional, Sequence, Union
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
 from uuid import UUID
 
 from langchain.callbacks.base import AsyncCallbackHandler, Callbacks
@@ -14,14 +14,18 @@ from langchain.schema.messages import HumanMessage, SystemMessage
 from llmcompiler.src.executors.schema import Plan
 from llmcompiler.src.llm_compiler.constants import END_OF_PLAN
 from llmcompiler.src.llm_compiler.output_parser import (
-    ACTION_PATTERN,
-    THOUGHT_PATTERN,
+    ACTION_REGEX,
+    CLOSED_ACTION_REGEX,
+    PARTIAL_ACTION_REGEX,
+    THOUGHT_REGEX,
     LLMCompilerPlanParser,
     instantiate_task,
 )
+from llmcompiler.src.llm_compiler.plan_cache import PlanCache
 from llmcompiler.src.llm_compiler.task_fetching_unit import Task
 from llmcompiler.src.tools.base import StructuredTool, Tool
 from llmcompiler.src.utils.logger_utils import log
+from llmcompiler.src.utils.prompt_utils import PromptPrefix, prompt_prefixes
 
 JOIN_DESCRIPTION = (
     "join():\n"
@@ -83,35 +87,79 @@ def generate_llm_compiler_prompt(
     return prefix
 
 
+def _args_are_closed(args: str) -> bool:
+    """Whether `args` is a syntactically complete argument list."""
+    try:
+        ast.parse(f"f({args})", mode="eval")
+    except SyntaxError:
+        return False
+    return True
+
+
 class StreamingGraphParser:
-    """Streaming version of the GraphParser."""
+    """Streaming version of the GraphParser.
 
-    buffer = ""
-    thought = ""
-    graph_dict = {}
+    Tokens are consumed in a single pass: the pieces of the unfinished line
+    are kept aside and only joined and matched against the plan grammar once
+    the line ends, so that completed lines are never scanned again.
 
-    def __init__(self, tools: Sequence[Union[Tool, StructuredTool]]) -> None:
-        self.tools = tools
+    In speculative mode, an action is emitted as soon as its argument list is
+    syntactically closed, before the end of its line. If the completed line
+    turns out to differ, the corrected task is emitted again with the same
+    idx, and it replaces the speculative one.
+    """
 
-    def _match_buffer_and_generate_task(self, suffix: str) -> Optional[Task]:
-        """Runs every time "\n" is encountered in the input stream or at the end of the stream.
-        Matches the buffer against the regex patterns and generates a task if a match is found.
+    def __init__(
+        self,
+        tools: Sequence[Union[Tool, StructuredTool]],
+        speculative: bool = False,
+        on_tool_hint: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """
+        Args:
+            tools: Tools the plan can use.
+            speculative: Whether to emit actions before the end of their line.
+            on_tool_hint: Called with the name of a tool as soon as a line
+                starts calling it, e.g. to warm up its connections.
+        """
+        self.tools = tools
+        self.speculative = speculative
+        self.on_tool_hint = on_tool_hint
+        # thought preceding the next action
+        self.thought = ""
+        # pieces of the line being received
+        self._line: list[str] = []
+        # task emitted ahead of the end of the current line
+        self.speculated_task: Optional[Task] = None
+        self.hinted_line = False
+
+    def _match_line_and_generate_task(self, line: str) -> Optional[Task]:
+        """Runs on every complete line of the stream.
+        Matches the line against the plan grammar and generates a task if a match is found.
         Match patterns include:
         1. Thought: <thought>
-          - this case, the thought is stored in self.thought, and we reset the buffer.
+          - this case, the thought is stored in self.thought.
           - the thought is then used as the thought for the next action.
         2. <idx>. <tool_name>(<args>)
           - this case, the tool is instantiated with the idx, tool_name, args, and thought.
           - the thought is reset.
-          - the buffer is reset.
         """
-        if match := re.match(THOUGHT_PATTERN, self.buffer):
+        speculated_task, self.speculated_task = self.speculated_task, None
+        if match := THOUGHT_REGEX.match(line):
             # Optionally, action can be preceded by a thought
             self.thought = match.group(1)
-        elif match := re.match(ACTION_PATTERN, self.buffer):
-            # if action is parsed, return the task, and clear the buffer
+        elif match := ACTION_REGEX.match(line):
             idx, tool_name, args, _ = match.groups()
             idx = int(idx)
+            if (
+                speculated_task is not None
+                and speculated_task.idx == idx
+                and speculated_task.name == tool_name
+                and speculated_task.raw_args == args
+            ):
+                # the task was already emitted before the end of the line
+                self.thought = ""
+                return None
             task = instantiate_task(
                 tools=self.tools,
                 idx=idx,
@@ -124,23 +172,58 @@ class StreamingGraphParser:
 
         return None
 
-    def ingest_token(self, token: str) -> Optional[Task]:
-        # Append token to buffer
-        if "\n" in token:
-            prefix, suffix = token.split("\n", 1)
-            prefix = prefix.strip()
-            self.buffer += prefix + "\n"
-            matched_item = self._match_buffer_and_generate_task(suffix)
-            self.buffer = suffix
-            return matched_item
-        else:
-            self.buffer += token
+    def _end_line(self) -> Optional[Task]:
+        line = "".join(self._line).strip()
+        self._line = []
+        self.hinted_line = False
+        return self._match_line_and_generate_task(line)
 
+    def _speculate(self, piece: str) -> Optional[Task]:
+        """Look at the unfinished line for a tool name or a closed action.
+
+        The line is only joined when `piece` may have opened or closed the
+        argument list.
+        """
+        if self.speculated_task is not None:
+            return None
+        if not self.hinted_line and self.on_tool_hint and "(" in piece:
+            if match := PARTIAL_ACTION_REGEX.match("".join(self._line).lstrip()):
+                self.hinted_line = True
+                self.on_tool_hint(match.group(2))
+        if not self.speculative or ")" not in piece:
+            return None
+        if match := CLOSED_ACTION_REGEX.match("".join(self._line).strip()):
+            idx, tool_name, args = match.groups()
+            # join closes the plan, it is never emitted speculatively
+            if tool_name != "join" and _args_are_closed(args):
+                self.speculated_task = instantiate_task(
+                    tools=self.tools,
+                    idx=int(idx),
+                    tool_name=tool_name,
+                    args=args,
+                    thought=self.thought,
+                )
+                return self.speculated_task
         return None
 
-    def finalize(self):
-        self.buffer = self.buffer + "\n"
-        return self._match_buffer_and_generate_task("")
+    def ingest_token(self, token: str) -> list[Task]:
+        """Consume a token and return the tasks it completed, in plan order."""
+        tasks = []
+        *ended, rest = token.split("\n")
+        for piece in ended:
+            self._line.append(piece)
+            if task := self._end_line():
+                tasks.append(task)
+        if rest:
+            self._line.append(rest)
+            if task := self._speculate(rest):
+                tasks.append(task)
+        return tasks
+
+    def finalize(self) -> list[Task]:
+        """Parse the last line, which may not end with a newline."""
+        task = self._end_line()
+        return [task] if task else []
 
 
 class LLMCompilerCallback(AsyncCallbackHandler):
@@ -152,9 +235,35 @@ class LLMCompilerCallback(AsyncCallbackHandler):
         self,
         queue: asyncio.Queue[Optional[str]],
         tools: Sequence[Union[Tool, StructuredTool]],
+        speculative: bool = False,
     ):
         self._queue = queue
-        self._parser = StreamingGraphParser(tools=tools)
+        self._tools = tools
+        self._parser = StreamingGraphParser(
+            tools=tools, speculative=speculative, on_tool_hint=self._prewarm_tool
+        )
+        self._prewarmed: set[str] = set()
+        self._prewarm_tasks: set[asyncio.Task] = set()
+
+    def _prewarm_tool(self, tool_name: str) -> None:
+        """Let a tool open its connections while its call is still being planned."""
+        if tool_name in self._prewarmed:
+            return
+        self._prewarmed.add(tool_name)
+        tool = next((t for t in self._tools if t.name == tool_name), None)
+        prewarm = getattr(tool, "prewarm", None)
+        if prewarm is None:
+            return
+
+        async def run_prewarm():
+            try:
+                await prewarm()
+            except Exception as e:
+                log(f"Prewarming {tool_name} failed: {e}")
+
+        handle = asyncio.create_task(run_prewarm())
+        self._prewarm_tasks.add(handle)
+        handle.add_done_callback(self._prewarm_tasks.discard)
 
     async def on_llm_start(self, serialized, prompts, **kwargs: Any) -> Any:
         """Run when LLM starts running."""
@@ -167,10 +276,9 @@ class LLMCompilerCallback(AsyncCallbackHandler):
         parent_run_id: Optional[UUID] = None,
         **kwargs: Any,
     ) -> None:
-        parsed_data = self._parser.ingest_token(token)
-        if parsed_data:
-            await self._queue.put(parsed_data)
-            if parsed_data.is_join:
+        for task in self._parser.ingest_token(token):
+            await self._queue.put(task)
+            if task.is_join:
                 await self._queue.put(None)
 
     async def on_llm_end(
@@ -181,9 +289,8 @@ class LLMCompilerCallback(AsyncCallbackHandler):
         parent_run_id: Optional[UUID] = None,
         **kwargs: Any,
     ) -> None:
-        parsed_data = self._parser.finalize()
-        if parsed_data:
-            await self._queue.put(parsed_data)
+        for task in self._parser.finalize():
+            await self._queue.put(task)
         await self._queue.put(None)
 
 
@@ -195,42 +302,79 @@ class Planner:
         example_prompt_replan: str,
         tools: Sequence[Union[Tool, StructuredTool]],
         stop: Optional[list[str]],
+        plan_cache: Optional[PlanCache] = None,
+        tool_filter: Optional[Callable[[str], bool]] = None,
     ):
         self.llm = llm
+        self.example_prompt = example_prompt
+        self.example_prompt_replan = example_prompt_replan
+        self.tools = tools
+        # tools whose dependencies are down are left out of the prompts
+        self.tool_filter = tool_filter
         # different system prompt is needed when replanning
         # since they have different guidelines, and also examples provided by the user
-        self.system_prompt = generate_llm_compiler_prompt(
-            tools=tools,
-            example_prompt=example_prompt,
-            is_replan=False,
-        )
-        self.system_prompt_replan = generate_llm_compiler_prompt(
-            tools=tools,
-            example_prompt=example_prompt_replan,
-            is_replan=True,
-        )
-        self.tools = tools
+        # the system prompts are static for a set of tools, they are built and
+        # their token counts computed once per set
+        self._system_prompts: Dict[
+            Tuple[str, ...], Tuple[PromptPrefix, PromptPrefix]
+        ] = {}
+        self.system_prompt, self.system_prompt_replan = self.get_system_prompts(tools)
         self.output_parser = LLMCompilerPlanParser(tools=tools)
         self.stop = stop
+        # only the first plan of a question is cached, replans depend on
+        # the observations of the previous plans
+        self.plan_cache = plan_cache
+
+    def available_tools(self) -> Sequence[Union[Tool, StructuredTool]]:
+        """Tools the next plan can use."""
+        if self.tool_filter is None:
+            return self.tools
+        return [tool for tool in self.tools if self.tool_filter(tool.name)]
+
+    def get_system_prompts(
+        self, tools: Sequence[Union[Tool, StructuredTool]]
+    ) -> Tuple[PromptPrefix, PromptPrefix]:
+        """System prompts for planning and replanning with `tools`."""
+        key = tuple(tool.name for tool in tools)
+        if key not in self._system_prompts:
+            self._system_prompts[key] = tuple(
+                prompt_prefixes.register(
+                    generate_llm_compiler_prompt(
+                        tools=tools,
+                        example_prompt=example_prompt,
+                        is_replan=is_replan,
+                    )
+                )
+                for example_prompt, is_replan in (
+                    (self.example_prompt, False),
+                    (self.example_prompt_replan, True),
+                )
+            )
+        return self._system_prompts[key]
 
     async def run_llm(
         self,
         inputs: dict[str, Any],
         is_replan: bool = False,
         callbacks: Callbacks = None,
+        tools: Optional[Sequence[Union[Tool, StructuredTool]]] = None,
     ) -> str:
-        """Run the LLM."""
+        """Run the LLM, with the system prompts of `tools`, defaults to all of them."""
+        system_prompt, system_prompt_replan = (
+            self.get_system_prompts(tools)
+            if tools is not None
+            else (self.system_prompt, self.system_prompt_replan)
+        )
         if is_replan:
-            system_prompt = self.system_prompt_replan
+            system_prompt = system_prompt_replan
             assert "context" in inputs, "If replanning, context must be provided"
             human_prompt = f"Question: {inputs['input']}\n{inputs['context']}\n"
         else:
-            system_prompt = self.system_prompt
             human_prompt = f"Question: {inputs['input']}"
 
         if isinstance(self.llm, BaseChatModel):
             messages = [
-                SystemMessage(content=system_prompt),
+                SystemMessage(content=system_prompt.text),
                 HumanMessage(content=human_prompt),
             ]
             llm_response = await self.llm._call_async(
@@ -240,7 +384,7 @@ class Planner:
             )
             response = llm_response.content
         elif isinstance(self.llm, BaseLLM):
-            message = system_prompt + "\n\n" + human_prompt
+            message = system_prompt.text + "\n\n" + human_prompt
             response = await self.llm.apredict(
                 message,
                 callbacks=callbacks,
@@ -253,14 +397,40 @@ class Planner:
 
         return response
 
+    async def _lookup_plan(
+        self, inputs: dict, is_replan: bool, tools: Sequence[Union[Tool, StructuredTool]]
+    ) -> Optional[Dict[int, Task]]:
+        if self.plan_cache is None or is_replan:
+            return None
+        tasks = await self.plan_cache.lookup(inputs["input"], tools)
+        if tasks is not None:
+            log("LLMCompiler planner: replaying cached plan")
+        return tasks
+
+    async def _store_plan(
+        self,
+        inputs: dict,
+        is_replan: bool,
+        tools: Sequence[Union[Tool, StructuredTool]],
+        tasks: Dict[int, Task],
+    ) -> None:
+        if self.plan_cache is None or is_replan:
+            return
+        await self.plan_cache.store(inputs["input"], tools, tasks)
+
     async def plan(
         self, inputs: dict, is_replan: bool, callbacks: Callbacks = None, **kwargs: Any
     ):
+        tools = self.available_tools()
+        if (tasks := await self._lookup_plan(inputs, is_replan, tools)) is not None:
+            return tasks
         llm_response = await self.run_llm(
-            inputs=inputs, is_replan=is_replan, callbacks=callbacks
+            inputs=inputs, is_replan=is_replan, callbacks=callbacks, tools=tools
         )
         llm_response = llm_response + "\n"
-        return self.output_parser.parse(llm_response)
+        tasks = LLMCompilerPlanParser(tools=tools).parse(llm_response)
+        await self._store_plan(inputs, is_replan, tools, tasks)
+        return tasks
 
     async def aplan(
         self,
@@ -268,15 +438,40 @@ class Planner:
         task_queue: asyncio.Queue[Optional[str]],
         is_replan: bool,
         callbacks: Callbacks = None,
+        speculative: bool = False,
         **kwargs: Any,
     ) -> Plan:
-        """Given input, asynchronously decide what to do."""
+        """Given input, asynchronously decide what to do.
+
+        With `speculative`, actions are put in the queue as soon as their
+        arguments are complete, and may later be replaced by a corrected task
+        with the same idx.
+
+        A cached plan is replayed straight into the queue, without calling the LLM.
+        """
+        tools = self.available_tools()
+        if (tasks := await self._lookup_plan(inputs, is_replan, tools)) is not None:
+            for task in tasks.values():
+                await task_queue.put(task)
+            await task_queue.put(None)
+            return
         all_callbacks = [
             LLMCompilerCallback(
                 queue=task_queue,
-                tools=self.tools,
+                tools=tools,
+                speculative=speculative,
             )
         ]
         if callbacks:
             all_callbacks.extend(callbacks)
-        await self.run_llm(inputs=inputs, is_replan=is_replan, callbacks=all_callbacks)
+        llm_response = await self.run_llm(
+            inputs=inputs, is_replan=is_replan, callbacks=all_callbacks, tools=tools
+        )
+        if self.plan_cache is not None and not is_replan:
+            # the streamed tasks are owned by the scheduler, store a parsed copy
+            await self._store_plan(
+                inputs,
+                is_replan,
+                tools,
+                LLMCompilerPlanParser(tools=tools).parse(llm_response + "\n"),
+            )
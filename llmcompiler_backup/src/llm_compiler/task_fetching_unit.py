@@ -1,14 +1,26 @@
 from __future__ import annotations
 
 import asyncio
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Union
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
 from uuid import UUID
 
+from llmcompiler.src.executors.tool_cache import ToolResultCache, tool_cache
+from llmcompiler.src.executors.tool_executor import ToolExecutor, tool_executor
+from llmcompiler.src.llm_compiler.constants import TASK_TIMEOUT
 from llmcompiler.src.utils.logger_utils import log
 
-SCHEDULING_INTERVAL = 0.01  # seconds
-
 
 def _default_stringify_rule_for_arguments(args):
     if len(args) == 1:
@@ -50,6 +62,8 @@ class Task:
     thought: Optional[str] = None
     observation: Optional[str] = None
     is_join: bool = False
+    # arguments as written by the planner, before parsing
+    raw_args: Optional[str] = None
 
     async def __call__(self) -> Any:
         log("running task")
@@ -81,31 +95,179 @@ class Task:
 
 
 class TaskFetchingUnit:
-    tasks: Dict[str, Task]
-    tasks_done: Dict[str, asyncio.Event]
-    remaining_tasks: set[str]
+    """Runs a plan's tasks as soon as their dependencies are met.
+
+    Scheduling is event driven: every waiting task keeps the number of its
+    unfinished dependencies (its in-degree) and every task keeps the list of
+    tasks waiting on it. Finishing a task decrements the in-degree of its
+    dependents and starts those that reach zero, so there is no polling.
+
+    Tasks on the critical path go first: the priority of a task is the
+    estimated duration of the longest path from it to the end of the plan,
+    based on the latency history of the tools.
+
+    Tasks outliving the timeout of their tool, or the deadline of the plan,
+    get `TASK_TIMEOUT` as observation so that the joiner can work with the
+    results that are available.
 
-    def __init__(self):
+    In speculative mode, a task registered again with the same idx replaces
+    the previous one, which is cancelled if it is still running.
+    """
+
+    tasks: Dict[int, Task]
+    tasks_done: Dict[int, asyncio.Event]
+    remaining_tasks: set[int]
+
+    def __init__(
+        self,
+        session: Hashable = None,
+        executor: Optional[ToolExecutor] = None,
+        cache: Optional[ToolResultCache] = None,
+        speculative: bool = False,
+        on_task_start: Optional[Callable[[Task], None]] = None,
+        on_task_done: Optional[Callable[[Task], None]] = None,
+    ):
+        """
+        Args:
+            session: Identifier of the request the tasks belong to. Tool slots
+                are shared fairly between sessions.
+            executor: Executor enforcing the tool limits, defaults to the
+                process-wide one.
+            cache: Cache of the tool results, defaults to the process-wide one.
+            speculative: Whether tasks may be replaced by a corrected version,
+                see `planner.StreamingGraphParser`.
+            on_task_start: Called with each task, join excluded, once its
+                arguments are resolved and right before it runs.
+            on_task_done: Called with each task, join excluded, once its
+                observation is set.
+        """
+        self.session = session if session is not None else id(self)
+        self.executor = executor or tool_executor
+        self.cache = cache or tool_cache
+        self.speculative = speculative
+        self.on_task_start = on_task_start
+        self.on_task_done = on_task_done
         self.tasks = {}
         self.tasks_done = {}
+        # whether the deadline of the plan passed
+        self.timed_out = False
+        # tasks that have been registered but not started yet
         self.remaining_tasks = set()
+        self._in_degree: Dict[int, int] = {}
+        self._dependents: Dict[int, List[int]] = defaultdict(list)
+        self._ready: List[int] = []
+        self._priority: Dict[int, float] = {}
+        self._num_pending = 0
+        self._no_more_tasks = False
+        self._all_done = asyncio.Event()
+        self._running: set[asyncio.Task] = set()
+        self._handles: Dict[int, asyncio.Task] = {}
+        # once closed, no more tasks are started
+        self._closed = False
+
+    def set_tasks(self, tasks: dict[int, Any]):
+        """Register tasks and their dependency edges.
 
-    def set_tasks(self, tasks: dict[str, Any]):
-        self.tasks.update(tasks)
-        self.tasks_done.update({task_idx: asyncio.Event() for task_idx in tasks})
-        self.remaining_tasks.update(set(tasks.keys()))
+        Tasks whose dependencies are already met are queued for execution and
+        started by the next call to `schedule`/`aschedule`.
+        """
+        for task_idx in sorted(tasks):
+            task = tasks[task_idx]
+            if task_idx in self.tasks:
+                if not self.speculative:
+                    log(f"Ignoring task {task_idx}, a task with this idx exists")
+                    continue
+                self._discard_task(task_idx)
+            self.tasks[task_idx] = task
+            self.tasks_done[task_idx] = asyncio.Event()
+            self.remaining_tasks.add(task_idx)
+            self._num_pending += 1
+
+            in_degree = 0
+            for dep in set(task.dependencies):
+                # unknown dependencies can never be satisfied, don't wait on them
+                if dep in self.tasks_done and not self.tasks_done[dep].is_set():
+                    self._dependents[dep].append(task_idx)
+                    in_degree += 1
+            self._in_degree[task_idx] = in_degree
+            if in_degree == 0:
+                self._ready.append(task_idx)
+            self._update_priorities(task)
+
+    def _discard_task(self, task_idx: int):
+        """Forget a registered task, cancelling it if it is running."""
+        log(f"Replacing speculative task {task_idx}")
+        task = self.tasks.pop(task_idx)
+        handle = self._handles.pop(task_idx, None)
+        if handle is not None:
+            handle.cancel()
+        if not self.tasks_done.pop(task_idx).is_set():
+            self._num_pending -= 1
+        self.remaining_tasks.discard(task_idx)
+        if task_idx in self._ready:
+            self._ready.remove(task_idx)
+        for dep in set(task.dependencies):
+            if task_idx in self._dependents.get(dep, ()):
+                self._dependents[dep].remove(task_idx)
+
+    def _estimated_latency(self, task: Task) -> float:
+        if task.is_join:
+            return 0.0
+        return self.executor.estimated_latency(task.name)
+
+    def _update_priorities(self, task: Task):
+        """Propagate the longest remaining path of a new task to its ancestors.
+
+        Tasks arrive in plan order, so a task's dependents are registered after
+        it and each new task can only lengthen the paths of its ancestors.
+        """
+        self._priority[task.idx] = self._estimated_latency(task)
+        stack = [task.idx]
+        while stack:
+            task_idx = stack.pop()
+            for dep in set(self.tasks[task_idx].dependencies):
+                if dep not in self.tasks:
+                    continue
+                dep_latency = self._estimated_latency(self.tasks[dep])
+                path = dep_latency + self._priority[task_idx]
+                if path > self._priority.get(dep, 0.0):
+                    self._priority[dep] = path
+                    stack.append(dep)
 
     def _all_tasks_done(self):
-        return all(self.tasks_done[d].is_set() for d in self.tasks_done)
+        return self._num_pending == 0
+
+    def _dispatch_ready(self):
+        """Start every task whose dependencies are all met, critical path first."""
+        ready, self._ready = self._ready, []
+        if self._closed:
+            return
+        ready.sort(key=lambda task_idx: self._priority[task_idx], reverse=True)
+        for task_idx in ready:
+            self.remaining_tasks.discard(task_idx)
+            handle = asyncio.create_task(self._run_task(self.tasks[task_idx]))
+            # keep a reference so that the task is not garbage collected
+            self._running.add(handle)
+            handle.add_done_callback(self._running.discard)
+            self._handles[task_idx] = handle
 
-    def _get_all_executable_tasks(self):
-        return [
-            task_name
-            for task_name in self.remaining_tasks
-            if all(
-                self.tasks_done[d].is_set() for d in self.tasks[task_name].dependencies
-            )
-        ]
+    def _mark_done(self, task: Task):
+        """Set the task as done and release the tasks waiting on it."""
+        if self.tasks.get(task.idx) is not task:
+            # a replaced speculative task
+            return
+        self._handles.pop(task.idx, None)
+        self.tasks_done[task.idx].set()
+        if self.on_task_done and not task.is_join:
+            self.on_task_done(task)
+        self._num_pending -= 1
+        for dependent in self._dependents.pop(task.idx, ()):
+            self._in_degree[dependent] -= 1
+            if self._in_degree[dependent] == 0:
+                self._ready.append(dependent)
+        self._dispatch_ready()
+        if self._no_more_tasks and self._all_tasks_done():
+            self._all_done.set()
 
     def _preprocess_args(self, task: Task):
         """Replace dependency placeholders, i.e. ${1}, in task.args with the actual observation."""
@@ -116,51 +278,99 @@ class TaskFetchingUnit:
         task.args = args
 
     async def _run_task(self, task: Task):
-        self._preprocess_args(task)
-        if not task.is_join:
-            observation = await task()
-            task.observation = observation
-        self.tasks_done[task.idx].set()
+        try:
+            self._preprocess_args(task)
+            if not task.is_join:
+                if self.on_task_start:
+                    self.on_task_start(task)
+                observation = await self.cache.get_or_call(
+                    task.name,
+                    task.args,
+                    lambda: self.executor.run(
+                        task.name,
+                        task,
+                        session=self.session,
+                        priority=self._priority[task.idx],
+                    ),
+                )
+                task.observation = observation
+        except asyncio.TimeoutError:
+            log(f"task {task.idx} ({task.name}) timed out")
+            task.observation = TASK_TIMEOUT
+        except Exception as e:
+            log(f"task {task.idx} ({task.name}) failed: {e}")
+        finally:
+            # dependents must be released even if the task failed,
+            # otherwise the whole plan would wait forever
+            self._mark_done(task)
 
-    async def schedule(self):
-        """Run all tasks in self.tasks in parallel, respecting dependencies."""
-        # run until all tasks are done
-        while not self._all_tasks_done():
-            # Find tasks with no dependencies or with all dependencies met
-            executable_tasks = self._get_all_executable_tasks()
-
-            for task_name in executable_tasks:
-                asyncio.create_task(self._run_task(self.tasks[task_name]))
-                self.remaining_tasks.remove(task_name)
-
-            await asyncio.sleep(SCHEDULING_INTERVAL)
-
-    async def aschedule(self, task_queue: asyncio.Queue[Optional[Task]], func):
-        """Asynchronously listen to task_queue and schedule tasks as they arrive."""
-        no_more_tasks = False  # Flag to check if all tasks are received
-
-        while True:
-            if not no_more_tasks:
-                # Wait for a new task to be added to the queue
-                task = await task_queue.get()
-
-                # Check for sentinel value indicating end of tasks
-                if task is None:
-                    no_more_tasks = True
-                else:
-                    # Parse and set the new tasks
-                    self.set_tasks({task.idx: task})
+    async def _wait_until_done(self):
+        self._no_more_tasks = True
+        if self._all_tasks_done():
+            self._all_done.set()
+        await self._all_done.wait()
 
-            # Schedule and run executable tasks
-            executable_tasks = self._get_all_executable_tasks()
+    async def cancel(self):
+        """Cancel the running tasks and never start the remaining ones."""
+        self._closed = True
+        running = list(self._running)
+        for handle in running:
+            handle.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
 
-            if executable_tasks:
-                for task_name in executable_tasks:
-                    asyncio.create_task(self._run_task(self.tasks[task_name]))
-                    self.remaining_tasks.remove(task_name)
-            elif no_more_tasks and self._all_tasks_done():
-                # Exit the loop if no more tasks are expected and all tasks are done
-                break
-            else:
-                # If no executable tasks are found, sleep for the SCHEDULING_INTERVAL
-                await asyncio.sleep(SCHEDULING_INTERVAL)
+    async def _expire(self):
+        """Stop the plan and mark the unfinished tasks as timed out."""
+        log("plan deadline passed, joining with the available observations")
+        self.timed_out = True
+        await self.cancel()
+        for task in self.tasks.values():
+            if not task.is_join and task.observation is None:
+                task.observation = TASK_TIMEOUT
+
+    async def schedule(self, timeout: Optional[float] = None):
+        """Run all tasks in self.tasks in parallel, respecting dependencies.
+
+        Args:
+            timeout: Deadline of the whole plan in seconds.
+        """
+        try:
+            async with asyncio.timeout(timeout):
+                self._dispatch_ready()
+                await self._wait_until_done()
+        except TimeoutError:
+            await self._expire()
+        except asyncio.CancelledError:
+            await self.cancel()
+            raise
+
+    async def aschedule(
+        self,
+        task_queue: asyncio.Queue[Optional[Task]],
+        func,
+        timeout: Optional[float] = None,
+    ):
+        """Asynchronously listen to task_queue and schedule tasks as they arrive.
+
+        Args:
+            timeout: Deadline of the whole plan in seconds, including the time
+                spent waiting for the planner.
+        """
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    # Wait for a new task to be added to the queue
+                    task = await task_queue.get()
+
+                    # Check for sentinel value indicating end of tasks
+                    if task is None:
+                        break
+
+                    self.set_tasks({task.idx: task})
+                    self._dispatch_ready()
+
+                await self._wait_until_done()
+        except TimeoutError:
+            await self._expire()
+        except asyncio.CancelledError:
+            await self.cancel()
+            raise
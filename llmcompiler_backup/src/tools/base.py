@@ -101,6 +101,22 @@ class Tool(BaseTool):
     coroutine: Optional[Callable[..., Awaitable[str]]] = None
     """The asynchronous version of the function."""
     stringify_rule: Optional[Callable[..., str]] = None
+    max_concurrency: Optional[int] = None
+    """Maximum number of calls of this tool running at once in the process."""
+    rate_limit: Optional[float] = None
+    """Maximum number of calls of this tool started per second in the process."""
+    cacheable: bool = True
+    """Whether identical calls of this tool may share their result."""
+    cache_ttl: Optional[float] = None
+    """Seconds a cached result stays valid, defaults to the cache's TTL."""
+    cache_result: Optional[Callable[[Any], bool]] = None
+    """Whether a result may be cached, e.g. False for an error returned as a result."""
+    timeout: Optional[float] = None
+    """Seconds after which a call of this tool is abandoned."""
+    prewarm: Optional[Callable[[], Awaitable[None]]] = None
+    """Opens the connections of the tool while a call to it is being planned."""
+    health_check: Optional[Callable[[], Awaitable[bool]]] = None
+    """Whether the dependencies of the tool are up, probed in the background."""
 
     # --- Runnable ---
 
@@ -233,6 +249,22 @@ class StructuredTool(BaseTool):
     coroutine: Optional[Callable[..., Awaitable[Any]]] = None
     """The asynchronous version of the function."""
     stringify_rule: Optional[Callable[..., str]] = None
+    max_concurrency: Optional[int] = None
+    """Maximum number of calls of this tool running at once in the process."""
+    rate_limit: Optional[float] = None
+    """Maximum number of calls of this tool started per second in the process."""
+    cacheable: bool = True
+    """Whether identical calls of this tool may share their result."""
+    cache_ttl: Optional[float] = None
+    """Seconds a cached result stays valid, defaults to the cache's TTL."""
+    cache_result: Optional[Callable[[Any], bool]] = None
+    """Whether a result may be cached, e.g. False for an error returned as a result."""
+    timeout: Optional[float] = None
+    """Seconds after which a call of this tool is abandoned."""
+    prewarm: Optional[Callable[[], Awaitable[None]]] = None
+    """Opens the connections of the tool while a call to it is being planned."""
+    health_check: Optional[Callable[[], Awaitable[bool]]] = None
+    """Whether the dependencies of the tool are up, probed in the background."""
 
     # --- Runnable ---
 
@@ -0,0 +1,139 @@
+"""Query normalisation and the LRU cache shared by the plan and retrieval caches."""
+
+from __future__ import annotations
+
+import inspect
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+EmbedFn = Callable[[str], Union[Sequence[float], Awaitable[Sequence[float]]]]
+# the last element of a key is the normalised query
+QueryKey = Tuple[Any, ...]
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase `query`, strip its accents and punctuation.
+
+    e.g. "Quelle est la température aujourd'hui ?" -> "quelle est la temperature aujourd hui"
+    """
+    query = unicodedata.normalize("NFKD", query.lower())
+    query = "".join(c for c in query if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", query).split())
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    embedding: Optional[np.ndarray] = None
+
+
+class QueryCache:
+    """LRU cache with a TTL, keyed on tuples ending with a normalised query.
+
+    When `embed_fn` is given, a key missing from the cache may also be served
+    the entry of a cached key whose query embedding is similar enough, and
+    whose other elements are the same.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        embed_fn: Optional[EmbedFn] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ) -> None:
+        """
+        Args:
+            ttl: Lifetime of an entry in seconds.
+            max_entries: Number of entries kept before evicting the least recently used.
+            embed_fn: Optional function, or coroutine function, embedding a
+                normalised query, used for similarity lookups.
+            similarity_threshold: Minimum cosine similarity for a similar
+                query to be served a cached entry.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[QueryKey, CacheEntry] = OrderedDict()
+        self.reset_stats()
+
+    async def _embed(self, query: str) -> Optional[np.ndarray]:
+        if self.embed_fn is None:
+            return None
+        embedding = self.embed_fn(query)
+        if inspect.isawaitable(embedding):
+            embedding = await embedding
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _find_similar(self, key: QueryKey, embedding: np.ndarray) -> Optional[QueryKey]:
+        best_key, best_score = None, self.similarity_threshold
+        for other_key, entry in self._entries.items():
+            if other_key[:-1] != key[:-1] or entry.embedding is None:
+                continue
+            score = float(np.dot(entry.embedding, embedding))
+            if score >= best_score:
+                best_key, best_score = other_key, score
+        return best_key
+
+    def _get(self, key: QueryKey) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _lookup(self, key: QueryKey) -> Tuple[Optional[QueryKey], Optional[CacheEntry]]:
+        """The entry of `key`, or of a similar key, and the key it was found under."""
+        entry = self._get(key)
+        if entry is None and self.embed_fn is not None and self._entries:
+            similar_key = self._find_similar(key, await self._embed(key[-1]))
+            if similar_key is not None:
+                entry = self._get(similar_key)
+                if entry is not None:
+                    self.similar_hits += 1
+                    key = similar_key
+        if entry is None:
+            self.misses += 1
+            return None, None
+        self.hits += 1
+        return key, entry
+
+    async def _put(self, key: QueryKey, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[key] = CacheEntry(
+            value=value,
+            expires_at=time.monotonic() + self.ttl,
+            embedding=await self._embed(key[-1]),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
@@ -0,0 +1,102 @@
+"""Static prompt prefixes, encoded once."""
+
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from functools import cached_property, lru_cache
+from typing import Optional
+
+import tiktoken
+
+# same for gpt-3.5
+DEFAULT_ENCODING_MODEL = "gpt-4"
+# as many as the plans of the plan cache, a set of tools has two system prompts
+DEFAULT_MAX_PREFIXES = 1024
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str = DEFAULT_ENCODING_MODEL) -> tiktoken.Encoding:
+    """Shared tiktoken encoder, loaded on first use."""
+    return tiktoken.encoding_for_model(model_name)
+
+
+def count_tokens(text: str, model_name: str = DEFAULT_ENCODING_MODEL) -> int:
+    return len(get_encoder(model_name).encode(text))
+
+
+class PromptPrefix:
+    """Static beginning of a prompt, e.g. a system prompt with its examples.
+
+    Its token count is computed once, on first use. Prompts should start with
+    their static prefix, so that the providers' prompt caching hits as well.
+    """
+
+    def __init__(self, text: str, model_name: str = DEFAULT_ENCODING_MODEL) -> None:
+        self.text = text
+        self.model_name = model_name
+
+    @cached_property
+    def num_tokens(self) -> int:
+        return count_tokens(self.text, self.model_name)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class PromptPrefixRegistry:
+    """Known prompt prefixes, to only tokenise the dynamic part of the prompts.
+
+    The least recently used prefixes are forgotten beyond `max_entries`, e.g.
+    the system prompts of sets of tools no longer available.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_PREFIXES) -> None:
+        self.max_entries = max_entries
+        self._prefixes: OrderedDict[str, PromptPrefix] = OrderedDict()
+        # lengths of the registered prefixes, and how many have each
+        self._lengths: Counter[int] = Counter()
+
+    def register(self, text: str) -> PromptPrefix:
+        """Return the prefix for `text`, registering it if needed."""
+        prefix = self._prefixes.get(text)
+        if prefix is None:
+            prefix = self._prefixes[text] = PromptPrefix(text)
+            self._lengths[len(text)] += 1
+            while len(self._prefixes) > self.max_entries:
+                evicted, _ = self._prefixes.popitem(last=False)
+                self._lengths[len(evicted)] -= 1
+                if not self._lengths[len(evicted)]:
+                    del self._lengths[len(evicted)]
+        self._prefixes.move_to_end(text)
+        return prefix
+
+    def match(self, prompt: str) -> Optional[PromptPrefix]:
+        """Longest registered prefix `prompt` starts with."""
+        # the system prompts are sent as registered, the other prompts start
+        # with a prefix of one of the registered lengths
+        prefix = self._prefixes.get(prompt)
+        if prefix is None:
+            for length in sorted(self._lengths, reverse=True):
+                if length < len(prompt):
+                    prefix = self._prefixes.get(prompt[:length])
+                    if prefix is not None:
+                        break
+        if prefix is not None:
+            self._prefixes.move_to_end(prefix.text)
+        return prefix
+
+    def count_tokens(self, prompt: str) -> int:
+        """Number of tokens of `prompt`, tokenising only what follows its prefix.
+
+        Tokens merging across the end of the prefix are counted separately,
+        which may be off by one, but is precise enough for stats.
+        """
+        prefix = self.match(prompt)
+        if prefix is None:
+            return count_tokens(prompt)
+        suffix = prompt[len(prefix.text) :]
+        return prefix.num_tokens + (count_tokens(suffix) if suffix else 0)
+
+
+# Export a singleton instance
+prompt_prefixes = PromptPrefixRegistry()
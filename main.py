@@ -3,9 +3,9 @@ import os
 import sys
 import json
 from contextlib import asynccontextmanager
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import logging
@@ -17,12 +17,12 @@ import traceback
 from loguru import logger
 from pydantic import BaseModel
 
-from llmcompiler.src.llm_compiler.llm_compiler import LLMCompiler
-from llmcompiler.src.llm_compiler.constants import END_OF_PLAN
-from llmcompiler.src.callbacks.callbacks import AsyncStatsCallbackHandler
-from llmcompiler.configs.ittpc.configs import CONFIGS as ITTPC_CONFIGS
-from llmcompiler.src.utils.model_utils import get_model
+# LLMCompiler, langchain and the tools are imported by create_chain, once the
+# server accepts connections
 from llmcompiler.src.utils.logger_utils import log, enable_logging
+from tools.health import health_registry
+from tools.http_client import close_http_session
+from db.ingest import MeasurementIngestor
 
 # Enable logging
 enable_logging(True)
@@ -36,30 +36,46 @@ class ChatRequest(BaseModel):
     message: str
 
 
+class Reading(BaseModel):
+    sensor: str = "office"
+    timestamp: str  # ISO 8601
+    temperature: float
+    humidity: float
+
+
+class IngestRequest(BaseModel):
+    readings: List[Reading]
+
+
 class ChatMessage(BaseModel):
     type: str  # 'thought', 'response', 'error'
     text: str
     icon: Optional[str] = None
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan context manager for FastAPI application.
+def create_chain():
+    """Build the LLMCompiler chain and its tools.
+    
+    Blocking: it imports langchain and tiktoken, and builds the LLM clients.
     
-    Handles startup and shutdown events.
+    Returns:
+        The chain and its tools
     """
-    # Startup
-    log("🚀 Starting application...")
+    from llmcompiler.src.llm_compiler.llm_compiler import LLMCompiler
+    from llmcompiler.src.llm_compiler.constants import END_OF_PLAN
+    from llmcompiler.src.llm_compiler.plan_cache import PlanCache
+    from llmcompiler.configs.ittpc.configs import CONFIGS as ITTPC_CONFIGS
+    from llmcompiler.src.utils.model_utils import get_model
     
     # Initialize LLMs using their utils
     log("🔧 Initializing LLMs...")
     
-    # Agent LLM - no streaming
+    # Agent LLM - with streaming, the answer is sent token by token
     agent_llm = get_model(
         model_type="openai",
         model_name="gpt-4",
         vllm_port=None,
-        stream=False,
+        stream=True,
         temperature=0
     )
     
@@ -74,8 +90,9 @@ async def lifespan(app: FastAPI):
 
     # Initialize LLM Compiler
     log("🔧 Initializing LLM Compiler...")
+    tools = ITTPC_CONFIGS["tools"]()
     chain = LLMCompiler(
-        tools=ITTPC_CONFIGS["tools"](),
+        tools=tools,
         planner_llm=planner_llm,
         planner_example_prompt=ITTPC_CONFIGS["prompts"]["gpt"]["planner_prompt"],
         planner_example_prompt_replan=None,
@@ -86,15 +103,72 @@ async def lifespan(app: FastAPI):
         joinner_prompt_final=None,
         max_replans=2,
         benchmark=True,
+        plan_timeout=60,
+        # most questions are repeats, replay their plan without calling the planner
+        plan_cache=PlanCache(ttl=600),
+        tool_filter=health_registry.is_healthy,
     )
+    return chain, tools
+
+
+async def start_chain(app: FastAPI):
+    """Build the chain in a thread, then start the clients of its tools.
     
-    app.state.chain = chain
+    Args:
+        app: The application, holding the background tasks
+    
+    Returns:
+        The chain
+    """
+    chain, tools = await asyncio.to_thread(create_chain)
+    # the dependencies of the tools are probed in the background,
+    # the tools that are down are left out of the plans
+    health_registry.register_tools(tools)
+    await health_registry.start()
+    # already imported by create_chain
+    from llmcompiler.configs.ittpc.tools import start_r2r
+    app.state.r2r = asyncio.create_task(start_r2r())
+    log("✅ LLM Compiler initialized")
+    return chain
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifespan context manager for FastAPI application.
+    
+    Handles startup and shutdown events. The chain is built in the
+    background, the server accepts connections meanwhile and the chat waits
+    for it.
+    """
+    # imported once the server starts, like the other tools
+    from tools.temperature_backends import DEFAULT_DB_PATH, get_temperature_backend
+
+    # Startup
+    log("🚀 Starting application...")
+    app.state.r2r = None
+    app.state.chain = asyncio.create_task(start_chain(app))
+    
+    # Sensor readings are buffered and written in batches. Starting the
+    # ingestor migrates the database, before the tools read it
+    app.state.ingestor = MeasurementIngestor(os.getenv("TEMPERATURE_DB_PATH", DEFAULT_DB_PATH))
+    await app.state.ingestor.start()
     log("✅ Application components initialized")
     
     yield
     
     # Shutdown
     log("👋 Shutting down application...")
+    background = [task for task in (app.state.chain, app.state.r2r) if task]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    if app.state.r2r is not None:
+        from llmcompiler.configs.ittpc.tools import close_r2r
+        close_r2r()
+    await health_registry.stop()
+    await app.state.ingestor.close()
+    await get_temperature_backend().close()
+    await close_http_session()
 
 
 def create_app() -> FastAPI:
@@ -114,6 +188,28 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        """Whether the chat is ready, and the health of the tools."""
+        chain = app.state.chain
+        ready = chain.done() and not chain.cancelled() and chain.exception() is None
+        return {"ready": ready, "tools": health_registry.get_stats()}
+    
+    @app.post("/ingest/measurements", status_code=202)
+    async def ingest_measurements(request: IngestRequest) -> Dict[str, Any]:
+        """Accept sensor readings, e.g. from a Node-RED http request node.
+        
+        The readings are written within a second, duplicates of a sensor
+        and timestamp are ignored.
+        """
+        try:
+            accepted = await app.state.ingestor.add(
+                reading.model_dump() for reading in request.readings
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return {"accepted": accepted}
+    
     @app.websocket("/ws/chat")
     async def websocket_chat(websocket: WebSocket):
         """WebSocket endpoint for chat.
@@ -124,28 +220,67 @@ def create_app() -> FastAPI:
         await websocket.accept()
         log("✅ WebSocket connection accepted")
         
+        # Read the client messages in the background, so that a disconnection
+        # is noticed while a question is being processed
+        messages: asyncio.Queue[Optional[str]] = asyncio.Queue()
+        
+        async def receive_messages():
+            try:
+                while True:
+                    messages.put_nowait(await websocket.receive_text())
+            except WebSocketDisconnect:
+                pass
+            finally:
+                # None tells the chat loop that the client is gone
+                messages.put_nowait(None)
+        
+        receiver = asyncio.create_task(receive_messages())
+        
         try:
             while True:
                 # Receive message from client
-                message = await websocket.receive_text()
+                message = await messages.get()
+                if message is None:
+                    log("🔌 Client disconnected")
+                    break
                 log("📩 Received message:", message)
                 
                 try:
                     # Process message with LLMCompiler
                     log("🤖 Processing with LLMCompiler (streaming mode)...")
                     
-                    # Initialize callback handler with streaming
-                    stats_handler = AsyncStatsCallbackHandler(stream=True)
-                    
                     start_time = time.time()
                     try:
                         log("Question:", block=True)
                         log(message, block=True)
                         
-                        response = await app.state.chain.arun(
-                            message,
-                            callbacks=[stats_handler]
+                        # built in the background, at startup
+                        chain = await asyncio.shield(app.state.chain)
+                        
+                        async def send_frames() -> Dict[str, Any]:
+                            """Send the actions, observations and answer tokens as they come."""
+                            last_frame = {}
+                            async for frame in chain.astream(message):
+                                if frame.get("done"):
+                                    last_frame = frame
+                                else:
+                                    await websocket.send_json(frame)
+                            return last_frame
+                        
+                        run = asyncio.create_task(send_frames())
+                        await asyncio.wait(
+                            {run, receiver},
+                            return_when=asyncio.FIRST_COMPLETED
                         )
+                        if not run.done():
+                            # The client left: cancel everything still running
+                            # for this question, planner and tools included
+                            log("🔌 Client disconnected, cancelling the request")
+                            run.cancel()
+                            await asyncio.gather(run, return_exceptions=True)
+                            break
+                        last_frame = run.result()
+                        response = last_frame["text"]
                         
                         # Calculate processing time
                         processing_time = f"{time.time() - start_time:.2f}"
@@ -156,25 +291,19 @@ def create_app() -> FastAPI:
                         log("Break out of replan loop.")
                         log("> Finished chain.")
                         
-                        stats = stats_handler.get_stats()
+                        # stats of this question only, other connections may be running
+                        stats = last_frame.get("stats")
                         log(f"📊 Stats: {stats}")
                         log(f"⏱️ Processing time: {processing_time} seconds")
                         
-                        # Use response - extract answer from tuple (thought, answer, is_replan)
-                        if isinstance(response, tuple) and len(response) == 3:
-                            _, response_text, _ = response
-                        else:
-                            response_text = str(response)
-                        
-                        response_text = response_text.strip()
-                        
-                        # Send final response
+                        # Send final response, it replaces the streamed tokens
                         await websocket.send_json({
                             "type": "response",
-                            "text": response_text,
+                            "text": response.strip(),
                             "icon": "",
                             "time": processing_time,
-                            "error": False
+                            "error": False,
+                            "done": True
                         })
                         
                     except Exception as e:
@@ -203,7 +332,12 @@ def create_app() -> FastAPI:
             log(traceback.format_exc())
             
         finally:
-            await websocket.close()
+            receiver.cancel()
+            try:
+                await websocket.close()
+            except RuntimeError:
+                # the connection is already closed
+                pass
     
     return app
 
@@ -2,6 +2,16 @@ from typing import Dict, List, Any
 import os
 from .base_flow import NodeRedFlow
 
+# Measurement of the requested date, or of the most recent date for
+# date=latest and, with fallback=latest, when the requested date is missing
+LATEST_AWARE_QUERY = (
+    "SELECT * FROM measurements WHERE date = COALESCE("
+    "(SELECT date FROM measurements WHERE date = $date LIMIT 1), "
+    "CASE WHEN $date = 'latest' OR $fallback = 1 "
+    "THEN (SELECT MAX(date) FROM measurements) END) "
+    "ORDER BY timestamp DESC LIMIT 1"
+)
+
 class TemperatureFlow(NodeRedFlow):
     """Flow for temperature measurements API."""
     
@@ -94,19 +104,23 @@ class TemperatureFlow(NodeRedFlow):
                     return [null, msg];
                 }
 
+                // "latest" selects the most recent measurement
                 const dateRegex = /^\\d{4}-\\d{2}-\\d{2}$/;
-                if (!dateRegex.test(msg.req.query.date)) {
+                if (msg.req.query.date !== "latest" && !dateRegex.test(msg.req.query.date)) {
                     msg.statusCode = 400;
                     msg.payload = {
-                        error: "Invalid date format. Please use YYYY-MM-DD",
+                        error: "Invalid date format. Please use YYYY-MM-DD or latest",
                         status: "invalid_format",
                         code: 400
                     };
                     return [null, msg];
                 }
 
+                // fallback=latest answers with the most recent measurement
+                // when there is none for the requested date
                 msg.params = {
-                    $date: msg.req.query.date
+                    $date: msg.req.query.date,
+                    $fallback: msg.req.query.fallback === "latest" ? 1 : 0
                 };
                 return [msg, null];
                 """,
@@ -146,7 +160,7 @@ class TemperatureFlow(NodeRedFlow):
                 "name": "Query Measurements",
                 "mydb": db_config_id,
                 "sqlquery": "prepared",
-                "sql": "SELECT * FROM measurements WHERE date = $date",
+                "sql": LATEST_AWARE_QUERY,
                 "params": [],
                 "x": 520,
                 "y": 100,
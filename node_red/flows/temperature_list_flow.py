@@ -83,7 +83,7 @@ class TemperatureListFlow(NodeRedFlow):
                 "name": "List Measurements",
                 "mydb": db_config_id,
                 "sqlquery": "fixed",
-                "sql": "SELECT date, temperature, humidity FROM measurements ORDER BY date DESC",
+                "sql": "SELECT date, temperature, humidity FROM measurements ORDER BY date DESC, timestamp DESC",
                 "params": [],
                 "x": 320,
                 "y": 100,
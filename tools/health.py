@@ -0,0 +1,151 @@
+"""Health of the tools' dependencies, probed in the background.
+
+Each tool registers a probe, usually its `validate_dependencies`. The probes
+run concurrently every `interval` seconds, and their results are cached, so
+that checking whether a tool is available never waits for the network. The
+tools that are down are hidden from the tools manager and the planner.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from loguru import logger
+
+Probe = Callable[[], Awaitable[bool]]
+
+DEFAULT_INTERVAL = 30.0  # seconds
+DEFAULT_PROBE_TIMEOUT = 5.0  # seconds
+# consecutive failed probes after which a tool is down
+DEFAULT_FAILURE_THRESHOLD = 2
+
+
+@dataclass
+class ToolHealth:
+    """Last known health of a tool."""
+
+    healthy: bool = True
+    failures: int = 0
+    last_checked: Optional[float] = None
+    latency: Optional[float] = None
+    error: Optional[str] = None
+
+
+class HealthRegistry:
+    """Cached health of the tools, refreshed by a background task."""
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_INTERVAL,
+        probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+    ):
+        """Initialize the registry.
+
+        Args:
+            interval: Seconds between two rounds of probes
+            probe_timeout: Seconds after which a probe counts as failed
+            failure_threshold: Consecutive failures after which a tool is down
+        """
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self._probes: Dict[str, Probe] = {}
+        self._health: Dict[str, ToolHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def register(self, name: str, probe: Probe) -> None:
+        """Probe the dependencies of a tool.
+
+        A tool is considered healthy until its probes fail.
+
+        Args:
+            name: Name of the tool
+            probe: Coroutine function returning whether the dependencies are up
+        """
+        self._probes[name] = probe
+        self._health.setdefault(name, ToolHealth())
+
+    def register_tools(self, tools: Sequence[Any]) -> None:
+        """Register the probes of the tools having a `health_check`."""
+        for tool in tools:
+            health_check = getattr(tool, "health_check", None)
+            if health_check is not None:
+                self.register(tool.name, health_check)
+
+    def is_healthy(self, name: str) -> bool:
+        """Whether the tool is up, tools without a probe always are."""
+        health = self._health.get(name)
+        return health is None or health.healthy
+
+    def healthy(self, names: Sequence[str]) -> List[str]:
+        """The names of the tools that are up, in order."""
+        return [name for name in names if self.is_healthy(name)]
+
+    async def _probe(self, name: str, probe: Probe) -> None:
+        health = self._health[name]
+        start = time.perf_counter()
+        try:
+            ok = await asyncio.wait_for(probe(), self.probe_timeout)
+            error = None if ok else "dependencies unavailable"
+        except asyncio.TimeoutError:
+            ok, error = False, f"probe timed out after {self.probe_timeout}s"
+        except Exception as e:
+            ok, error = False, str(e)
+        health.latency = time.perf_counter() - start
+        health.last_checked = time.time()
+        health.error = error
+        health.failures = 0 if ok else health.failures + 1
+        healthy = ok or health.failures < self.failure_threshold
+        if healthy != health.healthy:
+            if healthy:
+                logger.info(f"Tool {name} is back up")
+            else:
+                logger.warning(f"Tool {name} is down, hidden from the plans: {error}")
+        health.healthy = healthy
+
+    async def probe_all(self) -> None:
+        """Run every probe once, concurrently."""
+        await asyncio.gather(
+            *(self._probe(name, probe) for name, probe in list(self._probes.items()))
+        )
+
+    async def _probe_periodically(self) -> None:
+        while not self._stopping.is_set():
+            await self.probe_all()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        """Start probing in the background, the first round runs right away."""
+        if self._task is None:
+            # created here, to be bound to the running loop
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._probe_periodically())
+
+    async def stop(self) -> None:
+        """Stop probing."""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Health of each tool with a probe."""
+        return {
+            name: {
+                "healthy": health.healthy,
+                "failures": health.failures,
+                "last_checked": health.last_checked,
+                "latency": health.latency,
+                "error": health.error,
+            }
+            for name, health in self._health.items()
+        }
+
+
+# Export a singleton instance
+health_registry = HealthRegistry()
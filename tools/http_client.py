@@ -0,0 +1,87 @@
+"""Shared HTTP client for the tools.
+
+All the tools calling an HTTP API go through a single application-scoped
+`aiohttp.ClientSession`, so that connections are kept alive between calls
+and DNS lookups are cached. The session is created on first use and closed
+by the application on shutdown with `close_http_session`.
+"""
+import asyncio
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+from .base_tool import ToolConfig
+
+# Connection pool limits
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 20
+DNS_CACHE_TTL = 300  # seconds
+KEEPALIVE_TIMEOUT = 30  # seconds
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5)
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Get the shared HTTP session, creating it if needed.
+
+    Must be called from a coroutine, the session is bound to the running loop.
+
+    Returns:
+        The application-scoped session
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT)
+        _session_loop = loop
+        logger.debug("Created the shared HTTP session")
+    return _session
+
+
+async def close_http_session() -> None:
+    """Close the shared HTTP session and its connections."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+async def prewarm_connection(url: str) -> None:
+    """Open a keep-alive connection to the host of `url` ahead of its first call.
+
+    Args:
+        url: Any cheap URL of the host
+    """
+    async with get_http_session().head(url) as resp:
+        await resp.release()
+
+
+class HTTPTool:
+    """Base class of the tools calling an HTTP API."""
+
+    def __init__(
+        self, config: ToolConfig, session: Optional[aiohttp.ClientSession] = None
+    ):
+        """Initialize the tool.
+
+        Args:
+            config: Tool configuration
+            session: HTTP session to use, defaults to the shared one
+        """
+        self.config = config
+        self._session = session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """HTTP session used by the tool."""
+        return self._session or get_http_session()
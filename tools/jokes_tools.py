@@ -4,22 +4,21 @@ import aiohttp
 import json
 from loguru import logger
 from .base_tool import Tool, ToolConfig
+from .http_client import HTTPTool
 
 
-# Configure loguru
-logger.remove(0)
 
-
-class ChuckNorrisJokeTool(Tool):
+class ChuckNorrisJokeTool(HTTPTool):
     """Tool pour générer des blagues Chuck Norris."""
     
-    def __init__(self, config: ToolConfig):
+    def __init__(self, config: ToolConfig, session: Optional[aiohttp.ClientSession] = None):
         """Initialize le tool.
         
         Args:
             config: Configuration du tool
+            session: Session HTTP à utiliser, par défaut la session partagée
         """
-        super().__init__(config)
+        super().__init__(config, session)
         self.endpoint = "https://api.chucknorris.io"
     
     async def validate_dependencies(self) -> bool:
@@ -29,9 +28,8 @@ class ChuckNorrisJokeTool(Tool):
             True si l'API répond, False sinon
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.endpoint}/jokes/random") as resp:
-                    return resp.status == 200
+            async with self.session.get(f"{self.endpoint}/jokes/random") as resp:
+                return resp.status == 200
         except:
             return False
     
@@ -57,23 +55,22 @@ class ChuckNorrisJokeTool(Tool):
             Réponse formatée avec la blague
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.endpoint}/jokes/random") as resp:
-                    if resp.status != 200:
-                        return json.dumps({
-                            "success": False,
-                            "message": f"Erreur {resp.status}",
-                            "error": "Impossible d'obtenir une blague"
-                        })
-                        
-                    data = await resp.json()
-                    joke = data.get("value", "")
-                    
+            async with self.session.get(f"{self.endpoint}/jokes/random") as resp:
+                if resp.status != 200:
                     return json.dumps({
-                        "success": True,
-                        "message": "Voici une blague Chuck Norris",
-                        "joke": joke
+                        "success": False,
+                        "message": f"Erreur {resp.status}",
+                        "error": "Impossible d'obtenir une blague"
                     })
+                        
+                data = await resp.json()
+                joke = data.get("value", "")
+                    
+                return json.dumps({
+                    "success": True,
+                    "message": "Voici une blague Chuck Norris",
+                    "joke": joke
+                })
                     
         except Exception as e:
             logger.error(f"Erreur lors de la requête: {str(e)}")
@@ -4,21 +4,29 @@ from datetime import datetime
 import aiohttp
 from typing import Dict, Any, Optional
 from .base_tool import Tool, ToolConfig, ToolResponse
+from .http_client import HTTPTool
+from .temperature_backends import (
+    NODE_RED_URL,
+    TemperatureBackend,
+    get_temperature_backend,
+)
 
 
-class NodeREDStatusTool:
+class NodeREDStatusTool(HTTPTool):
     """Tool for checking Node-RED status."""
     
-    def __init__(self, config: ToolConfig):
-        self.config = config
-        self.endpoint = "http://127.0.0.1:1880"
+    def __init__(self, config: ToolConfig, session: Optional[aiohttp.ClientSession] = None):
+        super().__init__(config, session)
+        self.endpoint = NODE_RED_URL
     
     async def validate_dependencies(self) -> bool:
         """Check if Node-RED is available."""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.endpoint}/list/temperatures") as resp:
-                    return resp.status == 200
+            # a single measurement, instead of the whole list
+            async with self.session.get(
+                f"{self.endpoint}/query/temperature", params={"date": "latest"}
+            ) as resp:
+                return resp.status == 200
         except Exception:
             return False
     
@@ -37,23 +45,22 @@ class NodeREDStatusTool:
             Status response as JSON string
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.endpoint}/list/temperatures") as resp:
-                    if resp.status != 200:
-                        response: ToolResponse = {
-                            "success": False,
-                            "data": None,
-                            "error": f"Node-RED returned status {resp.status}"
-                        }
-                        return json.dumps(response)
-                    
-                    data = await resp.json()
+            async with self.session.get(f"{self.endpoint}/list/temperatures") as resp:
+                if resp.status != 200:
                     response: ToolResponse = {
-                        "success": True,
-                        "data": data,
-                        "error": None
+                        "success": False,
+                        "data": None,
+                        "error": f"Node-RED returned status {resp.status}"
                     }
                     return json.dumps(response)
+                    
+                data = await resp.json()
+                response: ToolResponse = {
+                    "success": True,
+                    "data": data,
+                    "error": None
+                }
+                return json.dumps(response)
         except Exception as e:
             response: ToolResponse = {
                 "success": False,
@@ -66,18 +73,19 @@ class NodeREDStatusTool:
 class TemperatureTool:
     """Tool for getting temperature data."""
     
-    def __init__(self, config: ToolConfig):
+    def __init__(self, config: ToolConfig, backend: Optional[TemperatureBackend] = None):
+        """Initialize the tool.
+        
+        Args:
+            config: Tool configuration
+            backend: Source of the measurements, defaults to the configured one
+        """
         self.config = config
-        self.endpoint = "http://127.0.0.1:1880"
+        self.backend = backend or get_temperature_backend()
     
     async def validate_dependencies(self) -> bool:
-        """Check if Node-RED and temperature endpoints are available."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.endpoint}/query/temperature?date=2025-02-04") as resp:
-                    return resp.status == 200
-        except Exception:
-            return False
+        """Check if the temperature measurements are available."""
+        return await self.backend.is_available()
     
     async def execute(
         self,
@@ -96,70 +104,35 @@ class TemperatureTool:
         Returns:
             Temperature data as JSON string
         """
+        # "latest" selects the most recent measurement, and the fallback
+        # does so when the requested date has none, in a single query
+        target_date = "latest"
+        if parameters and "date" in parameters:
+            cleaned_date = parameters["date"].replace("date='", "").replace("'", "")
+            try:
+                # Vérifier si la date est valide
+                datetime.strptime(cleaned_date, "%Y-%m-%d")
+                target_date = cleaned_date
+            except ValueError:
+                # Si la date n'est pas valide, utiliser la plus récente
+                pass
+        
         try:
-            # D'abord récupérer la liste des températures pour avoir la date la plus récente
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.endpoint}/list/temperatures") as resp:
-                    if resp.status != 200:
-                        response: ToolResponse = {
-                            "success": False,
-                            "data": None,
-                            "error": f"Failed to get temperature list: {resp.status}"
-                        }
-                        return json.dumps(response)
-                    
-                    data = await resp.json()
-                    if not data.get("measurements"):
-                        response: ToolResponse = {
-                            "success": False,
-                            "data": None,
-                            "error": "No temperature measurements available"
-                        }
-                        return json.dumps(response)
-                    
-                    # Récupérer la date la plus récente
-                    latest_date = data["measurements"][0]["date"]
-                    
-                    # Si une date est spécifiée, la nettoyer
-                    target_date = latest_date
-                    if parameters and "date" in parameters:
-                        cleaned_date = parameters["date"].replace("date='", "").replace("'", "")
-                        try:
-                            # Vérifier si la date est valide
-                            datetime.strptime(cleaned_date, "%Y-%m-%d")
-                            target_date = cleaned_date
-                        except ValueError:
-                            # Si la date n'est pas valide, utiliser la plus récente
-                            pass
-                    
-                    # Faire la requête avec la date cible
-                    async with session.get(f"{self.endpoint}/query/temperature?date={target_date}") as resp:
-                        if resp.status != 200:
-                            # Si la date demandée n'existe pas, utiliser la plus récente
-                            async with session.get(f"{self.endpoint}/query/temperature?date={latest_date}") as resp2:
-                                if resp2.status != 200:
-                                    response: ToolResponse = {
-                                        "success": False,
-                                        "data": None,
-                                        "error": f"Node-RED returned status {resp2.status}"
-                                    }
-                                    return json.dumps(response)
-                                
-                                data = await resp2.json()
-                                response: ToolResponse = {
-                                    "success": True,
-                                    "data": data,
-                                    "error": None
-                                }
-                                return json.dumps(response)
-                        
-                        data = await resp.json()
-                        response: ToolResponse = {
-                            "success": True,
-                            "data": data,
-                            "error": None
-                        }
-                        return json.dumps(response)
+            data = await self.backend.get_measurement(target_date, fallback=True)
+            if data is None:
+                response: ToolResponse = {
+                    "success": False,
+                    "data": None,
+                    "error": "No temperature measurements available"
+                }
+                return json.dumps(response)
+                
+            response: ToolResponse = {
+                "success": True,
+                "data": data,
+                "error": None
+            }
+            return json.dumps(response)
         except Exception as e:
             response: ToolResponse = {
                 "success": False,
@@ -0,0 +1,212 @@
+"""Analytics of the temperatures over a date range, computed with NumPy.
+
+A single call answers questions on averages, trends and anomalies with a
+compact summary, instead of the LLM computing them from the raw measurements.
+"""
+import json
+from typing import Dict, Any, List, Optional, TypedDict
+
+import numpy as np
+
+from .base_tool import Tool, ToolConfig, ToolResponse
+from .temperature_backends import TemperatureBackend, get_temperature_backend
+from .temperature_tools import validate_date
+
+DEFAULT_WINDOW = 7  # days
+DEFAULT_Z_THRESHOLD = 3.0
+MAX_ANOMALIES = 10
+
+
+class TemperatureAnalytics(TypedDict):
+    """Summary of the measurements of a date range."""
+    start_date: str
+    end_date: str
+    count: int
+    days: int
+    temperature: Dict[str, Any]
+    humidity: Dict[str, Any]
+    moving_average: Dict[str, Any]
+    trend: Dict[str, Any]
+    anomalies: List[Dict[str, Any]]
+
+
+def describe(dates: np.ndarray, values: np.ndarray) -> Dict[str, Any]:
+    """Mean, standard deviation, and extremes with their date."""
+    lowest, highest = np.argmin(values), np.argmax(values)
+    return {
+        "mean": round(float(values.mean()), 2),
+        "std": round(float(values.std()), 2),
+        "min": {"value": round(float(values[lowest]), 2), "date": str(dates[lowest])},
+        "max": {"value": round(float(values[highest]), 2), "date": str(dates[highest])},
+    }
+
+
+def daily_means(dates: np.ndarray, values: np.ndarray):
+    """Days with measurements, and the mean of each, `dates` being sorted."""
+    days, first, counts = np.unique(dates, return_index=True, return_counts=True)
+    return days, np.add.reduceat(values, first) / counts
+
+
+def moving_average(days: np.ndarray, means: np.ndarray, window: int) -> Dict[str, Any]:
+    """Moving average of the daily means, over `window` days with measurements."""
+    window = max(1, min(window, len(means)))
+    averages = np.convolve(means, np.ones(window) / window, mode="valid")
+    ends = days[window - 1:]
+    lowest, highest = np.argmin(averages), np.argmax(averages)
+    return {
+        "window": window,
+        "last": {"value": round(float(averages[-1]), 2), "date": str(ends[-1])},
+        "min": {"value": round(float(averages[lowest]), 2), "date": str(ends[lowest])},
+        "max": {"value": round(float(averages[highest]), 2), "date": str(ends[highest])},
+    }
+
+
+def linear_trend(days: np.ndarray, means: np.ndarray) -> Dict[str, Any]:
+    """Least squares line through the daily means."""
+    if len(means) < 2:
+        return {"slope_per_day": 0.0, "change": 0.0, "r2": 0.0}
+    x = (days - days[0]).astype(np.float64)
+    slope, intercept = np.polyfit(x, means, 1)
+    residuals = means - (slope * x + intercept)
+    total = ((means - means.mean()) ** 2).sum()
+    r2 = 1.0 - (residuals ** 2).sum() / total if total else 0.0
+    return {
+        "slope_per_day": round(float(slope), 3),
+        "change": round(float(slope * x[-1]), 2),
+        "r2": round(float(r2), 2),
+    }
+
+
+def z_score_anomalies(
+    dates: np.ndarray, values: np.ndarray, threshold: float
+) -> List[Dict[str, Any]]:
+    """Measurements further than `threshold` standard deviations from the mean."""
+    std = values.std()
+    if not std:
+        return []
+    z = (values - values.mean()) / std
+    outliers = np.flatnonzero(np.abs(z) > threshold)
+    # the most extreme first
+    outliers = outliers[np.argsort(-np.abs(z[outliers]))][:MAX_ANOMALIES]
+    return [
+        {"date": str(dates[i]), "temperature": round(float(values[i]), 2), "z": round(float(z[i]), 2)}
+        for i in outliers
+    ]
+
+
+def analyze(
+    series: np.ndarray,
+    start_date: str,
+    end_date: str,
+    window: int = DEFAULT_WINDOW,
+    z_threshold: float = DEFAULT_Z_THRESHOLD,
+) -> TemperatureAnalytics:
+    """Summarise the measurements of a date range.
+
+    Args:
+        series: Measurements, see `TemperatureBackend.get_series`
+        start_date: First date of the range
+        end_date: Last date of the range
+        window: Days of the moving average
+        z_threshold: Z-score above which a measurement is an anomaly
+
+    Returns:
+        Stats, moving average and trend of the temperature, and its anomalies
+    """
+    dates, temperatures = series["date"], series["temperature"]
+    days, means = daily_means(dates, temperatures)
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "count": int(len(series)),
+        "days": int(len(days)),
+        "temperature": describe(dates, temperatures),
+        "humidity": describe(dates, series["humidity"]),
+        "moving_average": moving_average(days, means, window),
+        "trend": linear_trend(days, means),
+        "anomalies": z_score_anomalies(dates, temperatures, z_threshold),
+    }
+
+
+class TemperatureAnalyticsTool:
+    """Tool to analyse the temperatures of a date range."""
+
+    def __init__(self, config: ToolConfig, backend: Optional[TemperatureBackend] = None):
+        self.config = config
+        self.backend = backend or get_temperature_backend()
+
+    async def validate_dependencies(self) -> bool:
+        """Check if the temperature measurements are available."""
+        return await self.backend.is_available()
+
+    async def execute(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Get the stats, moving average, trend and anomalies of the temperatures.
+
+        Args:
+            query: Query to execute
+            parameters: Parameters
+                - start_date: Start date of the range (YYYY-MM-DD)
+                - end_date: End date of the range (YYYY-MM-DD)
+                - window: Days of the moving average (default: 7)
+                - z_threshold: Z-score of the anomalies (default: 3.0)
+
+        Returns:
+            Summary of the range as JSON string
+        """
+        if not parameters or "start_date" not in parameters or "end_date" not in parameters:
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": "start_date and end_date parameters are required"
+            }
+            return json.dumps(response)
+
+        if not validate_date(parameters["start_date"]) or not validate_date(parameters["end_date"]):
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": "Invalid date format. Use YYYY-MM-DD"
+            }
+            return json.dumps(response)
+
+        try:
+            series = await self.backend.get_series(parameters["start_date"], parameters["end_date"])
+            if not len(series):
+                response: ToolResponse = {
+                    "success": False,
+                    "data": None,
+                    "error": (
+                        f"No measurement between {parameters['start_date']} "
+                        f"and {parameters['end_date']}"
+                    )
+                }
+                return json.dumps(response)
+
+            response: ToolResponse = {
+                "success": True,
+                "data": analyze(
+                    series,
+                    parameters["start_date"],
+                    parameters["end_date"],
+                    window=int(parameters.get("window") or DEFAULT_WINDOW),
+                    z_threshold=float(parameters.get("z_threshold") or DEFAULT_Z_THRESHOLD),
+                ),
+                "error": None
+            }
+            return json.dumps(response)
+
+        except Exception as e:
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": str(e)
+            }
+            return json.dumps(response)
+
+
+# Register tools
+Tool.register(TemperatureAnalyticsTool)
@@ -0,0 +1,412 @@
+"""Backends serving the temperature measurements to the tools.
+
+The measurements live in `db/measurements.db`. They can be read through the
+Node-RED HTTP API, or directly in-process from the SQLite database, which
+saves the HTTP hop and the `Format Response` node of Node-RED. Both backends
+return the same payloads, so the tools answer the same `ToolResponse`.
+
+The backend is selected with the `TEMPERATURE_BACKEND` environment variable
+(`node_red` by default, or `sqlite`).
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as Date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+import numpy as np
+from loguru import logger
+
+from .http_client import get_http_session
+
+NODE_RED_URL = "http://127.0.0.1:1880"
+DEFAULT_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "measurements.db"
+)
+DEFAULT_POOL_SIZE = 4
+MAX_LISTED_MEASUREMENTS = 1000
+
+# Same metadata as the `Format Response` node of the Node-RED flow
+MEASUREMENT_METADATA = {
+    "measurement_type": "environmental",
+    "temperature_unit": "celsius",
+    "humidity_unit": "percentage",
+    "data_source": "local_sqlite_db",
+    "measurement_location": "office_environment",
+    "accuracy": "high",
+    "calibration_date": "2024-01-01",
+}
+
+# Measurement of the requested date, or of the most recent date for
+# date=latest and, with fallback, when the requested date is missing
+LATEST_AWARE_QUERY = (
+    "SELECT date, temperature, humidity FROM measurements WHERE date = COALESCE("
+    "(SELECT date FROM measurements WHERE date = :date LIMIT 1), "
+    "CASE WHEN :date = 'latest' OR :fallback = 1 "
+    "THEN (SELECT MAX(date) FROM measurements) END) "
+    "ORDER BY timestamp DESC LIMIT 1"
+)
+# Readings of a date range, most recent first, at most MAX_LISTED_MEASUREMENTS
+LIST_QUERY = (
+    "SELECT date, temperature, humidity FROM measurements "
+    "WHERE (:start_date IS NULL OR date >= :start_date) "
+    "AND (:end_date IS NULL OR date <= :end_date) "
+    "ORDER BY date DESC, timestamp DESC "
+    f"LIMIT {MAX_LISTED_MEASUREMENTS}"
+)
+# Precomputed by the database, see `db/migrations.py`
+STATS_QUERY = (
+    "SELECT period_start, count, "
+    "temperature_min, temperature_max, temperature_sum / count AS temperature_mean, "
+    "humidity_min, humidity_max, humidity_sum / count AS humidity_mean "
+    "FROM measurement_rollups "
+    "WHERE granularity = :granularity AND period_start BETWEEN :start AND :end "
+    "ORDER BY period_start"
+)
+# Daily series of a date range, as a structured array for the analytics
+SERIES_QUERY = (
+    "SELECT date, temperature, humidity FROM measurements "
+    "WHERE date BETWEEN :start_date AND :end_date "
+    "ORDER BY date"
+)
+SERIES_DTYPE = np.dtype([("date", "datetime64[D]"), ("temperature", "f8"), ("humidity", "f8")])
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def period_start(date: str, granularity: str) -> str:
+    """First day of the period of `date` (YYYY-MM-DD), weeks start on monday."""
+    day = Date.fromisoformat(date)
+    if granularity == "week":
+        day -= timedelta(days=day.weekday())
+    elif granularity == "month":
+        day = day.replace(day=1)
+    elif granularity != "day":
+        raise ValueError(f"Unknown granularity: {granularity}")
+    return day.isoformat()
+
+
+def format_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact stats of a period, as answered to the tools."""
+    return {
+        "period": row["period_start"],
+        "count": row["count"],
+        **{
+            measure: {
+                stat: round(row[f"{measure}_{stat}"], 2)
+                for stat in ("min", "max", "mean")
+            }
+            for measure in ("temperature", "humidity")
+        },
+    }
+
+
+class TemperatureBackendError(Exception):
+    """The backend failed to answer."""
+
+
+class TemperatureBackend:
+    """Source of the temperature measurements."""
+
+    name: str = ""
+
+    async def is_available(self) -> bool:
+        """Check that the measurements can be read."""
+        raise NotImplementedError
+
+    async def get_measurement(
+        self, date: str, fallback: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Get the measurement of a date.
+
+        Args:
+            date: Date of the measurement (YYYY-MM-DD), or "latest"
+            fallback: Answer with the most recent measurement when there is
+                none for `date`
+
+        Returns:
+            The measurement with its metadata, None if there is none
+        """
+        raise NotImplementedError
+
+    async def list_measurements(
+        self, start_date: Optional[str] = None, end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """List the measurements, most recent first.
+
+        Args:
+            start_date: First date included (YYYY-MM-DD)
+            end_date: Last date included (YYYY-MM-DD)
+
+        Returns:
+            The measurements, with their date, temperature and humidity
+        """
+        raise NotImplementedError
+
+    async def get_stats(
+        self, start_date: str, end_date: str, granularity: str = "day"
+    ) -> List[Dict[str, Any]]:
+        """Get the min, max and mean of the measurements by period.
+
+        Periods overlapping the range are included whole.
+
+        Args:
+            start_date: First date of the range (YYYY-MM-DD)
+            end_date: Last date of the range (YYYY-MM-DD)
+            granularity: "day", "week" or "month"
+
+        Returns:
+            The stats of each period with measurements, in order
+        """
+        raise NotImplementedError
+
+    async def get_series(self, start_date: str, end_date: str) -> np.ndarray:
+        """Get the measurements of a date range as columns, oldest first.
+
+        Args:
+            start_date: First date included (YYYY-MM-DD)
+            end_date: Last date included (YYYY-MM-DD)
+
+        Returns:
+            Structured array with `date`, `temperature` and `humidity` fields
+        """
+        measurements = await self.list_measurements(start_date, end_date)
+        return np.array(
+            [(m["date"], m["temperature"], m["humidity"]) for m in reversed(measurements)],
+            dtype=SERIES_DTYPE,
+        )
+
+    async def close(self) -> None:
+        """Release the resources of the backend."""
+
+
+class NodeREDBackend(TemperatureBackend):
+    """Measurements read through the Node-RED HTTP API."""
+
+    name = "node_red"
+
+    def __init__(
+        self, base_url: str = NODE_RED_URL, session: Optional[aiohttp.ClientSession] = None
+    ):
+        """Initialize the backend.
+
+        Args:
+            base_url: URL of Node-RED
+            session: HTTP session to use, defaults to the shared one
+        """
+        self.base_url = base_url
+        self._session = session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """HTTP session used by the backend."""
+        return self._session or get_http_session()
+
+    async def is_available(self) -> bool:
+        try:
+            async with self.session.get(
+                f"{self.base_url}/query/temperature", params={"date": "latest"}
+            ) as resp:
+                return resp.status == 200
+        except Exception:
+            return False
+
+    async def get_measurement(
+        self, date: str, fallback: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        params = {"date": date}
+        if fallback:
+            params["fallback"] = "latest"
+        async with self.session.get(
+            f"{self.base_url}/query/temperature", params=params
+        ) as resp:
+            if resp.status == 404:
+                return None
+            if resp.status != 200:
+                raise TemperatureBackendError(f"Node-RED returned status {resp.status}")
+            return await resp.json()
+
+    async def list_measurements(
+        self, start_date: Optional[str] = None, end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        async with self.session.get(f"{self.base_url}/list/temperatures") as resp:
+            if resp.status == 404:
+                return []
+            if resp.status != 200:
+                raise TemperatureBackendError(f"Node-RED returned status {resp.status}")
+            data = await resp.json()
+        # The flow lists every measurement, the range is applied here
+        return [
+            m for m in data.get("measurements", [])
+            if (start_date is None or m["date"] >= start_date)
+            and (end_date is None or m["date"] <= end_date)
+        ]
+
+    async def get_stats(
+        self, start_date: str, end_date: str, granularity: str = "day"
+    ) -> List[Dict[str, Any]]:
+        # The flow has no rollups, the stats are computed from the list
+        measurements = await self.list_measurements(
+            period_start(start_date, granularity), end_date
+        )
+        periods: Dict[str, Dict[str, Any]] = {}
+        for m in measurements:
+            start = period_start(m["date"], granularity)
+            row = periods.setdefault(start, {
+                "period_start": start,
+                "count": 0,
+                "temperature_min": m["temperature"],
+                "temperature_max": m["temperature"],
+                "temperature_mean": 0.0,
+                "humidity_min": m["humidity"],
+                "humidity_max": m["humidity"],
+                "humidity_mean": 0.0,
+            })
+            row["count"] += 1
+            for measure in ("temperature", "humidity"):
+                row[f"{measure}_min"] = min(row[f"{measure}_min"], m[measure])
+                row[f"{measure}_max"] = max(row[f"{measure}_max"], m[measure])
+                row[f"{measure}_mean"] += m[measure]
+        for row in periods.values():
+            row["temperature_mean"] /= row["count"]
+            row["humidity_mean"] /= row["count"]
+        return [format_stats(periods[start]) for start in sorted(periods)]
+
+
+class SQLiteBackend(TemperatureBackend):
+    """Measurements read in-process from the SQLite database.
+
+    The queries run in a small thread pool, each worker thread keeping its own
+    read-only connection, so that the event loop is never blocked and
+    connections are opened once.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, pool_size: int = DEFAULT_POOL_SIZE):
+        """Initialize the backend.
+
+        Args:
+            db_path: Path of the measurements database
+            pool_size: Number of worker threads, and so of connections
+        """
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Read-only connection of the current worker thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _fetchall(self, sql: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._connection().execute(sql, params).fetchall()]
+
+    def _fetch_series(self, sql: str, params: Dict[str, Any]) -> np.ndarray:
+        cursor = self._connection().execute(sql, params)
+        # tuples straight into the columns, without a dict per row
+        cursor.row_factory = None
+        return np.array(cursor.fetchall(), dtype=SERIES_DTYPE)
+
+    async def _run(self, sql: str, params: Dict[str, Any], fetch=None) -> Any:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.pool_size, thread_name_prefix="temperature-sqlite"
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, fetch or self._fetchall, sql, params
+            )
+        except sqlite3.Error as e:
+            raise TemperatureBackendError(f"SQLite error: {e}") from e
+
+    async def is_available(self) -> bool:
+        try:
+            await self._run("SELECT 1 FROM measurements LIMIT 1", {})
+            return True
+        except TemperatureBackendError:
+            return False
+
+    async def get_measurement(
+        self, date: str, fallback: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        rows = await self._run(
+            LATEST_AWARE_QUERY, {"date": date, "fallback": 1 if fallback else 0}
+        )
+        if not rows:
+            return None
+        return {
+            **rows[0],
+            "metadata": MEASUREMENT_METADATA,
+            "query_timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        }
+
+    async def list_measurements(
+        self, start_date: Optional[str] = None, end_date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        return await self._run(
+            LIST_QUERY, {"start_date": start_date, "end_date": end_date}
+        )
+
+    async def get_stats(
+        self, start_date: str, end_date: str, granularity: str = "day"
+    ) -> List[Dict[str, Any]]:
+        rows = await self._run(STATS_QUERY, {
+            "granularity": granularity,
+            "start": period_start(start_date, granularity),
+            "end": end_date,
+        })
+        return [format_stats(row) for row in rows]
+
+    async def get_series(self, start_date: str, end_date: str) -> np.ndarray:
+        return await self._run(
+            SERIES_QUERY, {"start_date": start_date, "end_date": end_date},
+            fetch=self._fetch_series,
+        )
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def get_temperature_backend(name: Optional[str] = None) -> TemperatureBackend:
+    """Get the shared backend of the temperature tools.
+
+    Args:
+        name: "node_red" or "sqlite", defaults to the `TEMPERATURE_BACKEND`
+            environment variable, then to "node_red"
+
+    Returns:
+        The backend, created on first use
+    """
+    name = name or os.getenv("TEMPERATURE_BACKEND", NodeREDBackend.name)
+    if name == SQLiteBackend.name:
+        db_path = os.getenv("TEMPERATURE_DB_PATH", DEFAULT_DB_PATH)
+        logger.info(f"Temperature tools read {db_path} directly")
+        return SQLiteBackend(db_path)
+    if name == NodeREDBackend.name:
+        return NodeREDBackend()
+    raise ValueError(f"Unknown temperature backend: {name}")
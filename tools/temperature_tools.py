@@ -2,9 +2,9 @@
 import json
 from datetime import datetime
 from typing import Dict, Any, List, Optional, TypedDict, NotRequired
-import aiohttp
 from loguru import logger
 from .base_tool import Tool, ToolConfig, ToolResponse
+from .temperature_backends import GRANULARITIES, TemperatureBackend, get_temperature_backend
 
 
 class TemperatureData(TypedDict):
@@ -19,6 +19,12 @@ class TemperatureListResponse(TypedDict):
     temperatures: List[TemperatureData]
 
 
+class TemperatureStatsResponse(TypedDict):
+    """Response containing the stats of the temperatures by period."""
+    granularity: str
+    periods: List[Dict[str, Any]]
+
+
 def validate_date(date_str: str) -> bool:
     """Validate date format YYYY-MM-DD."""
     try:
@@ -36,18 +42,13 @@ def validate_temperature(temp: float) -> bool:
 class SingleTemperatureTool:
     """Tool to get temperature for a single date."""
     
-    def __init__(self, config: ToolConfig):
+    def __init__(self, config: ToolConfig, backend: Optional[TemperatureBackend] = None):
         self.config = config
-        self.base_url = "http://localhost:1880"
+        self.backend = backend or get_temperature_backend()
     
     async def validate_dependencies(self) -> bool:
-        """Check if Node-RED is available."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/status") as resp:
-                    return resp.status == 200
-        except Exception:
-            return False
+        """Check if the temperature measurements are available."""
+        return await self.backend.is_available()
     
     async def execute(
         self,
@@ -72,43 +73,38 @@ class SingleTemperatureTool:
             return json.dumps(response)
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/query/temperature",
-                    params={"date": parameters["date"]}
-                ) as resp:
-                    if resp.status != 200:
-                        response: ToolResponse = {
-                            "success": False,
-                            "data": None,
-                            "error": f"Node-RED returned status {resp.status}"
-                        }
-                        return json.dumps(response)
-                    
-                    data = await resp.json()
-                    temp = data.get("temperature")
-                    
-                    if not validate_temperature(temp):
-                        response: ToolResponse = {
-                            "success": False,
-                            "data": None,
-                            "error": "Invalid temperature value from Node-RED"
-                        }
-                        return json.dumps(response)
-                    
-                    temp_data: TemperatureData = {
-                        "date": parameters["date"],
-                        "temperature": temp,
-                        "unit": "°C"
-                    }
-                    
-                    response: ToolResponse = {
-                        "success": True,
-                        "data": temp_data,
-                        "error": None
-                    }
-                    return json.dumps(response)
-                    
+            data = await self.backend.get_measurement(parameters["date"])
+            if data is None:
+                response: ToolResponse = {
+                    "success": False,
+                    "data": None,
+                    "error": f"No measurement found for date {parameters['date']}"
+                }
+                return json.dumps(response)
+                
+            temp = data.get("temperature")
+                
+            if not validate_temperature(temp):
+                response: ToolResponse = {
+                    "success": False,
+                    "data": None,
+                    "error": f"Invalid temperature value from {self.backend.name}"
+                }
+                return json.dumps(response)
+                
+            temp_data: TemperatureData = {
+                "date": parameters["date"],
+                "temperature": temp,
+                "unit": "°C"
+            }
+                
+            response: ToolResponse = {
+                "success": True,
+                "data": temp_data,
+                "error": None
+            }
+            return json.dumps(response)
+                
         except Exception as e:
             response: ToolResponse = {
                 "success": False,
@@ -121,18 +117,13 @@ class SingleTemperatureTool:
 class ListTemperatureTool:
     """Tool to get temperature for a date range."""
     
-    def __init__(self, config: ToolConfig):
+    def __init__(self, config: ToolConfig, backend: Optional[TemperatureBackend] = None):
         self.config = config
-        self.base_url = "http://localhost:1880"
+        self.backend = backend or get_temperature_backend()
     
     async def validate_dependencies(self) -> bool:
-        """Check if Node-RED is available."""
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/status") as resp:
-                    return resp.status == 200
-        except Exception:
-            return False
+        """Check if the temperature measurements are available."""
+        return await self.backend.is_available()
     
     async def execute(
         self,
@@ -157,49 +148,114 @@ class ListTemperatureTool:
             return json.dumps(response)
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/list/temperatures",
-                    params=parameters
-                ) as resp:
-                    if resp.status != 200:
-                        response: ToolResponse = {
-                            "success": False,
-                            "data": None,
-                            "error": f"Node-RED returned status {resp.status}"
-                        }
-                        return json.dumps(response)
-                    
-                    data = await resp.json()
-                    temps: List[TemperatureData] = []
-                    
-                    for t in data.get("temperatures", []):
-                        temp = t.get("temperature")
-                        if not validate_temperature(temp):
-                            response: ToolResponse = {
-                                "success": False,
-                                "data": None,
-                                "error": f"Invalid temperature value from Node-RED: {temp}"
-                            }
-                            return json.dumps(response)
-                            
-                        temps.append({
-                            "date": t["date"],
-                            "temperature": temp,
-                            "unit": "°C"
-                        })
-                    
-                    temp_list: TemperatureListResponse = {
-                        "temperatures": temps
-                    }
-                    
+            measurements = await self.backend.list_measurements(
+                parameters["start_date"], parameters["end_date"]
+            )
+            temps: List[TemperatureData] = []
+            
+            for t in measurements:
+                temp = t.get("temperature")
+                if not validate_temperature(temp):
                     response: ToolResponse = {
-                        "success": True,
-                        "data": temp_list,
-                        "error": None
+                        "success": False,
+                        "data": None,
+                        "error": f"Invalid temperature value from {self.backend.name}: {temp}"
                     }
                     return json.dumps(response)
-                    
+                        
+                temps.append({
+                    "date": t["date"],
+                    "temperature": temp,
+                    "unit": "°C"
+                })
+                
+            temp_list: TemperatureListResponse = {
+                "temperatures": temps
+            }
+                
+            response: ToolResponse = {
+                "success": True,
+                "data": temp_list,
+                "error": None
+            }
+            return json.dumps(response)
+                
+        except Exception as e:
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": str(e)
+            }
+            return json.dumps(response)
+
+
+class TemperatureStatsTool:
+    """Tool to get the stats of the temperatures over a date range."""
+    
+    def __init__(self, config: ToolConfig, backend: Optional[TemperatureBackend] = None):
+        self.config = config
+        self.backend = backend or get_temperature_backend()
+    
+    async def validate_dependencies(self) -> bool:
+        """Check if the temperature measurements are available."""
+        return await self.backend.is_available()
+    
+    async def execute(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Get min, max and mean temperature and humidity by day, week or month.
+        
+        Args:
+            query: Query to execute
+            parameters: Parameters
+                - start_date: Start date of the range (YYYY-MM-DD)
+                - end_date: End date of the range (YYYY-MM-DD)
+                - granularity: "day", "week" or "month" (default: "day")
+            
+        Returns:
+            Stats of each period as JSON string
+        """
+        if not parameters or "start_date" not in parameters or "end_date" not in parameters:
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": "start_date and end_date parameters are required"
+            }
+            return json.dumps(response)
+        
+        if not validate_date(parameters["start_date"]) or not validate_date(parameters["end_date"]):
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": "Invalid date format. Use YYYY-MM-DD"
+            }
+            return json.dumps(response)
+        
+        granularity = parameters.get("granularity") or "day"
+        if granularity not in GRANULARITIES:
+            response: ToolResponse = {
+                "success": False,
+                "data": None,
+                "error": f"Invalid granularity. Use one of {', '.join(GRANULARITIES)}"
+            }
+            return json.dumps(response)
+        
+        try:
+            stats: TemperatureStatsResponse = {
+                "granularity": granularity,
+                "periods": await self.backend.get_stats(
+                    parameters["start_date"], parameters["end_date"], granularity
+                )
+            }
+            response: ToolResponse = {
+                "success": True,
+                "data": stats,
+                "error": None
+            }
+            return json.dumps(response)
+            
         except Exception as e:
             response: ToolResponse = {
                 "success": False,
@@ -212,3 +268,4 @@ class ListTemperatureTool:
 # Register tools
 Tool.register(SingleTemperatureTool)
 Tool.register(ListTemperatureTool)
+Tool.register(TemperatureStatsTool)
@@ -1,7 +1,14 @@
-"""Tools manager."""
-from typing import Dict, Any, List, Optional
+"""Tools manager.
+
+Tools are registered by name when the config is loaded, and built on first
+use, so that loading the config neither opens connections nor builds the
+clients of tools that are never called.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import yaml
 from loguru import logger
 from .base_tool import Tool, ToolConfig
+from .health import HealthRegistry, health_registry
 
 logger = logger
 
@@ -9,13 +16,21 @@ logger = logger
 class ToolsManager:
     """Manager for tools."""
     
-    def __init__(self, config_path: Optional[str] = None):
+    def __init__(
+        self,
+        config_path: Optional[str] = None,
+        health: HealthRegistry = health_registry
+    ):
         """Initialize the tools manager.
         
         Args:
             config_path: Path to YAML config file
+            health: Registry probing the dependencies of the tools
         """
         self.tools: Dict[str, Tool] = {}
+        # tools not built yet: class and config
+        self._pending: Dict[str, Tuple[type, ToolConfig]] = {}
+        self.health = health
         if config_path:
             self._load_config(config_path)
     
@@ -47,11 +62,10 @@ class ToolsManager:
                 ]
             }
             
-            # Get tool class from registry
+            # Get tool class from registry, the tool is built on first use
             try:
                 tool_cls = Tool.get(tool_config["name"])
-                tool = tool_cls(config=config_dict)
-                self.tools[tool_config["name"]] = tool
+                self._pending[tool_config["name"]] = (tool_cls, config_dict)
                 logger.info("Loaded tool", name=tool_config["name"])
             except ValueError as e:
                 logger.error("Failed to load tool", 
@@ -59,6 +73,24 @@ class ToolsManager:
                     error=str(e)
                 )
     
+    def add_tool(self, tool: Tool) -> None:
+        """Add a tool, its dependencies are probed in the background.
+        
+        Args:
+            tool: Tool instance
+        """
+        name = tool.config["name"]
+        self._pending.pop(name, None)
+        self.tools[name] = tool
+        self.health.register(name, tool.validate_dependencies)
+    
+    def _build(self, name: str) -> Tool:
+        """Build a pending tool."""
+        tool_cls, config = self._pending[name]
+        logger.info("Building tool", name=name)
+        self.add_tool(tool_cls(config=config))
+        return self.tools[name]
+    
     def get_tool(self, name: str) -> Tool:
         """Get a tool by name.
         
@@ -66,26 +98,38 @@ class ToolsManager:
             name: Name of the tool
             
         Returns:
-            Tool instance
+            Tool instance, built on the first call
+            
+        Raises:
+            ValueError: If the tool is unknown, or its dependencies are down
         """
-        if name not in self.tools:
+        if name not in self.tools and name not in self._pending:
             raise ValueError(f"Tool {name} not found")
+        if not self.health.is_healthy(name):
+            raise ValueError(f"Tool {name} is unavailable")
+        if name in self._pending:
+            return self._build(name)
         return self.tools[name]
     
     def list_tools(self) -> List[Dict[str, Any]]:
-        """List all available tools.
+        """List all available tools, those whose dependencies are down are hidden.
+        
+        The tools are not built.
         
         Returns:
             List of tool metadata
         """
+        configs = [tool.config for tool in self.tools.values()]
+        configs += [config for _, config in self._pending.values()]
         return [
             {
-                "name": tool.config["name"],
-                "description": tool.config["description"],
-                "category": tool.config["category"],
-                "enabled": tool.config["enabled"]
+                "name": config["name"],
+                "description": config["description"],
+                "category": config["category"],
+                "enabled": config["enabled"]
             }
-            for tool in self.tools.values()
+            for config in configs
+            if self.health.is_healthy(config["name"])
         ]
 
 